@@ -0,0 +1,235 @@
+"""Admission control: per-user and per-address rate limits, and a concurrency cap.
+
+Every endpoint named in ``RATE_LIMITS`` has a token bucket for each logged-in
+user and for each client address. A request spends a token from both, and is
+answered with a 429 and ``Retry-After`` when either is empty. The user comes
+from the signed session cookie, so a rejected request does no database work:
+these hooks run before any other.
+
+``MAX_CONCURRENT_REQUESTS`` caps the requests being served at once by all
+worker processes on the host. Past it, requests are turned away at once with
+a 503, so a burst sheds load instead of queueing for database connections
+until clients time out. Long-lived notification streams, static files and
+/metrics are not counted.
+
+The buckets and the in-flight counts live in a file that every worker maps
+into memory (``ADMISSION_STATE_FILE``), with an fcntl lock on the bytes being
+updated; a bucket is a few bytes, and a worker holds its lock for a few
+field updates. Buckets are kept in sets of four; an address or user not seen
+for a while gives way to new ones and starts again with a full bucket.
+"""
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, jsonify, request, session
+
+import metrics
+
+# Per worker process: its pid and the requests it is serving
+PROCESS = struct.Struct('<qq')
+PROCESS_SLOTS = 256
+# Per bucket: the hash of its key, the tokens left and when they were counted
+BUCKET = struct.Struct('<Qdd')
+WAYS = 4
+
+# Endpoints that never count towards MAX_CONCURRENT_REQUESTS
+UNCAPPED_ENDPOINTS = {'static', 'main.get_metrics', 'main.notification_stream'}
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600}
+
+
+class SharedState:
+    """
+        Token buckets and in-flight counts shared by the processes on a host.
+        - take spends a token, or returns the seconds until one is available
+        - enter counts a request against a cap; leave ends it
+        """
+
+    def __init__(self, path, buckets):
+        self.path = path
+        self.sets = max(1, buckets // WAYS)
+        self.buckets_offset = PROCESS.size * PROCESS_SLOTS
+        self.size = self.buckets_offset + BUCKET.size * WAYS * self.sets
+        # fcntl locks belong to the process, so its threads also take this one
+        self._lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._map = None
+        self._slot = None
+
+    def take(self, key, rate, capacity):
+        """Spend a token from the bucket of key, refilled at rate per second."""
+        self._open()
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+        start = self.buckets_offset + (digest % self.sets) * WAYS * BUCKET.size
+        now = time.time()
+        with self._locked(start, WAYS * BUCKET.size):
+            ways = [(offset, *BUCKET.unpack_from(self._map, offset))
+                    for offset in range(start, start + WAYS * BUCKET.size, BUCKET.size)]
+            match = [way for way in ways if way[1] == digest]
+            if match:
+                offset, _, tokens, updated = match[0]
+            else:
+                # A new key takes the place of the set's least recently used one
+                offset = min(ways, key=lambda way: way[3])[0]
+                tokens, updated = capacity, now
+            tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            BUCKET.pack_into(self._map, offset, digest, tokens - 1 if tokens >= 1 else tokens, now)
+        return wait
+
+    def enter(self, cap):
+        """Count a request of this process, unless the host already serves cap of them."""
+        self._open()
+        if self._slot is None:
+            return True
+        with self._locked(0, self.buckets_offset):
+            if sum(PROCESS.unpack_from(self._map, index * PROCESS.size)[1] for index in range(PROCESS_SLOTS)) >= cap:
+                return False
+            self._add(1)
+        return True
+
+    def leave(self):
+        if self._slot is None:
+            return
+        with self._locked(0, self.buckets_offset):
+            self._add(-1)
+
+    def _add(self, delta):
+        pid, count = PROCESS.unpack_from(self._map, self._slot)
+        PROCESS.pack_into(self._map, self._slot, pid, count + delta)
+
+    def _open(self):
+        # Mappings are inherited by forked workers, but fcntl locks are not
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.lockf(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_size != self.size:
+                    # Left by a different ADMISSION_BUCKETS setting: start afresh
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, self.size)
+                self._map = mmap.mmap(fd, self.size)
+                self._slot = self._claim_slot()
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN)
+            self._fd = fd
+            self._pid = os.getpid()
+
+    def _claim_slot(self):
+        # Called with the whole file locked; also clears the counts of
+        # processes that exited in the middle of a request
+        pid = os.getpid()
+        free = None
+        for index in range(PROCESS_SLOTS):
+            offset = index * PROCESS.size
+            owner = PROCESS.unpack_from(self._map, offset)[0]
+            if owner == pid or (owner and not _alive(owner)):
+                PROCESS.pack_into(self._map, offset, 0, 0)
+                owner = 0
+            if owner == 0 and free is None:
+                free = offset
+        if free is not None:
+            PROCESS.pack_into(self._map, free, pid, 0)
+        return free
+
+    @contextmanager
+    def _locked(self, start, length):
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, length, start)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, length, start)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def parse_limit(limit):
+    """Turn "<requests>/<period>" into (tokens per second, bucket capacity)."""
+    match = re.fullmatch(r'\s*(\d+)\s*/\s*(second|minute|hour)\s*', limit)
+    if match is None or int(match.group(1)) < 1:
+        raise ValueError(f"Rate limit {limit!r} is not of the form '<requests>/<second|minute|hour>'")
+    count = int(match.group(1))
+    return count / PERIODS[match.group(2)], count
+
+
+def init_app(app):
+    """Register the admission hooks; call before anything else registers request hooks."""
+    config = app.config
+    config.setdefault('RATE_LIMITS_ENABLED', True)
+    config.setdefault('RATE_LIMITS', {})
+    config.setdefault('RATE_LIMIT_TRUSTED_PROXIES', 0)
+    config.setdefault('MAX_CONCURRENT_REQUESTS', 0)
+    # Malformed limits fail at startup rather than on the first request
+    limits = {
+        endpoint: {scope: parse_limit(limit) for scope, limit in scopes.items()}
+        for endpoint, scopes in config['RATE_LIMITS'].items()
+    } if config['RATE_LIMITS_ENABLED'] else {}
+    if not limits and not config['MAX_CONCURRENT_REQUESTS']:
+        return
+    app.extensions['admission'] = (SharedState(config['ADMISSION_STATE_FILE'], config['ADMISSION_BUCKETS']), limits)
+    app.before_request(_admit)
+    app.teardown_request(_release)
+
+
+def _admit():
+    state, limits = current_app.extensions['admission']
+    endpoint = request.endpoint
+    keys = {'ip': client_address(), 'user': session.get('_user_id')}
+    for scope, (rate, capacity) in limits.get(endpoint, {}).items():
+        if keys[scope] is None:
+            continue
+        wait = state.take(f"{endpoint}:{scope}:{keys[scope]}", rate, capacity)
+        if wait:
+            metrics.REJECTED.labels(endpoint, 'rate').inc()
+            return _reject(429, "Too many requests; please slow down.", wait)
+
+    cap = current_app.config['MAX_CONCURRENT_REQUESTS']
+    if cap and endpoint not in UNCAPPED_ENDPOINTS:
+        if not state.enter(cap):
+            metrics.REJECTED.labels(endpoint or 'unmatched', 'concurrency').inc()
+            return _reject(503, "The server is busy; please try again.", 1)
+        g.admission_counted = True
+
+
+def _release(exc):
+    if g.pop('admission_counted', False):
+        current_app.extensions['admission'][0].leave()
+
+
+def client_address():
+    """Return the client's address, as seen by the first trusted proxy when there are any."""
+    proxies = current_app.config['RATE_LIMIT_TRUSTED_PROXIES']
+    if proxies:
+        forwarded = [address.strip() for address in request.headers.get('X-Forwarded-For', '').split(',')]
+        if len(forwarded) >= proxies and forwarded[-proxies]:
+            return forwarded[-proxies]
+    return request.remote_addr
+
+
+def _reject(status, message, wait):
+    headers = {"Retry-After": str(max(1, math.ceil(wait)))}
+    if request.path.startswith('/api/') or request.is_json:
+        return jsonify({"error": message}), status, headers
+    return message, status, headers
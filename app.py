@@ -1,39 +1,169 @@
-from flask import Flask, render_template, redirect, url_for, request, flash, session, jsonify
+import hmac
+
+import click
+from flask import (
+    Blueprint, Flask, Response, abort, current_app, render_template, stream_template, redirect, url_for, request, flash,
+    get_flashed_messages, session, jsonify, stream_with_context,
+)
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from flask_mail import Mail
-from flask_migrate import Migrate
-from models import db, User, Task, Comment
+from models import db, User, UserIdentity, Task, Comment, ArchivedTask, categories, priorities
 from forms import RegistrationForm, LoginForm, ForgotPasswordForm, ResetPasswordForm, SettingsForm, CommentForm
 from config import Config
+import admission
+import database
+import replicas
+import shards
+import stats as user_stats
+from pagination import KeysetPage, RankedPage, StaticPage
+import search
+import sync
+import passwords
+import metrics
+from cache import read_cache, identity_cache
+from notifications import scheduler as notification_scheduler
+from purge import purger as account_purger
+import compression
+import templating
+import jobs
+import digests
+import archive
+import transfer
+from seed import seed_command
+from assets import assets
+from sqlalchemy import false, func, insert, select
+from sqlalchemy.orm import selectinload, with_expression
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timedelta
+import json
 import os
+import queue
 
-# Flask app initialization
-app = Flask(__name__)
-app.config.from_object(Config)
-db.init_app(app)
-
-# Setup Flask extensions
-mail = Mail(app)
-migrate = Migrate(app, db)
+# Routes are registered on the app by create_app
+bp = Blueprint('main', __name__)
 
 # Flask-Login setup
-login_manager = LoginManager(app)
-login_manager.login_view = 'login'
+login_manager = LoginManager()
+login_manager.login_view = 'main.login'
+
+
+def create_app(config_class=Config):
+    """
+        Build and configure the application.
+        - Nothing here touches the database, so gunicorn can build the app once
+          in the master (--preload) and the workers share it copy-on-write
+        - Extensions only needed by CLI commands are set up lazily
+        """
+    app = Flask(__name__)
+    app.config.from_object(config_class)
+    # Rate limits and the concurrency cap come first, so that requests they
+    # turn away never reach the hooks below that load the user
+    admission.init_app(app)
+    database.init_app(app)  # Engine profile for the configured database
+    replicas.init_app(app)  # Read replicas, as extra binds with the same profile
+    shards.init_app(app)  # Shards of users' data, likewise
+    db.init_app(app)
+
+    # Migrations only run from the flask CLI, so web workers never import Alembic.
+    # Mail is set up on first use (see mailer.py).
+    if click.get_current_context(silent=True) is not None:
+        from flask_migrate import Migrate
+        Migrate(app, db)
+
+    # Due-date notification scheduler for the notification stream
+    notification_scheduler.init_app(app)
+
+    # Per-endpoint latency, status and SQL metrics, served at /metrics
+    metrics.init_app(app)
+
+    # Deleted accounts are purged in the background
+    account_purger.init_app(app)
+
+    # Password hashing runs in a bounded process pool
+    passwords.init_app(app)
+
+    # Per-user read cache, invalidated by each user's revision, and the
+    # short-lived identity cache used by load_user
+    read_cache.init_app(app)
+    identity_cache.init_app(app)
+
+    # Compiled templates and rendered fragments are cached (see templating.py)
+    templating.init_app(app)
+
+    # HTML and JSON responses are compressed on the fly
+    compression.init_app(app)
+
+    # Static assets are served under content-hashed URLs, precompressed
+    assets.init_app(app)
+
+    # Background jobs, run by `flask jobs work`; the first kind sends reminder digests
+    jobs.init_app(app)
+    digests.init_app(app)
+    # Tasks completed long ago are moved to the archive tables by the job workers
+    archive.init_app(app)
+
+    # Streaming bulk export and chunked import of tasks and comments
+    transfer.init_app(app)
+
+    # `flask init-db` creates the schema of a new database, `flask upgrade-db`
+    # creates or upgrades it on release; `flask seed` generates synthetic data for benchmarks
+    app.cli.add_command(database.init_db_command)
+    app.cli.add_command(database.upgrade_db_command)
+    app.cli.add_command(seed_command)
+
+    login_manager.init_app(app)
+    app.register_blueprint(bp)
+    return app
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    """Load user by ID for Flask-Login."""
-    return db.session.get(User, int(user_id))
+    """Load user by ID for Flask-Login, usually from the identity cache."""
+    user_id = int(user_id)
+
+    def load():
+        user = db.session.get(User, user_id)
+        return user.identity() if user and user.deleted_at is None else None
+
+    fields = identity_cache.get(user_id, load)
+    return UserIdentity(**fields) if fields else None
 
 
-# Initialize the database
-with app.app_context():
-    db.create_all()
+# Columns the task list can be sorted by, and the column it is grouped by first:
+# the priority sort lists the priorities from most to least urgent, each by due date
+SORT_COLUMNS = {
+    "due_date": (Task.due_date, None),
+    "priority": (Task.due_date, Task.priority_rank),
+    "completed": (Task.completed, None),
+}
+
+# Message for a task whose category or priority is not one of the app's
+UNKNOWN_CHOICE_ERROR = "Category and priority must be one of the listed values."
+
+
+def with_comment_summary(query):
+    """
+        Load each task's comment count and latest comment time.
+        Correlated subqueries, run for the rows of the page only; each is a
+        range of ix_comment_task_created_at.
+        """
+    def of_task(column):
+        return select(column).where(Comment.task_id == Task.id).correlate(Task).scalar_subquery()
+
+    return query.options(
+        with_expression(Task.comment_count, of_task(func.count(Comment.id))),
+        with_expression(Task.last_comment_at, of_task(func.max(Comment.created_at))),
+    )
 
 
-@app.route('/')
+def parse_due_date(value):
+    """Parse a YYYY-MM-DD due date, returning None for empty values."""
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+@bp.route('/')
+@replicas.read_only
 @login_required
 def dashboard():
     """
@@ -43,110 +173,173 @@ def dashboard():
         - Task category distribution
         - Overall progress
         """
-    # Fetch all tasks for the current user
-    tasks_query = Task.query.filter_by(user_id=current_user.id).all()
-
-    # Number of tasks completed per week/month
+    # Served from the read cache until the user writes or the day changes
     today = datetime.now().date()
-    start_of_week = today - timedelta(days=today.weekday())
-    end_of_week = start_of_week + timedelta(days=6)
-    start_of_month = today.replace(day=1)
-
-    # Calculate task completion statistics
-    completed_this_week = sum(
-        1 for task in tasks_query
-        if task.completed and task.due_date and start_of_week <= datetime.strptime(task.due_date, '%Y-%m-%d').date()
-        <= end_of_week
+    stats = read_cache.get_or_compute(
+        'dashboard', current_user.id, lambda: dashboard_stats(current_user.id, today), today
     )
-    completed_this_month = sum(
-        1 for task in tasks_query
-        if task.completed and task.due_date and start_of_month <= datetime.strptime(task.due_date, '%Y-%m-%d').date()
+
+    return render_template(
+        'dashboard.html',
+        revision=stats["revision"],
+        today=today,
+        completed_this_week=stats["completed_this_week"],
+        completed_this_month=stats["completed_this_month"],
+        category_counts=stats["category_counts"],
+        progress=stats["progress"]
     )
 
+
+def dashboard_stats(user_id, today):
+    """Collect the dashboard numbers for a user as a plain dict."""
+    # Statistics are maintained incrementally, so this is a single row lookup
+    stats = user_stats.get_stats(user_id, today)
+
     # Task categories for pie chart
-    categories = ["Work", "Personal", "Urgent"]
-    category_counts = {category: sum(1 for task in tasks_query if task.category == category) for category in categories}
+    category_counts = {category: stats.category_counts.get(category, 0) for category in categories.names()}
 
     # Progress calculation
-    total_tasks = len(tasks_query)
-    completed_tasks = sum(1 for task in tasks_query if task.completed)
-    progress = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
+    progress = (stats.completed_tasks / stats.total_tasks * 100) if stats.total_tasks > 0 else 0
 
-    return render_template(
-        'dashboard.html',
-        completed_this_week=completed_this_week,
-        completed_this_month=completed_this_month,
-        category_counts=category_counts,
-        progress=int(progress)
-    )
+    return {
+        # Keys the cached dashboard widgets
+        "revision": sync.current_revision(user_id),
+        "completed_this_week": stats.completed_this_week,
+        "completed_this_month": stats.completed_this_month,
+        "category_counts": category_counts,
+        "progress": int(progress),
+    }
 
 
-@app.route('/tasks', methods=['GET', 'POST'])
+@bp.route('/tasks', methods=['GET', 'POST'])
+@replicas.read_only
 @login_required
 def tasks():
     """
         Display and manage user tasks with filtering and sorting capabilities.
         Features:
-        - Search functionality
+        - Ranked full-text search over task names and comments
         - Category filtering
         - Multiple sorting options
+        - Keyset pagination with a streamed response
         - Overdue and upcoming task notifications
+        - Comment count and latest comment time per task
+        - Cached unfiltered first page
         """
     search_query = request.args.get("search", "")
     sort_by = request.args.get("sort_by", None)
     category_filter = request.args.get("category", None)
-
-    # Start with all tasks for the user
-    tasks_query = Task.query.filter_by(user_id=current_user.id)
-
-    # Filter by search query if provided
-    if search_query:
-        tasks_query = tasks_query.filter(Task.name.ilike(f"%{search_query}%"))
-
-    # Apply category filter if selected
-    if category_filter:
-        tasks_query = tasks_query.filter_by(category=category_filter)
-
-    # Apply sorting
-    if sort_by == "due_date":
-        tasks_query = tasks_query.order_by(Task.due_date.asc())
-    elif sort_by == "priority":
-        tasks_query = tasks_query.order_by(Task.priority.asc())
-    elif sort_by == "completed":
-        tasks_query = tasks_query.order_by(Task.completed.asc())
-
-    user_tasks = tasks_query.all()
-
-    # Identify overdue and upcoming tasks
+    cursor = request.args.get("cursor")
+    per_page = current_app.config['TASKS_PER_PAGE']
     today = datetime.now().date()
-    overdue_tasks = [
-        task for task in user_tasks
-        if task.due_date and not task.completed and datetime.strptime(task.due_date, '%Y-%m-%d').date() < today
-    ]
-    upcoming_tasks = [
-        task for task in user_tasks
-        if task.due_date and not task.completed and 0 <= (
-                    datetime.strptime(task.due_date, '%Y-%m-%d').date() - today).days <= 1
-    ]
 
-    # Remove duplicates from task lists
-    overdue_tasks = list({task.id: task for task in overdue_tasks}.values())
-    upcoming_tasks = list({task.id: task for task in upcoming_tasks}.values())
+    if not (search_query or sort_by or category_filter or cursor):
+        # The unfiltered first page is served from the read cache until the
+        # user writes or the day changes
+        listing = read_cache.get_or_compute(
+            'tasks', current_user.id, lambda: task_listing(current_user.id, today, per_page), today, per_page
+        )
+        user_tasks = StaticPage(listing["tasks"], next_cursor=listing["next_cursor"])
+        overdue_tasks = listing["overdue_tasks"]
+        upcoming_tasks = listing["upcoming_tasks"]
+    else:
+        # Start with all tasks for the user
+        user_query = Task.query.filter_by(user_id=current_user.id)
+
+        # Apply category filter if selected; an unknown category has no tasks
+        if category_filter:
+            category_id = categories.code(category_filter)
+            user_query = user_query.filter(Task.category_id == category_id if category_id is not None else false())
+
+        # Filter by full-text search query if provided. Search results are
+        # ranked by relevance unless a sort option is chosen; the ranked
+        # matches then also filter the page. Pages are fetched lazily while
+        # the template streams.
+        sort_column, group_column = SORT_COLUMNS.get(sort_by, (None, None))
+        ranked = bool(search_query) and sort_column is None
+        tasks_query = search.matching(user_query, search_query, current_user.id) if search_query else user_query
+        page_query = with_comment_summary(
+            search.matching(user_query, search_query, current_user.id, ranked=True) if ranked else tasks_query
+        )
+        if ranked:
+            user_tasks = RankedPage(page_query, cursor=cursor, per_page=per_page)
+        elif group_column is not None:
+            # Tasks without a priority come last
+            user_tasks = KeysetPage(
+                page_query, Task.id, sort_column, cursor=cursor, per_page=per_page,
+                group_column=group_column, groups=priorities.codes() + [None],
+            )
+        else:
+            user_tasks = KeysetPage(page_query, Task.id, sort_column, cursor=cursor, per_page=per_page)
 
-    categories = ["Work", "Personal", "Urgent"]
-    priorities = ["Low", "Medium", "High"]
+        overdue_tasks, upcoming_tasks = due_date_notices(tasks_query, today)
 
-    return render_template(
+    # Keep the current filters when following the next page link
+    page_args = {key: value for key, value in request.args.items() if key != "cursor"}
+
+    # The session cookie is sent before the body streams, so flashed messages
+    # are popped here; popped in the template they would never be cleared
+    return Response(stream_template(
         'tasks.html',
+        flashed_messages=get_flashed_messages(with_categories=True),
         tasks=user_tasks,
         overdue_tasks=overdue_tasks,
         upcoming_tasks=upcoming_tasks,
-        categories=categories,
-        priorities=priorities,
+        categories=categories.names(),
+        priorities=priorities.names(),
+        page_args=page_args,
+    ))
+
+
+def due_date_notices(tasks_query, today):
+    """Return the overdue and upcoming open tasks of a task query."""
+    # Identify overdue and upcoming tasks with indexed range queries
+    open_tasks = tasks_query.filter_by(completed=False)
+    overdue_tasks = open_tasks.filter(Task.due_date < today).order_by(Task.due_date.asc()).all()
+    upcoming_tasks = open_tasks.filter(
+        Task.due_date.between(today, today + timedelta(days=1))
+    ).order_by(Task.due_date.asc()).all()
+    return overdue_tasks, upcoming_tasks
+
+
+def task_listing(user_id, today, per_page):
+    """Collect the unfiltered first page of a user's task list as plain dicts."""
+    tasks_query = Task.query.filter_by(user_id=user_id)
+    page = KeysetPage(with_comment_summary(tasks_query), Task.id, per_page=per_page)
+    rows = [
+        dict(sync.serialize_task(task), comment_count=task.comment_count, last_comment_at=task.last_comment_at)
+        for task in page
+    ]
+    overdue_tasks, upcoming_tasks = due_date_notices(tasks_query, today)
+    return {
+        "tasks": rows,
+        "next_cursor": page.next_cursor,
+        "overdue_tasks": [sync.serialize_task(task) for task in overdue_tasks],
+        "upcoming_tasks": [sync.serialize_task(task) for task in upcoming_tasks],
+    }
+
+
+@bp.route('/tasks/archived')
+@replicas.read_only
+@login_required
+def archived_tasks():
+    """
+        Display the user's archived tasks, read-only.
+        Features:
+        - Tasks completed more than ARCHIVE_AFTER_DAYS ago, with their comments
+        - Keyset pagination, like the task list
+        """
+    tasks_query = ArchivedTask.query.filter_by(user_id=current_user.id) \
+        .options(selectinload(ArchivedTask.comments))
+    page = KeysetPage(
+        tasks_query, ArchivedTask.id, cursor=request.args.get("cursor"), per_page=current_app.config['TASKS_PER_PAGE']
     )
+    return Response(stream_template(
+        'archived_tasks.html', flashed_messages=get_flashed_messages(with_categories=True), tasks=page,
+    ))
 
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     """
         Handle user registration with validation.
@@ -160,23 +353,23 @@ def register():
         # Check if email already exists
         if User.query.filter_by(email=form.email.data).first():
             flash('Email already registered!', 'danger')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
         # Check if username already exists
         if User.query.filter_by(username=form.username.data).first():
             flash('Username already taken!', 'danger')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
 
         # Create new user with hashed password
-        new_user = User(username=form.username.data, email=form.email.data)
+        new_user = User(username=form.username.data, email=form.email.data, shard=shards.assign()[0])
         new_user.set_password(form.password.data)
         db.session.add(new_user)
         db.session.commit()
         flash('Registration successful! Please log in.', 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     return render_template('register.html', form=form)
 
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     """
         Handle user authentication and login.
@@ -184,47 +377,55 @@ def login():
         - Email/password validation
         - Remember me functionality
         - Redirect to next page after login
+        - Rehashing of passwords stored with an outdated method
         """
     form = LoginForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(email=form.email.data).first()
+        user = User.query.filter_by(email=form.email.data, deleted_at=None).first()
         if user and user.check_password(form.password.data):
+            # Upgrade hashes made with an older method or cost
+            if user.password_needs_rehash():
+                user.set_password(form.password.data)
+                db.session.commit()
             login_user(user)
             flash('Login successful!', 'success')
             next_page = request.args.get('next')
-            return redirect(next_page) if next_page else redirect(url_for('dashboard'))
+            return redirect(next_page) if next_page else redirect(url_for('main.dashboard'))
         else:
             flash('Invalid email or password.', 'danger')
     return render_template('login.html', form=form)
 
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
     """Handle user logout and session cleanup."""
     logout_user()
     flash('You have been logged out.', 'success')
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
 
-@app.route('/delete_account', methods=['POST'])
+@bp.route('/delete_account', methods=['POST'])
 @login_required
 def delete_account():
     """
         Handle account deletion.
-        - Deletes all user tasks
-        - Removes user account
-        - Cleans up associated data
+        - Marks the account as deleted and logs out
+        - Tasks, comments and the account itself are purged in the background
         """
-    user = current_user
-    Task.query.filter_by(user_id=user.id).delete()  # Delete user's tasks
-    db.session.delete(user)
+    user_id = current_user.id
+    user = db.session.get(User, user_id)
+    user.deleted_at = datetime.utcnow()
     db.session.commit()
+    read_cache.invalidate_user(user_id)
+    identity_cache.invalidate(user_id)
+    logout_user()
+    account_purger.wake()
     flash('Your account has been deleted.', 'success')
-    return redirect(url_for('register'))
+    return redirect(url_for('main.register'))
 
 
-@app.route("/forgot_password", methods=["GET", "POST"])
+@bp.route("/forgot_password", methods=["GET", "POST"])
 def forgot_password():
     """
         Handle password reset requests.
@@ -233,16 +434,16 @@ def forgot_password():
         """
     form = ForgotPasswordForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(email=form.email.data).first()
+        user = User.query.filter_by(email=form.email.data, deleted_at=None).first()
         if user:
             flash("User verified. Please reset your password.", "success")
-            return redirect(url_for('reset_password', user_id=user.id))
+            return redirect(url_for('main.reset_password', user_id=user.id))
         else:
             flash("No user found with this email.", "danger")
     return render_template("forgot_password.html", form=form)
 
 
-@app.route("/reset_password/<int:user_id>", methods=["GET", "POST"])
+@bp.route("/reset_password/<int:user_id>", methods=["GET", "POST"])
 def reset_password(user_id):
     """
         Process password reset for verified users.
@@ -251,19 +452,20 @@ def reset_password(user_id):
         """
     form = ResetPasswordForm()
     user = User.query.get(user_id)
-    if not user:
+    if not user or user.deleted_at is not None:
         flash("Invalid user.", "danger")
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     if form.validate_on_submit():
         user.set_password(form.password.data)  # Hash new password
         db.session.commit()
+        identity_cache.invalidate(user.id)
         flash("Your password has been updated!", "success")
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     return render_template("reset_password.html", form=form)
 
 
-@app.route('/update/<int:task_id>', methods=['POST'])
+@bp.route('/update/<int:task_id>', methods=['POST'])
 @login_required
 def update_task(task_id):
     """
@@ -273,24 +475,30 @@ def update_task(task_id):
         """
     task = db.session.get(Task, task_id)
     if task and task.user_id == current_user.id:
+        before = user_stats.snapshot(task)
         task.completed = not task.completed
+        task.completed_at = datetime.utcnow() if task.completed else None
+        task.revision = sync.touch(current_user.id)
+        user_stats.record_change(current_user.id, old=before, new=user_stats.snapshot(task))
         db.session.commit()
         flash('Task updated successfully!', 'success')
-    return redirect(url_for('tasks'))
+    return redirect(url_for('main.tasks'))
 
 
-@app.route('/delete/<int:task_id>', methods=['POST'])
+@bp.route('/delete/<int:task_id>', methods=['POST'])
 @login_required
 def delete_task(task_id):
     task = db.session.get(Task, task_id)
     if task and task.user_id == current_user.id:
+        user_stats.record_change(current_user.id, old=user_stats.snapshot(task))
+        sync.record_deletion(current_user.id, sync.touch(current_user.id), 'task', [task.id])
         db.session.delete(task)
         db.session.commit()
         flash('Task deleted successfully!', 'success')
-    return redirect(url_for('tasks'))
+    return redirect(url_for('main.tasks'))
 
 
-@app.route('/settings', methods=["GET", "POST"])
+@bp.route('/settings', methods=["GET", "POST"])
 @login_required
 def set_settings():
     """
@@ -302,16 +510,19 @@ def set_settings():
         """
     form = SettingsForm()
     if form.validate_on_submit():
-        current_user.username = form.username.data
+        user = db.session.get(User, current_user.id)
+        user.username = form.username.data
+        sync.touch(user.id)
         db.session.commit()
+        identity_cache.invalidate(user.id)
         flash('Settings updated successfully!', 'success')
-        return redirect(url_for('set_settings'))
+        return redirect(url_for('main.set_settings'))
     elif request.method == 'GET':
         form.username.data = current_user.username
     return render_template('settings.html', form=form, theme=session.get('theme', 'light'))
 
 
-@app.route('/toggle_theme')
+@bp.route('/toggle_theme')
 @login_required
 def toggle_theme():
     """
@@ -325,7 +536,7 @@ def toggle_theme():
     return jsonify({'theme': new_theme})
 
 
-@app.route('/add_task', methods=['POST'])
+@bp.route('/add_task', methods=['POST'])
 @login_required
 def add_task():
     """
@@ -354,28 +565,204 @@ def add_task():
         if request.is_json:
             return jsonify({"error": "All fields are required except due date."}), 400
         flash("All fields are required except due date.", "danger")
-        return redirect(url_for("tasks"))
+        return redirect(url_for("main.tasks"))
+
+    # Categories and priorities are stored as the codes of their lookup tables
+    category_id, priority_rank = categories.code(category), priorities.code(priority)
+    if category_id is None or priority_rank is None:
+        if request.is_json:
+            return jsonify({"error": UNKNOWN_CHOICE_ERROR}), 400
+        flash(UNKNOWN_CHOICE_ERROR, "danger")
+        return redirect(url_for("main.tasks"))
+
+    # Due dates arrive as YYYY-MM-DD strings; an empty value means no due date
+    try:
+        due_date = parse_due_date(due_date)
+    except (ValueError, TypeError):
+        if request.is_json:
+            return jsonify({"error": "Due date must be in YYYY-MM-DD format."}), 400
+        flash("Due date must be in YYYY-MM-DD format.", "danger")
+        return redirect(url_for("main.tasks"))
 
     task = Task(
         user_id=current_user.id,
         name=name,
-        category=category,
-        priority=priority,
+        category_id=category_id,
+        priority_rank=priority_rank,
         due_date=due_date,
         completed=False,
+        revision=sync.touch(current_user.id),
     )
     db.session.add(task)
+    user_stats.record_change(current_user.id, new=user_stats.snapshot(task))
     db.session.commit()
 
     # Return appropriate response based on request type
     if request.is_json:
         return jsonify({"message": "Task added successfully!"}), 200
     flash("Task added successfully!", "success")
-    return redirect(url_for("tasks"))
+    return redirect(url_for("main.tasks"))
+
+
+@bp.route('/api/tasks/batch', methods=['POST'])
+@login_required
+def add_tasks_batch():
+    """
+        Create several tasks in one transaction, used by offline sync.
+        Features:
+        - Every task carries a client-generated idempotency key
+        - Retried keys return the existing task instead of a duplicate
+        - Returns the task ids so the client can update its view in place
+        """
+    data = request.get_json(silent=True) or {}
+    items = data.get('tasks')
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "A non-empty list of tasks is required."}), 400
+    if len(items) > current_app.config['MAX_BATCH_TASKS']:
+        return jsonify({"error": f"At most {current_app.config['MAX_BATCH_TASKS']} tasks can be sent at once."}), 400
+
+    # Validate the whole batch before writing anything
+    rows = {}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            return jsonify({"error": f"Task {index}: expected an object."}), 400
+        client_key = item.get('client_key')
+        if not isinstance(client_key, str) or not 0 < len(client_key) <= 64:
+            return jsonify({"error": f"Task {index}: a client_key of at most 64 characters is required."}), 400
+        if not item.get('name') or not item.get('category') or not item.get('priority'):
+            return jsonify({"error": f"Task {index}: All fields are required except due date."}), 400
+        category_id, priority_rank = categories.code(item['category']), priorities.code(item['priority'])
+        if category_id is None or priority_rank is None:
+            return jsonify({"error": f"Task {index}: {UNKNOWN_CHOICE_ERROR}"}), 400
+        try:
+            due_date = parse_due_date(item.get('due_date'))
+        except (ValueError, TypeError):
+            return jsonify({"error": f"Task {index}: Due date must be in YYYY-MM-DD format."}), 400
+        rows.setdefault(client_key, dict(
+            user_id=current_user.id,
+            client_key=client_key,
+            name=item['name'],
+            category_id=category_id,
+            priority_rank=priority_rank,
+            due_date=due_date,
+            completed=False,
+        ))
+
+    try:
+        task_ids, created = insert_tasks(current_user.id, rows)
+    except IntegrityError:
+        # A concurrent retry of the same batch committed some keys first
+        db.session.rollback()
+        task_ids, created = insert_tasks(current_user.id, rows)
+
+    return jsonify({"tasks": [
+        {"client_key": client_key, "id": task_ids[client_key], "created": client_key in created}
+        for client_key in rows
+    ]}), 200
+
+
+def insert_tasks(user_id, rows):
+    """
+        Bulk insert the task rows whose client keys are new, in one transaction.
+        Returns a mapping of every client key to its task id, and the mapping
+        for the rows created by this call.
+        """
+    existing = dict(
+        db.session.query(Task.client_key, Task.id)
+        .filter(Task.user_id == user_id, Task.client_key.in_(list(rows)))
+    )
+    new_rows = [row for client_key, row in rows.items() if client_key not in existing]
+    created = {}
+    if new_rows:
+        revision = sync.touch(user_id)
+        for row in new_rows:
+            row['revision'] = revision
+        result = db.session.execute(insert(Task).returning(Task.client_key, Task.id), new_rows)
+        created = dict(result.all())
+        user_stats.record_changes(user_id, [
+            (None, user_stats.TaskSnapshot(False, categories.name(row['category_id']), row['due_date']))
+            for row in new_rows
+        ])
+    db.session.commit()
+    return {**existing, **created}, created
+
+
+@bp.route('/api/export', methods=['GET'])
+@replicas.read_only
+@login_required
+def export_data():
+    """
+        Stream the user's tasks and comments as NDJSON, or CSV with ?format=csv.
+        Features:
+        - Rows are read from the database in batches while the response is sent
+        - Comments refer to their task by key, as /api/import expects
+        """
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in transfer.FORMATS:
+        return jsonify({"error": "format must be ndjson or csv."}), 400
+
+    records = transfer.export_records(current_user.id)
+    filename = f"tasknest-{datetime.now().date().isoformat()}.{export_format}"
+    return Response(
+        stream_with_context(transfer.encode(records, export_format)),
+        mimetype=transfer.FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
+
+
+@bp.route('/api/import', methods=['POST'])
+@login_required
+def import_data():
+    """
+        Import tasks and comments from an NDJSON or CSV export.
+        Features:
+        - The body is the file itself, or a multipart upload in the `file` field
+        - The format follows ?format=, else the content type or file name
+        - Parsed while it is read and inserted in chunked bulk inserts
+        - Tasks whose key already exists, and comments already on their
+          task, are skipped, so a failed import can be sent again
+        Returns the created and skipped counts of tasks and comments.
+        """
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify({"error": "A file is required."}), 400
+        stream, import_format = upload.stream, transfer.format_for(upload.mimetype, upload.filename)
+    else:
+        stream, import_format = request.stream, transfer.format_for(request.mimetype)
+    import_format = request.args.get('format', import_format)
+    if import_format not in transfer.FORMATS:
+        return jsonify({"error": "format must be ndjson or csv."}), 400
+
+    try:
+        counts = transfer.import_records(current_user.id, stream, import_format)
+    except transfer.InvalidRecord as error:
+        return jsonify({"error": str(error), "imported": error.counts}), 400
+    return jsonify(counts), 200
+
+
+@bp.route('/api/tasks/changes', methods=['GET'])
+@login_required
+@sync.revision_etag()
+def get_task_changes():
+    """
+        Return the tasks and comments changed since a revision, for delta sync.
+        Features:
+        - Created and modified rows, plus ids of deleted rows
+        - Pages of about `limit` changes; follow `revision` while `has_more`
+        - ETag derived from the user's revision, so unchanged polls get a 304
+        """
+    since = request.args.get('since', 0, type=int)
+    limit = min(request.args.get('limit', 500, type=int), 1000)
+    if since < 0 or limit < 1:
+        return jsonify({"error": "since must be >= 0 and limit >= 1."}), 400
+    return jsonify(sync.changes_since(current_user.id, since, limit))
 
 
-@app.route('/api/notifications', methods=['GET'])
+@bp.route('/api/notifications', methods=['GET'])
+@replicas.read_only
 @login_required
+@sync.revision_etag(lambda: datetime.now().date())
 def get_notifications():
     """
         Fetch user notifications for overdue and upcoming tasks.
@@ -383,28 +770,90 @@ def get_notifications():
         - Overdue tasks list
         - Upcoming tasks (due within 24 hours)
         """
-    # Fetch all tasks for the current user
-    tasks = Task.query.filter_by(user_id=current_user.id).all()
-
+    # Served from the read cache until the user writes or the day changes
     today = datetime.now().date()
+    return jsonify(read_cache.get_or_compute(
+        'notifications', current_user.id, lambda: notification_payload(current_user.id, today), today
+    ))
+
+
+def notification_payload(user_id, today):
+    """Collect a user's overdue and upcoming task notifications."""
+    # Only open tasks with a due date before tomorrow's end are loaded
+    tasks = Task.query.with_entities(Task.name, Task.due_date) \
+        .filter_by(user_id=user_id, completed=False) \
+        .filter(Task.due_date <= today + timedelta(days=1)) \
+        .order_by(Task.due_date.asc()).all()
+
     upcoming_tasks = []
     overdue_tasks = []
+    for name, due_date in tasks:
+        if due_date < today:
+            overdue_tasks.append({"name": name, "due_date": due_date.isoformat()})
+        else:  # Tasks due in the next 1 day
+            upcoming_tasks.append({"name": name, "due_date": due_date.isoformat()})
 
-    for task in tasks:
-        if task.due_date and not task.completed:
-            due_date = datetime.strptime(task.due_date, '%Y-%m-%d').date()
-            if due_date < today:
-                overdue_tasks.append({"name": task.name, "due_date": task.due_date})
-            elif 0 <= (due_date - today).days <= 1:  # Tasks due in the next 1 day
-                upcoming_tasks.append({"name": task.name, "due_date": task.due_date})
-
-    return jsonify({
+    return {
         "overdue_tasks": overdue_tasks,
         "upcoming_tasks": upcoming_tasks
+    }
+
+
+@bp.route('/api/notifications/stream', methods=['GET'])
+@login_required
+def notification_stream():
+    """
+        Stream due-date notifications as Server-Sent Events.
+        Sends:
+        - A snapshot of overdue and upcoming tasks on connect
+        - An event whenever a task becomes upcoming or overdue
+        - Periodic keep-alive comments
+        Needs a threaded or async gunicorn worker; each open stream holds one.
+        """
+    user_id = current_user.id
+    subscription = notification_scheduler.subscribe(user_id)
+    heartbeat = current_app.config['NOTIFICATION_HEARTBEAT_SECONDS']
+
+    def generate():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    event = subscription.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            # Runs when the client disconnects and the next write fails
+            notification_scheduler.unsubscribe(user_id, subscription)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
     })
 
 
-@app.route('/task/<int:task_id>/comment', methods=['POST'])
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+        Expose request and SQL metrics in Prometheus text format.
+        Returns:
+        - Latency histograms, status counts and in-flight requests per endpoint
+        - SQL statement counts and time per request
+        Summed over all gunicorn workers. Requires METRICS_TOKEN as a bearer
+        token; without one configured, the endpoint does not exist.
+        """
+    token = current_app.config['METRICS_TOKEN']
+    if not token:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f"Bearer {token}".encode()):
+        return Response('Unauthorized', status=401)
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+
+@bp.route('/task/<int:task_id>/comment', methods=['POST'])
 @login_required
 def add_comment(task_id):
     """
@@ -416,18 +865,21 @@ def add_comment(task_id):
     task = Task.query.get_or_404(task_id)
     if task.user_id != current_user.id:
         flash('You do not have permission to comment on this task.', 'danger')
-        return redirect(url_for('tasks'))
+        return redirect(url_for('main.tasks'))
 
     form = CommentForm()
     if form.validate_on_submit():
-        new_comment = Comment(task_id=task_id, content=form.content.data)
+        # The task is stamped too, so delta sync picks up its new comment
+        task.revision = sync.touch(current_user.id)
+        new_comment = Comment(task_id=task_id, content=form.content.data, revision=task.revision)
         db.session.add(new_comment)
         db.session.commit()
         flash('Comment added successfully!', 'success')
-    return redirect(url_for('task_details', task_id=task_id))
+    return redirect(url_for('main.task_details', task_id=task_id))
 
 
-@app.route('/task/<int:task_id>')
+@bp.route('/task/<int:task_id>')
+@replicas.read_only
 @login_required
 def task_details(task_id):
     """
@@ -437,18 +889,17 @@ def task_details(task_id):
         - Comments
         - Comment form
         """
-    task = Task.query.get_or_404(task_id)
+    # The comments are loaded with the task, newest first
+    task = Task.query.options(selectinload(Task.comments)).filter_by(id=task_id).first_or_404()
     if task.user_id != current_user.id:
         flash('You do not have permission to view this task.', 'danger')
-        return redirect(url_for('tasks'))
+        return redirect(url_for('main.tasks'))
 
     form = CommentForm()
-    comments = Comment.query.filter_by(task_id=task.id).order_by(Comment.created_at.desc()).all()
-    return render_template('task_details.html', task=task, form=form, comments=comments)
+    return render_template('task_details.html', task=task, form=form, comments=task.comments)
 
 
 # Run the application
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
-    app.run(host="0.0.0.0", port=port, debug=True)
-    app.run(debug=True)
+    create_app().run(host="0.0.0.0", port=port, debug=True)
@@ -0,0 +1,87 @@
+"""Archival of completed tasks, so the task table holds mostly open work.
+
+Tasks completed more than ``ARCHIVE_AFTER_DAYS`` days ago are moved, with
+their comments, to the ``archived_task`` and ``archived_comment`` tables. The
+task list, notifications and search then only read the task table, whose
+size follows the number of open and recently completed tasks rather than
+each user's whole history. Archived tasks keep their ids and revisions; they
+are listed by the archive view, included in exports and still counted by the
+dashboard statistics.
+
+Every job worker poll moves at most ``ARCHIVE_BATCH_SIZE`` tasks of each
+shard in one transaction per shard, oldest completion first, and keeps
+polling without a pause while there is more to move. Each user whose tasks moved gets a new
+revision, so cached pages stop showing them; the tasks themselves keep their
+revision, and delta sync clients keep them as they last saw them.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, insert, literal, select
+
+import jobs
+from models import db, Task, Comment, ArchivedTask, ArchivedComment
+import shards
+import sync
+
+# Columns copied to the archive tables
+TASK_COLUMNS = [column.key for column in Task.__table__.columns]
+COMMENT_COLUMNS = [column.key for column in Comment.__table__.columns]
+
+
+def init_app(app):
+    app.config.setdefault('ARCHIVE_AFTER_DAYS', 30)
+    app.config.setdefault('ARCHIVE_BATCH_SIZE', 500)
+
+
+@jobs.periodic
+def archive_completed_tasks():
+    """Move one batch of tasks completed long enough ago to the archive on each shard; return the total."""
+    if current_app.config['ARCHIVE_AFTER_DAYS'] <= 0:
+        return 0
+    moved = 0
+    for shard in shards.all_keys():
+        with shards.use(shard):
+            moved += archive_batch()
+    return moved
+
+
+def archive_batch():
+    """Move one batch of the current shard's tasks to the archive; return the batch size."""
+    config = current_app.config
+    now = datetime.utcnow()
+    archivable = and_(
+        Task.completed.is_(True), Task.completed_at < now - timedelta(days=config['ARCHIVE_AFTER_DAYS'])
+    )
+
+    # Found along ix_task_completed_at; rows being moved by another worker are skipped on Postgres
+    candidates = select(Task.id).where(archivable).order_by(Task.completed_at) \
+        .limit(config['ARCHIVE_BATCH_SIZE']).with_for_update(skip_locked=True)
+    task_ids = db.session.scalars(candidates).all()
+    if not task_ids:
+        db.session.rollback()
+        return 0
+
+    # The condition is checked again as the rows are copied, in case a task
+    # was reopened or moved by another worker since it was selected
+    moving = and_(Task.id.in_(task_ids), archivable)
+    db.session.execute(insert(ArchivedTask).from_select(
+        TASK_COLUMNS + ['archived_at'],
+        select(*(Task.__table__.c[key] for key in TASK_COLUMNS), literal(now)).where(moving),
+    ))
+    moved = db.session.execute(select(Task.id, Task.user_id).where(moving)).all()
+    moved_ids = [task_id for task_id, _ in moved]
+    if moved_ids:
+        db.session.execute(insert(ArchivedComment).from_select(
+            COMMENT_COLUMNS,
+            select(*(Comment.__table__.c[key] for key in COMMENT_COLUMNS)).where(Comment.task_id.in_(moved_ids)),
+        ))
+        # Tasks first, so the search triggers drop each task's index row
+        # before its comments go with it
+        Task.query.filter(Task.id.in_(moved_ids)).delete(synchronize_session=False)
+        # Covers databases that do not enforce the cascade
+        Comment.query.filter(Comment.task_id.in_(moved_ids)).delete(synchronize_session=False)
+        for user_id in sorted({user_id for _, user_id in moved}):
+            sync.touch(user_id)
+    db.session.commit()
+    return len(moved_ids)
@@ -0,0 +1,180 @@
+"""Fingerprinted, precompressed static assets.
+
+The assets the templates use are copied to ``static/dist`` under names that
+carry a hash of their content (``css/styles.css`` becomes
+``dist/css/styles.<hash>.css``), next to gzip and, when the ``brotli``
+package is installed, brotli versions. ``url_for('static', ...)`` resolves
+the original names to the fingerprinted ones, so a changed file always gets a
+new URL and browsers may cache each URL forever.
+
+``flask build-assets`` builds them once per deploy, as part of the slug
+build (``bin/post_compile``), and writes the mapping to
+``static/dist/manifest.json``; fingerprinted files of earlier builds are
+removed. The app only reads the manifest. Without one, as in development
+before a build, the assets are served under their original names. Files
+outside ``ASSETS`` are served by Flask as usual, with revalidation.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import tempfile
+
+import click
+from flask import current_app, request, send_from_directory
+from flask.cli import with_appcontext
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip alone is still served
+    brotli = None
+
+# Static files referenced by the templates
+ASSETS = [
+    'css/bootstrap.min.css',
+    'css/styles.css',
+    'js/bootstrap.bundle.min.js',
+    'js/chart.umd.min.js',
+]
+OUTPUT_DIR = 'dist'
+MANIFEST = 'manifest.json'
+ONE_YEAR = 365 * 24 * 60 * 60
+
+# Content-Encoding -> suffix of the precompressed file, in order of preference
+ENCODINGS = {'br': '.br', 'gzip': '.gz'}
+
+
+def _compress(encoding, data):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _write(path, data):
+    # Write through a temporary file, so a running app never reads a
+    # half-written file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(handle, 'wb') as output:
+        output.write(data)
+    os.replace(temporary, path)
+
+
+def build(static_folder):
+    """
+        Fingerprint and compress ASSETS, write the manifest and remove the
+        files of earlier builds.
+        Returns the manifest:
+        - files: original name -> fingerprinted name, relative to static_folder
+        - encodings: fingerprinted name -> encodings with a precompressed file
+        """
+    encodings = [encoding for encoding in ENCODINGS if encoding != 'br' or brotli is not None]
+    manifest = {"files": {}, "encodings": {}}
+    for name in ASSETS:
+        with open(os.path.join(static_folder, name), 'rb') as source:
+            data = source.read()
+        stem, extension = os.path.splitext(name)
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        fingerprinted = f"{OUTPUT_DIR}/{stem}.{digest}{extension}"
+        path = os.path.join(static_folder, fingerprinted)
+
+        if not os.path.exists(path):
+            _write(path, data)
+        for encoding in encodings:
+            if not os.path.exists(path + ENCODINGS[encoding]):
+                _write(path + ENCODINGS[encoding], _compress(encoding, data))
+
+        manifest["files"][name] = fingerprinted
+        manifest["encodings"][fingerprinted] = encodings
+
+    output = os.path.join(static_folder, OUTPUT_DIR)
+    _write(os.path.join(output, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    current = {MANIFEST} | {
+        os.path.relpath(os.path.join(static_folder, fingerprinted), output) + suffix
+        for fingerprinted in manifest["encodings"]
+        for suffix in [''] + [ENCODINGS[encoding] for encoding in encodings]
+    }
+    for directory, _, files in os.walk(output):
+        for file in files:
+            path = os.path.join(directory, file)
+            if os.path.relpath(path, output) not in current:
+                os.remove(path)
+    return manifest
+
+
+def load_manifest(static_folder):
+    """Return the manifest written by the last build, or None if there is none."""
+    try:
+        with open(os.path.join(static_folder, OUTPUT_DIR, MANIFEST)) as manifest:
+            return json.load(manifest)
+    except FileNotFoundError:
+        return None
+
+
+class StaticAssets:
+    """
+        Serves ASSETS under fingerprinted URLs.
+        - url_for('static', filename=...) resolves to the fingerprinted name
+        - fingerprinted files are sent precompressed, per Accept-Encoding, with
+          a one-year immutable Cache-Control
+        """
+
+    def __init__(self, app=None):
+        self.files = {}
+        self.encodings = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('STATIC_FINGERPRINT', True)
+        app.cli.add_command(build_assets_command)
+        if not app.config['STATIC_FINGERPRINT']:
+            return
+        manifest = load_manifest(app.static_folder)
+        if manifest is None:
+            app.logger.info("No %s/%s; run `flask build-assets` to fingerprint the static assets.",
+                            OUTPUT_DIR, MANIFEST)
+            return
+        self.files = manifest["files"]
+        self.encodings = manifest["encodings"]
+        app.url_defaults(self.fingerprint_url)
+        app.view_functions['static'] = self.send_static_file
+
+    def fingerprint_url(self, endpoint, values):
+        if endpoint == 'static' and values.get('filename') in self.files:
+            values['filename'] = self.files[values['filename']]
+
+    def send_static_file(self, filename):
+        if filename not in self.encodings:
+            return current_app.send_static_file(filename)
+
+        # Prefer brotli, then gzip, then the uncompressed file
+        encoding = next(
+            (encoding for encoding in ENCODINGS
+             if encoding in self.encodings[filename] and request.accept_encodings.quality(encoding) > 0),
+            None,
+        )
+        response = send_from_directory(
+            current_app.static_folder,
+            filename + ENCODINGS[encoding] if encoding else filename,
+            mimetype=mimetypes.guess_type(filename)[0],
+            max_age=ONE_YEAR,
+        )
+        if encoding:
+            response.content_encoding = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.immutable = True
+        return response
+
+
+assets = StaticAssets()
+
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets_command():
+    """Fingerprint and precompress the static assets."""
+    manifest = build(current_app.static_folder)
+    for name, fingerprinted in manifest["files"].items():
+        click.echo(f"{name} -> {fingerprinted} ({', '.join(manifest['encodings'][fingerprinted])})")
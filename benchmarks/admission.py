@@ -0,0 +1,157 @@
+"""Latency of well-behaved users while one client posts tasks in a loop.
+
+Worker processes stand in for gunicorn workers sharing one host. The abusive
+processes all log in as one user and post tasks as fast as they can; the
+other processes each log in their own user and browse the task list,
+polling notifications and posting a task now and then, pausing in between
+as a browser would and staying within the rate limits. The run is
+repeated with the rate limits off and on, and reports the polite users'
+latency percentiles and what the abusive client got through.
+
+With the limits on, the abusive client's requests after its burst cost a
+429 each, with no database work, so the polite users' writes no longer wait
+behind its transactions for the write lock. Here the abusive client runs on
+the same CPUs as the app and sends its next request at once; a client across
+the network waits a round trip per request, so on a host with few cores the
+users' latency shows the client's own CPU use as much as the server's.
+
+    python benchmarks/admission.py --abusers 2 --users 4 --seconds 10
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from harness import percentiles
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+PAUSE_SECONDS = 0.2
+
+
+def load_app(environment):
+    os.environ.update(environment)
+    import config
+    config.Config.WTF_CSRF_ENABLED = False
+    from app import create_app
+    return create_app()
+
+
+def prepare(environment, users):
+    # Creates the schema and users once, before the workers log in
+    app = load_app(environment)
+    from models import db
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    for index in range(users + 1):
+        client.post('/register', data={
+            "username": f"bench{index}", "email": f"bench{index}@example.com",
+            "password": "password1", "confirm_password": "password1",
+        })
+
+
+def log_in(environment, index):
+    app = load_app(environment)
+    # Rejected and failed requests are counted below rather than logged
+    app.logger.disabled = True
+    client = app.test_client()
+    # Each user connects from an address of their own, as they would in production
+    client.environ_base['REMOTE_ADDR'] = f"10.0.0.{index + 1}"
+    client.post('/login', data={"email": f"bench{index}@example.com", "password": "password1"})
+    return client
+
+
+def abuser(environment, seconds, start, results):
+    client = log_in(environment, 0)
+    start.wait()
+    timings = {200: [], 429: []}
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = client.post('/add_task', json={"name": "spam", "category": "Work", "priority": "Low"})
+        timings.setdefault(response.status_code, []).append((time.perf_counter() - started) * 1000)
+    # Totals only: the parent reads the queue after the processes exit
+    results.put(('abuser', (len(timings[200]), sum(timings[200])), (len(timings[429]), sum(timings[429]))))
+
+
+def user(index, environment, seconds, start, results):
+    client = log_in(environment, index)
+    start.wait()
+    samples, failed = [], 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        # A browser tab: mostly the task list, with a poll and a new task now and then
+        step = len(samples) % 10
+        if step == 4:
+            response = client.get('/api/notifications')
+        elif step == 9:
+            response = client.post('/add_task', json={"name": "task", "category": "Work", "priority": "Low"})
+        else:
+            response = client.get('/tasks')
+        response.get_data()
+        samples.append((time.perf_counter() - started) * 1000)
+        failed += response.status_code != 200
+        time.sleep(PAUSE_SECONDS)
+    results.put(('user', samples, failed))
+
+
+def run(label, environment, args):
+    context = multiprocessing.get_context('spawn')
+    setup = context.Process(target=prepare, args=(environment, args.users))
+    setup.start()
+    setup.join()
+
+    start = context.Event()
+    results = context.Queue()
+    processes = [
+        context.Process(target=abuser, args=(environment, args.seconds, start, results)) for _ in range(args.abusers)
+    ] + [
+        context.Process(target=user, args=(index + 1, environment, args.seconds, start, results))
+        for index in range(args.users)
+    ]
+    for process in processes:
+        process.start()
+    # Let every process import the app and log in before the clock starts
+    time.sleep(5)
+    start.set()
+    for process in processes:
+        process.join()
+    totals = [results.get() for process in processes if process.exitcode == 0]
+    abusers = [item for item in totals if item[0] == 'abuser']
+    accepted = [sum(item[1][0] for item in abusers), sum(item[1][1] for item in abusers)]
+    rejected = [sum(item[2][0] for item in abusers), sum(item[2][1] for item in abusers)]
+    samples = [sample for item in totals if item[0] == 'user' for sample in item[1]]
+    failed = sum(item[2] for item in totals if item[0] == 'user')
+    latency = percentiles(samples)
+    print(f"{label:<10} users: p50 {latency['p50']:6.1f}ms  p95 {latency['p95']:6.1f}ms  "
+          f"p99 {latency['p99']:6.1f}ms  {failed} failed")
+    for name, (count, milliseconds) in (('accepted', accepted), ('rejected', rejected)):
+        if count:
+            print(f"{'':<10} abuser {name}: {count / args.seconds:7.1f}/s, {milliseconds / count:5.2f}ms each")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--abusers', type=int, default=2, help='Processes posting as the abusive user')
+    parser.add_argument('--users', type=int, default=4, help='Well-behaved users, one process each')
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    for label, enabled in (('limits off', 'false'), ('limits on', 'true')):
+        directory = tempfile.mkdtemp()
+        environment = {
+            "PASSWORD_HASH_WORKERS": "0",
+            "RATE_LIMITS_ENABLED": enabled,
+            "DATABASE_URL": f"sqlite:///{os.path.join(directory, 'bench.db')}",
+            "ADMISSION_STATE_FILE": os.path.join(directory, 'admission'),
+        }
+        run(label, environment, args)
+
+
+if __name__ == '__main__':
+    main()
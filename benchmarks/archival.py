@@ -0,0 +1,108 @@
+"""Hot-path latency before and after archiving a long history of completed tasks.
+
+Seeds users whose task lists carry a long history: most of their tasks were
+completed --history-days ago, next to a smaller set of open and recently
+completed ones. Measures the task list, its sorted and filtered variants,
+notifications and a dashboard rebuild, then runs the archival job until it
+is done and measures again. With the history archived, the numbers should
+follow the open tasks rather than the whole history.
+
+    python benchmarks/archival.py --users 10 --open 200 --history 5000
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from harness import load_app, percentiles
+
+ROUTES = {
+    "tasks": '/tasks',
+    "tasks_sorted": '/tasks?sort_by=due_date',
+    "tasks_priority": '/tasks?sort_by=priority',
+    "tasks_category": '/tasks?category=Work',
+    "notifications": '/api/notifications',
+}
+
+
+def measure(app, clients, requests):
+    from cache import read_cache
+    import stats as user_stats
+    from models import db
+    results = {}
+    for name, url in ROUTES.items():
+        timings = []
+        for index in range(requests):
+            user_id, client = clients[index % len(clients)]
+            read_cache.backend.clear()
+            started = time.perf_counter()
+            response = client.get(url)
+            response.get_data()
+            timings.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, (url, response.status_code)
+        results[name] = percentiles(timings)
+
+    # The weekly statistics rebuild, which also reads the archive
+    timings = []
+    with app.app_context():
+        for index in range(requests):
+            started = time.perf_counter()
+            user_stats.recompute(clients[index % len(clients)][0])
+            db.session.commit()
+            timings.append((time.perf_counter() - started) * 1000)
+    results["dashboard_rebuild"] = percentiles(timings)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--open', type=int, default=200, help='Open and recent tasks per user')
+    parser.add_argument('--history', type=int, default=5000, help='Long-completed tasks per user')
+    parser.add_argument('--history-days', type=int, default=90)
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+
+    app = load_app(ARCHIVE_AFTER_DAYS=30, ARCHIVE_BATCH_SIZE=1000)
+    from models import db, Task, ArchivedTask
+    from seed import seed, PASSWORD
+    import archive
+    with app.app_context():
+        user_ids = seed(args.users, args.open + args.history, 1)
+        # The oldest --history tasks of each user were completed long ago
+        for user_id in user_ids:
+            history = db.session.query(Task.id).filter(Task.user_id == user_id).order_by(Task.id).limit(args.history)
+            Task.query.filter(Task.id.in_(history.subquery().select())).update({
+                Task.completed: True,
+                Task.completed_at: datetime.utcnow() - timedelta(days=args.history_days),
+            }, synchronize_session=False)
+        db.session.commit()
+        print(f"{db.session.query(Task).count()} tasks, "
+              f"{db.session.query(Task).filter(Task.completed.is_(False)).count()} open")
+
+    clients = []
+    for user_id in user_ids:
+        client = app.test_client()
+        client.post('/login', data={"email": f"seed0-user{user_id}@example.com", "password": PASSWORD})
+        clients.append((user_id, client))
+
+    before = measure(app, clients, args.requests)
+    with app.app_context():
+        started = time.perf_counter()
+        while archive.archive_completed_tasks():
+            pass
+        elapsed = time.perf_counter() - started
+        archived = db.session.query(ArchivedTask).count()
+        print(f"archived {archived} tasks in {elapsed:.1f}s = {archived / elapsed:,.0f} tasks/s, "
+              f"{db.session.query(Task).count()} left in the task table")
+        if db.engine.dialect.name == 'sqlite':
+            # As the periodic checkpoint would, so reads do not go through the WAL
+            db.session.execute(db.text('PRAGMA wal_checkpoint(TRUNCATE)'))
+    after = measure(app, clients, args.requests)
+
+    for name in before:
+        print(f"{name:<18} p50 {before[name]['p50']:8.2f} -> {after[name]['p50']:8.2f} ms   "
+              f"p95 {before[name]['p95']:8.2f} -> {after[name]['p95']:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Bulk import and export throughput and memory, through /api/import and /api/export.
+
+Writes an NDJSON file of --tasks tasks and --comments comments (one million
+records by default), imports it for a fresh user through the app, then
+streams it back out as NDJSON and CSV. Reports records per second and how
+far the process's anonymous memory rose above where it started; with
+chunked inserts and streamed reads it should stay flat as the file grows.
+(Total RSS also counts the SQLite file pages mapped with SQLITE_MMAP_SIZE.)
+
+    python benchmarks/bulk_transfer.py --tasks 800000 --comments 200000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from harness import load_app
+
+
+def anonymous_mib():
+    with open('/proc/self/status') as handle:
+        for line in handle:
+            if line.startswith('RssAnon:'):
+                return int(line.split()[1]) / 1024
+
+
+class PeakMemory:
+    """Samples the anonymous resident memory of this process while active."""
+
+    def __enter__(self):
+        self.start = self.peak = anonymous_mib()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+        self._thread.join()
+
+    def _sample(self):
+        while not self._done.wait(0.05):
+            self.peak = max(self.peak, anonymous_mib())
+
+
+def write_file(path, tasks, comments):
+    rng = random.Random(0)
+    with open(path, 'w') as handle:
+        for index in range(tasks):
+            due_date = f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}" if rng.random() < 0.75 else None
+            handle.write(json.dumps({
+                "type": "task", "key": f"import-{index}", "name": f"imported task {index}",
+                "category": rng.choice(["Work", "Personal", "Urgent"]),
+                "priority": rng.choice(["Low", "Medium", "High"]),
+                "due_date": due_date, "completed": rng.random() < 0.3,
+            }) + '\n')
+        for index in range(comments):
+            handle.write(json.dumps({
+                "type": "comment", "task_key": f"import-{rng.randrange(tasks)}",
+                "content": f"imported comment {index}", "created_at": "2025-06-01T12:00:00",
+            }) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--tasks', type=int, default=800_000)
+    parser.add_argument('--comments', type=int, default=200_000)
+    args = parser.parse_args()
+    records = args.tasks + args.comments
+
+    app = load_app()
+    from seed import seed, PASSWORD
+    with app.app_context():
+        seed(1, 0, 0)
+    client = app.test_client()
+    client.post('/login', data={"email": "seed0-user1@example.com", "password": PASSWORD})
+
+    path = os.path.join(tempfile.mkdtemp(), 'import.ndjson')
+    write_file(path, args.tasks, args.comments)
+    size = os.path.getsize(path)
+    print(f"{records} records, {size / 2 ** 20:.0f} MiB of NDJSON")
+
+    with open(path, 'rb') as upload, PeakMemory() as memory:
+        started = time.perf_counter()
+        response = client.post('/api/import', input_stream=upload, content_length=size,
+                               content_type='application/x-ndjson')
+        elapsed = time.perf_counter() - started
+    assert response.status_code == 200, response.get_data(as_text=True)
+    print(f"import: {elapsed:.1f}s = {records / elapsed:,.0f} records/s, "
+          f"memory {memory.start:.0f} -> peak {memory.peak:.0f} MiB, {response.get_json()}")
+
+    for export_format in ('ndjson', 'csv'):
+        with PeakMemory() as memory:
+            started = time.perf_counter()
+            response = client.get(f'/api/export?format={export_format}', buffered=False)
+            exported = sum(len(chunk) for chunk in response.response)
+            response.close()
+            elapsed = time.perf_counter() - started
+        print(f"export {export_format}: {elapsed:.1f}s = {records / elapsed:,.0f} records/s, "
+              f"{exported / 2 ** 20:.0f} MiB, memory {memory.start:.0f} -> peak {memory.peak:.0f} MiB")
+
+
+if __name__ == '__main__':
+    main()
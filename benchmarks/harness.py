@@ -0,0 +1,89 @@
+"""Shared helpers for the benchmark scripts.
+
+Benchmarks run the app in-process. ``load_app`` must be called before anything
+imports ``config``, so the database URL and test settings take effect.
+"""
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+
+def load_app(database_url=None, **settings):
+    """Build the app against database_url (a fresh SQLite file by default) and create its schema."""
+    os.environ['DATABASE_URL'] = database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+    # Benchmarks drive a few users far past the per-user rate limits
+    os.environ.setdefault('RATE_LIMITS_ENABLED', 'false')
+    import config
+    config.Config.WTF_CSRF_ENABLED = False
+    for key, value in settings.items():
+        setattr(config.Config, key, value)
+    from app import create_app
+    from models import db
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def percentiles(samples):
+    """Return the p50, p95 and p99 of a list of millisecond timings."""
+    if len(samples) < 2:
+        value = samples[0] if samples else 0.0
+        return {"p50": value, "p95": value, "p99": value}
+    cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98]}
+
+
+class QueryCounter:
+    """Counts SQL statements executed by the current thread while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._local = threading.local()
+
+    def __enter__(self):
+        from sqlalchemy import event
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self._local.count = getattr(self._local, 'count', 0) + 1
+
+    def take(self):
+        """Return the number of statements since the last call, and reset."""
+        count = getattr(self._local, 'count', 0)
+        self._local.count = 0
+        return count
+
+
+def save_results(path, results):
+    with open(path, 'w') as handle:
+        json.dump(results, handle, indent=2, sort_keys=True)
+
+
+def compare(results, baseline_path):
+    """Print each route's p95 and query count next to a saved baseline run."""
+    with open(baseline_path) as handle:
+        baseline = json.load(handle)
+    print(f"\nCompared with {baseline_path}:")
+    for name, current in results["routes"].items():
+        previous = baseline.get("routes", {}).get(name)
+        if previous is None:
+            continue
+        change = (current["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] * 100 if previous["p95_ms"] else 0
+        print(f"  {name:<22} p95 {previous['p95_ms']:8.2f} -> {current['p95_ms']:8.2f} ms ({change:+.0f}%)"
+              f"   queries {previous['queries']} -> {current['queries']}")
+    if "load" in baseline and "load" in results:
+        print(f"  {'load throughput':<22} {baseline['load']['requests_per_second']:8.1f} -> "
+              f"{results['load']['requests_per_second']:8.1f} req/s")
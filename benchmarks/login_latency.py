@@ -0,0 +1,100 @@
+"""Login latency under a login burst, with and without the hashing pool.
+
+Runs the app in-process against a throwaway SQLite database. For each
+PASSWORD_HASH_WORKERS setting it fires a burst of concurrent logins while
+other threads keep requesting the task list, and reports latency percentiles
+for both. With inline hashing (0 workers) the burst competes with the task
+list for every core; with a pool it is limited to the pool's processes.
+
+    python benchmarks/login_latency.py --workers 0 2 --logins 200 --concurrency 16
+"""
+import argparse
+import threading
+import time
+
+from harness import load_app, percentiles
+
+
+def timed(samples, call):
+    started = time.perf_counter()
+    response = call()
+    samples.append((time.perf_counter() - started) * 1000)
+    assert response.status_code in (200, 302), response.status_code
+
+
+def run(app, workers, logins, concurrency, users):
+    app.config['PASSWORD_HASH_WORKERS'] = workers
+    login_times, list_times = [], []
+    done = threading.Event()
+    remaining = iter(range(logins))
+    remaining_lock = threading.Lock()
+
+    def log_in():
+        client = app.test_client()
+        while True:
+            with remaining_lock:
+                index = next(remaining, None)
+            if index is None:
+                return
+            email = f'user{index % users}@example.com'
+            timed(login_times, lambda: client.post('/login', data={"email": email, "password": "password1"}))
+            client.get('/logout')
+
+    def browse():
+        client = app.test_client()
+        client.post('/login', data={"email": 'user0@example.com', "password": "password1"})
+        while not done.is_set():
+            timed(list_times, lambda: client.get('/tasks?sort_by=due_date'))
+
+    browsers = [threading.Thread(target=browse) for _ in range(2)]
+    for thread in browsers:
+        thread.start()
+    time.sleep(0.5)
+    list_times.clear()
+
+    loggers = [threading.Thread(target=log_in) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in loggers:
+        thread.start()
+    for thread in loggers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    for thread in browsers:
+        thread.join()
+
+    print(f"workers={workers}: {logins} logins in {elapsed:.1f}s")
+    for label, samples in (("login", login_times), ("task list", list_times)):
+        cuts = percentiles(samples)
+        print(f"  {label:<10} n={len(samples):<5} " + "  ".join(f"{k}={v:.0f}ms" for k, v in cuts.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 2],
+                        help='PASSWORD_HASH_WORKERS settings to compare (0 hashes inline)')
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--users', type=int, default=20)
+    args = parser.parse_args()
+
+    app = load_app()
+    from models import db, User, Task
+
+    with app.app_context():
+        for index in range(args.users):
+            user = User(username=f'user{index}', email=f'user{index}@example.com')
+            user.set_password('password1')
+            db.session.add(user)
+        db.session.flush()
+        db.session.add_all(
+            Task(user_id=1, name=f'task {index}', category='Work', priority='Low') for index in range(200)
+        )
+        db.session.commit()
+
+    for workers in args.workers:
+        run(app, workers, args.logins, args.concurrency, args.users)
+
+
+if __name__ == '__main__':
+    main()
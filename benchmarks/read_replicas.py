@@ -0,0 +1,143 @@
+"""Read throughput of the read-only routes as read replicas are added.
+
+Each reader process stands in for a gunicorn worker: it logs in a seeded user
+and cycles through the read-only routes, with the read cache cleared before
+every request so each one reaches the database. One writer process posts
+tasks the whole time, as the write routes would. The run is repeated with 0,
+1, 2, ... SQLite replicas (copies of the primary made with the backup API,
+as ``flask replicas sync`` does) and reports reads per second.
+
+Replicas only add read capacity when they run on their own machines; SQLite
+files on one host share its CPUs and disk, so there the numbers show the
+routing overhead and the writer no longer competing with the readers rather
+than true scaling. Point --primary and --replicas at a Postgres primary and
+its streaming replicas for the real thing.
+
+    python benchmarks/read_replicas.py --readers 4 --max-replicas 2 --seconds 10
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+ROUTES = ['/', '/tasks', '/tasks?sort_by=priority', '/api/notifications', '/tasks/archived']
+
+
+def load_app(environment):
+    os.environ.update(environment)
+    import config
+    config.Config.WTF_CSRF_ENABLED = False
+    from app import create_app
+    return create_app()
+
+
+def prepare(environment, users, tasks, fresh):
+    # Seeds a fresh primary and copies it to every SQLite replica
+    app = load_app(environment)
+    from models import db
+    from seed import seed
+    import replicas
+    with app.app_context():
+        if fresh:
+            db.create_all()
+            seed(users, tasks, 1)
+        for key in replicas.replica_keys():
+            if db.engines[key].dialect.name == 'sqlite':
+                replicas.copy_sqlite(db.engine, db.engines[key])
+
+
+def reader(index, environment, users, seconds, start, results):
+    app = load_app(environment)
+    from cache import read_cache
+    from seed import PASSWORD
+    client = app.test_client()
+    client.post('/login', data={"email": f"seed0-user{index % users + 1}@example.com", "password": PASSWORD})
+
+    start.wait()
+    ok = failed = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        read_cache.backend.clear()
+        response = client.get(ROUTES[(ok + failed) % len(ROUTES)])
+        response.get_data()
+        if response.status_code == 200:
+            ok += 1
+        else:
+            failed += 1
+    results.put((ok, failed))
+
+
+def writer(environment, seconds, start, results):
+    app = load_app(environment)
+    from seed import PASSWORD
+    client = app.test_client()
+    client.post('/login', data={"email": "seed0-user1@example.com", "password": PASSWORD})
+
+    start.wait()
+    written = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        response = client.post('/add_task', json={"name": f"write {written}", "category": "Work", "priority": "Low"})
+        written += response.status_code == 200
+    results.put(written)
+
+
+def run(environment, replica_count, args, fresh):
+    context = multiprocessing.get_context('spawn')
+    setup = context.Process(target=prepare, args=(environment, args.users, args.tasks, fresh))
+    setup.start()
+    setup.join()
+
+    start = context.Event()
+    reads, writes = context.Queue(), context.Queue()
+    readers = [
+        context.Process(target=reader, args=(index, environment, args.users, args.seconds, start, reads))
+        for index in range(args.readers)
+    ]
+    processes = readers + [context.Process(target=writer, args=(environment, args.seconds, start, writes))]
+    for process in processes:
+        process.start()
+    # Let every process import the app and log in before the clock starts
+    time.sleep(5)
+    start.set()
+    for process in processes:
+        process.join()
+    totals = [reads.get() for process in readers if process.exitcode == 0]
+    ok = sum(item[0] for item in totals)
+    failed = sum(item[1] for item in totals)
+    written = writes.get() if processes[-1].exitcode == 0 else 0
+    print(f"{replica_count} replica(s): {ok / args.seconds:8.1f} reads/s, {failed} failed reads, "
+          f"{written / args.seconds:6.1f} writes/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--max-replicas', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--users', type=int, default=4)
+    parser.add_argument('--tasks', type=int, default=2000, help='Tasks per user')
+    parser.add_argument('--primary', help='Primary database URL, seeded once; a fresh SQLite file by default')
+    parser.add_argument('--replicas', nargs='*', help='Replica URLs; fresh SQLite files by default')
+    args = parser.parse_args()
+
+    # Each worker drives its user far past the per-user rate limits
+    common = {"PASSWORD_HASH_WORKERS": "0", "RATE_LIMITS_ENABLED": "false"}
+    for replica_count in range(args.max_replicas + 1):
+        directory = tempfile.mkdtemp()
+        primary = args.primary or f"sqlite:///{os.path.join(directory, 'primary.db')}"
+        urls = args.replicas or [
+            f"sqlite:///{os.path.join(directory, f'replica{index}.db')}" for index in range(args.max_replicas)
+        ]
+        environment = {**common, "DATABASE_URL": primary, "DATABASE_REPLICA_URLS": ",".join(urls[:replica_count])}
+        # A given primary is seeded by the first run only
+        run(environment, replica_count, args, fresh=not args.primary or replica_count == 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Reminder digest throughput against a local SMTP stand-in, by worker count.
+
+Starts an SMTP server on localhost that accepts every message and waits
+--smtp-latency-ms before acknowledging it, like a remote mail server would.
+Seeds users with tasks, then for each --processes setting makes every digest
+due and runs that many `flask jobs work --burst` processes until the queue is
+drained. Reports digests per second, SMTP connections (one per batch) and the
+speed-up over a single worker.
+
+    python benchmarks/reminder_digests.py --users 400 --processes 1 2 4
+"""
+import argparse
+import os
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+
+from harness import ROOT, load_app
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Minimal SMTP server that counts connections and messages."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency):
+        super().__init__(('127.0.0.1', 0), SMTPSession)
+        self.latency = latency
+        self.connections = self.messages = 0
+        self.lock = threading.Lock()
+
+    def reset(self):
+        with self.lock:
+            self.connections = self.messages = 0
+
+
+class SMTPSession(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+        self.reply('220 sink ESMTP')
+        for line in self.rfile:
+            command = line.decode('ascii', 'replace').strip().upper()
+            if command.startswith('EHLO'):
+                self.reply('250-sink')
+                self.reply('250 8BITMIME')
+            elif command.startswith(('HELO', 'MAIL', 'RCPT', 'RSET', 'NOOP')):
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                for data in self.rfile:
+                    if data == b'.\r\n':
+                        break
+                time.sleep(self.server.latency)
+                with self.server.lock:
+                    self.server.messages += 1
+                self.reply('250 Queued')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Not implemented')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=400)
+    parser.add_argument('--tasks', type=int, default=10, help='Tasks per user')
+    parser.add_argument('--batch-size', type=int, default=25, help='DIGEST_BATCH_SIZE')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--smtp-latency-ms', type=float, default=20)
+    args = parser.parse_args()
+
+    sink = SMTPSink(args.smtp_latency_ms / 1000)
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+
+    app = load_app()
+    from models import db, User, Job
+    from seed import seed
+    with app.app_context():
+        seed(args.users, args.tasks, 0)
+
+    env = dict(
+        os.environ, FLASK_APP='app', PASSWORD_HASH_WORKERS='0',
+        MAIL_SERVER='127.0.0.1', MAIL_PORT=str(sink.server_address[1]), MAIL_USE_TLS='false',
+        MAIL_USERNAME='', MAIL_PASSWORD='', MAIL_DEFAULT_SENDER='reminders@tasknest.test',
+        DIGEST_BATCH_SIZE=str(args.batch_size), JOB_POLL_SECONDS='0.1',
+    )
+    baseline = None
+    for processes in args.processes:
+        with app.app_context():
+            db.session.query(Job).delete()
+            db.session.query(User).update({User.next_digest_at: db.func.datetime('now', '-1 minute')})
+            db.session.commit()
+        sink.reset()
+
+        started = time.perf_counter()
+        workers = [
+            subprocess.Popen([sys.executable, '-m', 'flask', 'jobs', 'work', '--burst'], cwd=ROOT, env=env)
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.wait()
+        elapsed = time.perf_counter() - started
+
+        with app.app_context():
+            left = db.session.query(Job).count()
+            due = db.session.query(User).filter(User.next_digest_at <= db.func.datetime('now')).count()
+        rate = sink.messages / elapsed
+        baseline = baseline or rate
+        print(f"{processes} worker(s): {sink.messages} digests in {elapsed:.2f}s = {rate:.1f}/s "
+              f"(x{rate / baseline:.2f}), {sink.connections} SMTP connections, "
+              f"{left} jobs left, {due} users still due")
+
+
+if __name__ == '__main__':
+    main()
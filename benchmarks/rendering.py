@@ -0,0 +1,84 @@
+"""Render time and response size of the task list for a user with many tasks.
+
+Seeds one user (2,000 tasks by default) and shows the whole list on one page,
+then times the task list and dashboard:
+- cold: the fragment cache is cleared before every request, so every task
+  row is rendered, as it was before fragment caching;
+- warm: rows are served from the fragment cache;
+- warm + br / gzip: as warm, with the response compressed on the fly.
+Response sizes are reported for each encoding.
+
+    python benchmarks/rendering.py --tasks 2000 --output rendering.json
+"""
+import argparse
+import time
+from datetime import datetime, timezone
+
+from harness import load_app, percentiles, save_results
+
+ROUTES = {
+    "tasks": '/tasks',
+    "tasks_sorted": '/tasks?sort_by=due_date',
+    "dashboard": '/',
+}
+MODES = [
+    ("cold", 'identity', True),
+    ("warm", 'identity', False),
+    ("warm_br", 'br', False),
+    ("warm_gzip", 'gzip', False),
+]
+
+
+def measure(client, url, encoding, clear, requests):
+    from cache import fragment_cache
+    timings, size = [], 0
+    for _ in range(requests):
+        if clear:
+            fragment_cache.backend.clear()
+        started = time.perf_counter()
+        response = client.get(url, headers={"Accept-Encoding": encoding})
+        size = len(response.get_data())  # Streamed responses render while being read
+        timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, (url, response.status_code)
+    return {**{f"{key}_ms": value for key, value in percentiles(timings).items()}, "bytes": size}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--tasks', type=int, default=2000, help='Tasks of the measured user')
+    parser.add_argument('--comments', type=int, default=1, help='Comments per task')
+    parser.add_argument('--per-page', type=int, help='Task list page size (default: all tasks on one page)')
+    parser.add_argument('--requests', type=int, default=30, help='Requests per route and mode')
+    parser.add_argument('--output', default='rendering-results.json')
+    args = parser.parse_args()
+
+    app = load_app(TASKS_PER_PAGE=args.per_page or args.tasks)
+    from models import db, User
+    from seed import PASSWORD, seed
+    with app.app_context():
+        user_id, = seed(1, args.tasks, args.comments)
+        email = db.session.get(User, user_id).email
+    client = app.test_client()
+    client.post('/login', data={"email": email, "password": PASSWORD})
+
+    results = {}
+    for name, url in ROUTES.items():
+        client.get(url).get_data()  # Fill the read cache
+        results[name] = {}
+        for mode, encoding, clear in MODES:
+            result = measure(client, url, encoding, clear, args.requests)
+            results[name][mode] = result
+            print(f"{name:<13} {mode:<10} p50={result['p50_ms']:8.2f}ms  p95={result['p95_ms']:8.2f}ms  "
+                  f"{result['bytes']:>9} bytes")
+        print()
+
+    save_results(args.output, {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "parameters": {key: value for key, value in vars(args).items() if key != 'output'},
+        "routes": results,
+    })
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
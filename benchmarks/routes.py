@@ -0,0 +1,166 @@
+"""Latency, throughput and query counts for the main read routes.
+
+Seeds a dataset with ``seed.seed``, then:
+1. requests each route repeatedly through the Flask test client, recording
+   p50/p95/p99 latency and the SQL statements per request;
+2. runs a concurrent load driver, with one logged-in client per thread
+   requesting a mix of routes, and reports throughput and latency.
+
+Results are written as JSON; pass a previous file as --baseline to see how a
+change moved each route.
+
+    python benchmarks/routes.py --users 20 --tasks 500 --output before.json
+    python benchmarks/routes.py --users 20 --tasks 500 --output after.json --baseline before.json
+
+By default the per-user read cache is cleared before every request, which
+also orphans the cached template fragments, so the numbers show the cost of
+building each response; --warm keeps both.
+"""
+import argparse
+import itertools
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+from harness import QueryCounter, compare, load_app, percentiles, save_results
+
+ROUTES = {
+    "dashboard": lambda task_id: '/',
+    "tasks": lambda task_id: '/tasks',
+    "tasks_sorted": lambda task_id: '/tasks?sort_by=due_date',
+    "tasks_search": lambda task_id: '/tasks?search=report',
+    "notifications": lambda task_id: '/api/notifications',
+    "task_details": lambda task_id: f'/task/{task_id}',
+}
+
+
+def log_in(app, user_id):
+    from seed import PASSWORD
+    from models import db, User
+    client = app.test_client()
+    with app.app_context():
+        email = db.session.get(User, user_id).email
+    response = client.post('/login', data={"email": email, "password": PASSWORD})
+    assert response.status_code == 302, response.status_code
+    return client
+
+
+def measure_routes(app, clients, task_ids, requests, warm):
+    from cache import read_cache
+    from models import db
+    with app.app_context():
+        engine = db.engine
+    results = {}
+    with QueryCounter(engine) as counter:
+        for name, path in ROUTES.items():
+            timings, queries = [], []
+            for index in range(requests):
+                user_id, client = clients[index % len(clients)]
+                if not warm:
+                    read_cache.backend.clear()
+                url = path(task_ids[user_id][index % len(task_ids[user_id])])
+                counter.take()
+                started = time.perf_counter()
+                response = client.get(url)
+                response.get_data()  # Streamed responses render while being read
+                timings.append((time.perf_counter() - started) * 1000)
+                queries.append(counter.take())
+                assert response.status_code == 200, (url, response.status_code)
+            results[name] = {
+                **{f"{key}_ms": value for key, value in percentiles(timings).items()},
+                "mean_ms": sum(timings) / len(timings),
+                "queries": max(queries),
+                "requests": requests,
+            }
+            print(f"{name:<15} p50={results[name]['p50_ms']:7.2f}ms  p95={results[name]['p95_ms']:7.2f}ms  "
+                  f"p99={results[name]['p99_ms']:7.2f}ms  queries={results[name]['queries']}")
+    return results
+
+
+def run_load(app, users, task_ids, threads, seconds, warm):
+    from cache import read_cache
+    timings = []
+    timings_lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def drive(user_id):
+        client = log_in(app, user_id)
+        rng = random.Random(user_id)
+        local = []
+        while time.perf_counter() < deadline:
+            if not warm:
+                read_cache.invalidate_user(user_id)
+            url = rng.choice(list(ROUTES.values()))(rng.choice(task_ids[user_id]))
+            started = time.perf_counter()
+            response = client.get(url)
+            response.get_data()
+            local.append((time.perf_counter() - started) * 1000)
+        with timings_lock:
+            timings.extend(local)
+
+    workers = [threading.Thread(target=drive, args=(user_id,)) for user_id in itertools.islice(
+        itertools.cycle(users), threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    result = {
+        "threads": threads,
+        "seconds": elapsed,
+        "requests": len(timings),
+        "requests_per_second": len(timings) / elapsed,
+        **{f"{key}_ms": value for key, value in percentiles(timings).items()},
+    }
+    print(f"\nload: {threads} threads, {result['requests_per_second']:.1f} req/s, "
+          f"p50={result['p50_ms']:.2f}ms p95={result['p95_ms']:.2f}ms p99={result['p99_ms']:.2f}ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database-url', help='Database to seed and use (default: a fresh SQLite file)')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--tasks', type=int, default=500, help='Tasks per user')
+    parser.add_argument('--comments', type=int, default=2, help='Comments per task')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=100, help='Requests per route')
+    parser.add_argument('--threads', type=int, default=8, help='Load driver threads (0 to skip)')
+    parser.add_argument('--seconds', type=float, default=10, help='Load driver duration')
+    parser.add_argument('--warm', action='store_true', help='Keep the read cache between requests')
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--baseline', help='Earlier results file to compare against')
+    args = parser.parse_args()
+
+    app = load_app(args.database_url)
+    from models import db, Task
+    from seed import seed
+    with app.app_context():
+        started = time.perf_counter()
+        users = seed(args.users, args.tasks, args.comments, args.seed)
+        print(f"Seeded {args.users} users x {args.tasks} tasks x {args.comments} comments "
+              f"in {time.perf_counter() - started:.1f}s\n")
+        task_ids = {
+            user_id: [task_id for task_id, in db.session.query(Task.id).filter_by(user_id=user_id).limit(200)]
+            for user_id in users
+        }
+
+    clients = [(user_id, log_in(app, user_id)) for user_id in users]
+    results = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')},
+        "routes": measure_routes(app, clients, task_ids, args.requests, args.warm),
+    }
+    if args.threads:
+        results["load"] = run_load(app, users, task_ids, args.threads, args.seconds, args.warm)
+
+    save_results(args.output, results)
+    print(f"\nResults written to {args.output}")
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Task write throughput as the users' data is spread over more shards.
+
+Each process stands in for a gunicorn worker: it logs in its own user and
+posts tasks through the app for a fixed time, as in write_throughput.py. The
+run is repeated with 0 (everything in the global database), 1, 2, ... SQLite
+shard files; new users are spread evenly over the shards, so each shard's
+write lock is shared by fewer workers. Reports committed writes per second.
+
+Separate SQLite files only take writes in parallel when there are cores and
+disk bandwidth to spare; on a single core the workers queue for the CPU
+instead of the write lock and the numbers stay roughly flat. The gain shows
+with a core per shard, or with shards on their own database servers.
+
+    python benchmarks/sharding.py --processes 4 --max-shards 4 --seconds 10
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+
+def load_app(environment):
+    os.environ.update(environment)
+    import config
+    config.Config.WTF_CSRF_ENABLED = False
+    from app import create_app
+    return create_app()
+
+
+def prepare(environment, processes):
+    # Creates the global schema, every shard's schema and the users once
+    app = load_app(environment)
+    from models import db
+    import shards
+    with app.app_context():
+        db.create_all()
+        for key in shards.shard_keys():
+            shards.create_schema(db.engines[key])
+    client = app.test_client()
+    for index in range(processes):
+        client.post('/register', data={
+            "username": f"bench{index}", "email": f"bench{index}@example.com",
+            "password": "password1", "confirm_password": "password1",
+        })
+
+
+def worker(index, environment, seconds, start, results):
+    app = load_app(environment)
+    # Failed writes are counted below rather than logged
+    app.logger.disabled = True
+    client = app.test_client()
+    client.post('/login', data={"email": f"bench{index}@example.com", "password": "password1"})
+
+    start.wait()
+    ok = failed = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        response = client.post('/add_task', json={"name": f"task {ok}", "category": "Work", "priority": "Low"})
+        if response.status_code == 200:
+            ok += 1
+        else:
+            failed += 1
+    results.put((ok, failed))
+
+
+def run(environment, shard_count, processes, seconds):
+    context = multiprocessing.get_context('spawn')
+    setup = context.Process(target=prepare, args=(environment, processes))
+    setup.start()
+    setup.join()
+
+    start = context.Event()
+    results = context.Queue()
+    workers = [
+        context.Process(target=worker, args=(index, environment, seconds, start, results))
+        for index in range(processes)
+    ]
+    for process in workers:
+        process.start()
+    # Let every process import the app and log in before the clock starts
+    time.sleep(5)
+    start.set()
+    for process in workers:
+        process.join()
+    totals = [results.get() for process in workers if process.exitcode == 0]
+    if len(totals) < processes:
+        print(f"{shard_count} shard(s): {processes - len(totals)} worker processes crashed")
+    ok = sum(item[0] for item in totals)
+    failed = sum(item[1] for item in totals)
+    print(f"{shard_count} shard(s): {ok / seconds:8.1f} writes/s, {failed} failed requests")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--max-shards', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    # Each worker drives its user far past the per-user rate limits
+    common = {"PASSWORD_HASH_WORKERS": "0", "RATE_LIMITS_ENABLED": "false"}
+    for shard_count in range(args.max_shards + 1):
+        directory = tempfile.mkdtemp()
+        urls = [f"sqlite:///{os.path.join(directory, f'shard{index}.db')}" for index in range(shard_count)]
+        environment = {
+            **common,
+            "DATABASE_URL": f"sqlite:///{os.path.join(directory, 'global.db')}",
+            "DATABASE_SHARD_URLS": ",".join(urls),
+        }
+        run(environment, shard_count, args.processes, args.seconds)
+
+
+if __name__ == '__main__':
+    main()
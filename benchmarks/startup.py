@@ -0,0 +1,131 @@
+"""App startup time and memory per gunicorn worker.
+
+1. Times building the app in a fresh interpreter (imports included), as a
+   worker without --preload does when it boots.
+2. Starts gunicorn with gunicorn.conf.py, with and without --preload, and
+   reports the time until all workers answer and each worker's unique (USS)
+   and proportional (PSS) memory after a few requests. With --preload the
+   workers share the pages the master filled before forking, so their USS
+   is what each extra worker really costs.
+
+Runs against a fresh SQLite database whose schema is created beforehand.
+
+    python benchmarks/startup.py --workers 4
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+PREPARE = """
+from flask import Flask
+from models import db
+app = Flask('prepare')
+app.config['SQLALCHEMY_DATABASE_URI'] = {url!r}
+db.init_app(app)
+with app.app_context():
+    db.create_all()
+"""
+
+BUILD = """
+import time
+started = time.perf_counter()
+import {module}
+app = {module}.{expression}
+print(time.perf_counter() - started)
+"""
+
+
+def build_time(env, app_spec, repeats):
+    module, expression = app_spec.split(':')
+    code = BUILD.format(module=module, expression=expression)
+    samples = [
+        float(subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, check=True,
+                             capture_output=True, text=True).stdout.split()[-1])
+        for _ in range(repeats)
+    ]
+    return statistics.median(samples) * 1000
+
+
+def children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as handle:
+        return [int(child) for child in handle.read().split()]
+
+
+def memory(pid):
+    """Return the USS and PSS of a process in MiB."""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as handle:
+        for line in handle:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    uss = fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+    return uss / 1024, fields.get('Pss', 0) / 1024
+
+
+def run_gunicorn(env, app_spec, workers, preload, port, requests):
+    command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--workers', str(workers),
+               '--worker-class', 'gthread', '--threads', '4', '--bind', f'127.0.0.1:{port}', app_spec]
+    if preload:
+        command.insert(-1, '--preload')
+    started = time.perf_counter()
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stderr=subprocess.DEVNULL)
+    try:
+        url = f'http://127.0.0.1:{port}/login'
+        while True:
+            try:
+                urllib.request.urlopen(url, timeout=1).read()
+                if len(children(server.pid)) == workers:
+                    break
+            except OSError:
+                pass
+            if server.poll() is not None:
+                raise RuntimeError('gunicorn exited during startup')
+            time.sleep(0.02)
+        ready = (time.perf_counter() - started) * 1000
+        for _ in range(requests):
+            urllib.request.urlopen(url, timeout=5).read()
+        usage = [memory(pid) for pid in children(server.pid)]
+    finally:
+        server.terminate()
+        server.wait()
+    return {
+        "ready_ms": ready,
+        "worker_uss_mib": statistics.mean(uss for uss, pss in usage),
+        "worker_pss_mib": statistics.mean(pss for uss, pss in usage),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--app', default='app:create_app()', help='WSGI app, as given to gunicorn')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--repeats', type=int, default=5, help='Builds to time in fresh interpreters')
+    parser.add_argument('--requests', type=int, default=50, help='Requests sent before measuring memory')
+    parser.add_argument('--port', type=int, default=8123)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    url = 'sqlite:///' + os.path.join(directory, 'startup.db')
+    env = dict(os.environ, DATABASE_URL=url, PASSWORD_HASH_WORKERS='0',
+               PROMETHEUS_MULTIPROC_DIR=os.path.join(directory, 'metrics'))
+    os.makedirs(env['PROMETHEUS_MULTIPROC_DIR'])
+    subprocess.run([sys.executable, '-c', PREPARE.format(url=url)], cwd=ROOT, env=env, check=True)
+
+    print(f"app build in a fresh interpreter: {build_time(env, args.app, args.repeats):.0f}ms (median)")
+    for preload in (False, True):
+        result = run_gunicorn(env, args.app, args.workers, preload, args.port, args.requests)
+        print(f"gunicorn {args.workers} workers{' --preload' if preload else '':<10}  "
+              f"ready in {result['ready_ms']:6.0f}ms  per worker: USS {result['worker_uss_mib']:5.1f} MiB, "
+              f"PSS {result['worker_pss_mib']:5.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
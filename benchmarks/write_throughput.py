@@ -0,0 +1,127 @@
+"""Task write throughput with several worker processes sharing one database.
+
+Each process stands in for a gunicorn worker: it logs in its own user and
+posts tasks through the app for a fixed time. The run is repeated per engine
+profile and reports committed writes per second and failed requests.
+
+Profiles:
+- sqlite-default: rollback journal, synchronous=FULL, no busy timeout
+- sqlite-tuned:   the SQLite profile from database.py
+- postgres:       DATABASE_URL, when it points at Postgres
+
+    python benchmarks/write_throughput.py --processes 4 --seconds 10
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+PROFILES = {
+    "sqlite-default": {
+        "SQLITE_JOURNAL_MODE": "DELETE",
+        "SQLITE_SYNCHRONOUS": "FULL",
+        "SQLITE_BUSY_TIMEOUT_MS": "0",
+        "SQLITE_CACHE_SIZE_KB": "2000",
+        "SQLITE_MMAP_SIZE": "0",
+    },
+    "sqlite-tuned": {},
+}
+
+
+def load_app(environment):
+    os.environ.update(environment)
+    import config
+    config.Config.WTF_CSRF_ENABLED = False
+    from app import create_app
+    return create_app()
+
+
+def prepare(environment, processes):
+    # Creates the schema and users once, before the workers race for them
+    app = load_app(environment)
+    from models import db
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    for index in range(processes):
+        client.post('/register', data={
+            "username": f"bench{index}", "email": f"bench{index}@example.com",
+            "password": "password1", "confirm_password": "password1",
+        })
+
+
+def worker(index, environment, seconds, start, results):
+    app = load_app(environment)
+    # Failed writes are counted below rather than logged
+    app.logger.disabled = True
+    client = app.test_client()
+    client.post('/login', data={"email": f"bench{index}@example.com", "password": "password1"})
+
+    start.wait()
+    ok = failed = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        response = client.post('/add_task', json={"name": f"task {ok}", "category": "Work", "priority": "Low"})
+        if response.status_code == 200:
+            ok += 1
+        else:
+            failed += 1
+    results.put((ok, failed))
+
+
+def run(profile, environment, processes, seconds):
+    context = multiprocessing.get_context('spawn')
+    setup = context.Process(target=prepare, args=(environment, processes))
+    setup.start()
+    setup.join()
+
+    start = context.Event()
+    results = context.Queue()
+    workers = [
+        context.Process(target=worker, args=(index, environment, seconds, start, results))
+        for index in range(processes)
+    ]
+    for process in workers:
+        process.start()
+    # Let every process import the app and log in before the clock starts
+    time.sleep(5)
+    start.set()
+    for process in workers:
+        process.join()
+    totals = [results.get() for process in workers if process.exitcode == 0]
+    if len(totals) < processes:
+        print(f"{profile:<15} {processes - len(totals)} worker processes crashed")
+    ok = sum(item[0] for item in totals)
+    failed = sum(item[1] for item in totals)
+    print(f"{profile:<15} {processes} processes: {ok / seconds:8.1f} writes/s, {failed} failed requests")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--profiles', nargs='+', default=['sqlite-default', 'sqlite-tuned', 'postgres'])
+    args = parser.parse_args()
+
+    # Each worker drives its user far past the per-user rate limits
+    common = {"PASSWORD_HASH_WORKERS": "0", "RATE_LIMITS_ENABLED": "false"}
+    for profile in args.profiles:
+        if profile == 'postgres':
+            url = os.environ.get('DATABASE_URL', '')
+            if not url.startswith(('postgres://', 'postgresql://')):
+                print("postgres        skipped: DATABASE_URL does not point at Postgres")
+                continue
+            environment = {**common, "DATABASE_URL": url}
+        else:
+            database = os.path.join(tempfile.mkdtemp(), 'bench.db')
+            environment = {**common, **PROFILES[profile], "DATABASE_URL": f"sqlite:///{database}"}
+        run(profile, environment, args.processes, args.seconds)
+
+
+if __name__ == '__main__':
+    main()
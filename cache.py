@@ -0,0 +1,273 @@
+"""Per-user read cache.
+
+Cached values are keyed by user and by the user's data version, so a write
+invalidates everything cached for that user without touching the cache: the
+write bumps the user's revision (see ``sync.touch``) and the old keys are
+never asked for again, ageing out of the backend instead.
+
+The version also carries a per-user generation token stored in the cache
+itself. ``invalidate_user`` drops it, which orphans every entry for the user
+even if a new account later reuses the same id.
+
+``identity_cache`` keeps the fields ``load_user`` needs to authorize a
+request for a short TTL. The routes that change those fields invalidate it,
+which bumps the user's identity version in a file every worker on the host
+maps into memory (``IDENTITY_VERSIONS_FILE``); an entry cached at another
+version is loaded again, so the change takes effect on the next request
+whichever worker serves it. Across hosts, a shared ``CACHE_BACKEND`` carries
+the invalidation.
+
+``fragment_cache`` holds rendered template fragments (see templating.py),
+keyed by the revision of the data they show.
+
+Backends implement ``get``, ``set`` and ``delete``. The default is an
+in-process LRU with a TTL; ``CACHE_BACKEND`` names any other class with the
+same interface, such as a shared cache client.
+"""
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from importlib import import_module
+
+import metrics
+import sync
+
+# Returned by backends for keys they do not hold
+MISSING = object()
+
+# Identity versions: one counter per slot, users sharing a slot by id
+VERSION = struct.Struct('<Q')
+VERSION_SLOTS = 65536
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache whose entries expire after a TTL."""
+
+    def __init__(self, max_entries=10000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def make_backend(app, ttl, max_entries=None):
+    """Instantiate the configured cache backend."""
+    app.config.setdefault('CACHE_BACKEND', 'cache.LRUCache')
+    app.config.setdefault('CACHE_MAX_ENTRIES', 10000)
+    module_name, class_name = app.config['CACHE_BACKEND'].rsplit('.', 1)
+    backend_class = getattr(import_module(module_name), class_name)
+    return backend_class(max_entries=max_entries or app.config['CACHE_MAX_ENTRIES'], ttl=ttl)
+
+
+class UserCache:
+    """
+        Cache of values derived from one user's data.
+        - get_or_compute serves a value for the user's current data version
+        - invalidate_user drops everything cached for a user
+        Hits and misses are counted per namespace in metrics.CACHE_LOOKUPS.
+        """
+
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_TTL_SECONDS', 300)
+        self.backend = make_backend(app, app.config['CACHE_TTL_SECONDS'])
+
+    def get_or_compute(self, namespace, user_id, compute, *parts):
+        """
+            Return the cached value of namespace for user_id, computing and
+            storing it on a miss. parts distinguish variants that depend on
+            more than the user's data, such as today's date.
+            """
+        key = (namespace, user_id, self._version(user_id)) + parts
+        value = self.backend.get(key)
+        hit = value is not MISSING
+        metrics.CACHE_LOOKUPS.labels(namespace, 'hit' if hit else 'miss').inc()
+        if not hit:
+            value = compute()
+            self.backend.set(key, value)
+        return value
+
+    def invalidate_user(self, user_id):
+        """Drop every cached value for user_id."""
+        self.backend.delete(('generation', user_id))
+
+    def generation(self, user_id):
+        """Return the user's generation token, creating one if it is missing."""
+        generation = self.backend.get(('generation', user_id))
+        if generation is MISSING:
+            generation = uuid.uuid4().hex
+            # Outlives the entries it guards; losing it only causes misses
+            self.backend.set(('generation', user_id), generation, ttl=24 * 60 * 60)
+        return generation
+
+    def _version(self, user_id):
+        return sync.current_revision(user_id), self.generation(user_id)
+
+
+class SharedVersions:
+    """
+        Version counters shared by the processes on a host, one per user.
+        - get reads the user's version
+        - bump changes it, for every process at once
+        Users whose ids share a slot also share a version, so a bump for one
+        only costs the other a cache miss.
+        """
+
+    def __init__(self, path):
+        self.path = path
+        # fcntl locks belong to the process, so its threads also take this one
+        self._lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._map = None
+
+    def get(self, user_id):
+        # Counters are aligned 8-byte words, read without the lock
+        self._open()
+        return VERSION.unpack_from(self._map, self._offset(user_id))[0]
+
+    def bump(self, user_id):
+        self._open()
+        offset = self._offset(user_id)
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, VERSION.size, offset)
+            try:
+                VERSION.pack_into(self._map, offset, VERSION.unpack_from(self._map, offset)[0] + 1)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, VERSION.size, offset)
+
+    def _offset(self, user_id):
+        return (user_id % VERSION_SLOTS) * VERSION.size
+
+    def _open(self):
+        # Mappings are inherited by forked workers, but fcntl locks are not
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            size = VERSION.size * VERSION_SLOTS
+            fcntl.lockf(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_size != size:
+                    os.ftruncate(fd, size)
+                self._map = mmap.mmap(fd, size)
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN)
+            self._fd = fd
+            self._pid = os.getpid()
+
+
+class IdentityCache:
+    """
+        Short-lived cache of the user fields needed to authorize requests.
+        - get returns the cached fields, loading them on a miss or when the
+          user's identity version has changed since they were cached
+        - invalidate drops a user's entry after a change to those fields, in
+          every worker on the host
+        """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.versions = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('IDENTITY_CACHE_TTL_SECONDS', 30)
+        self.backend = make_backend(app, app.config['IDENTITY_CACHE_TTL_SECONDS'])
+        self.versions = SharedVersions(app.config['IDENTITY_VERSIONS_FILE'])
+
+    def get(self, user_id, load):
+        """Return the cached fields of user_id, or call load; None results are not cached."""
+        key = ('identity', user_id)
+        # Read before loading, so a change made during the load misses next time
+        version = self.versions.get(user_id)
+        entry = self.backend.get(key)
+        if entry is not MISSING and entry[0] == version:
+            return entry[1]
+        fields = load()
+        if fields is not None:
+            self.backend.set(key, (version, fields))
+        return fields
+
+    def invalidate(self, user_id):
+        self.versions.bump(user_id)
+        self.backend.delete(('identity', user_id))
+
+
+class FragmentCache:
+    """
+        Rendered template fragments, such as one row of the task list.
+        - get_or_render returns the cached markup, rendering it on a miss
+        The key parts must change whenever the markup would, e.g. a task's id
+        and revision. Keys also carry the user's read cache generation, so
+        invalidate_user drops a user's fragments too.
+        """
+
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('FRAGMENT_CACHE_MAX_ENTRIES', 20000)
+        app.config.setdefault('FRAGMENT_CACHE_TTL_SECONDS', 3600)
+        # A separate backend, so fragments do not evict the read cache's entries
+        self.backend = make_backend(
+            app, app.config['FRAGMENT_CACHE_TTL_SECONDS'], app.config['FRAGMENT_CACHE_MAX_ENTRIES']
+        )
+
+    def get_or_render(self, user_id, parts, render):
+        key = ('fragment', user_id, read_cache.generation(user_id)) + tuple(parts)
+        markup = self.backend.get(key)
+        if markup is MISSING:
+            markup = render()
+            self.backend.set(key, markup)
+        return markup
+
+
+read_cache = UserCache()
+identity_cache = IdentityCache()
+fragment_cache = FragmentCache()
@@ -0,0 +1,113 @@
+"""On-the-fly gzip and brotli compression of HTML, JSON and export responses.
+
+Responses of a compressible type are compressed with the best encoding the
+client accepts: brotli when the ``brotli`` package is installed, otherwise
+gzip. Buffered responses are compressed only from ``COMPRESS_MIN_SIZE`` bytes
+up, since below that the headers outweigh the savings. Streamed responses
+have no known size and are always compressed as they stream. The compressor
+is flushed every ``COMPRESS_STREAM_FLUSH_BYTES`` of input, so the browser can
+start rendering before the stream ends.
+
+Responses that already carry a Content-Encoding, such as the precompressed
+static assets, are left alone, and so are event streams.
+"""
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip is used instead
+    brotli = None
+
+
+def init_app(app):
+    app.config.setdefault('COMPRESS_MIMETYPES', ['text/html', 'application/json', 'application/x-ndjson', 'text/csv'])
+    app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+    app.config.setdefault('COMPRESS_BROTLI_QUALITY', 4)
+    app.config.setdefault('COMPRESS_STREAM_FLUSH_BYTES', 16 * 1024)
+
+    @app.after_request
+    def compress_response(response):
+        config = app.config
+        if (response.mimetype not in config['COMPRESS_MIMETYPES'] or response.content_encoding
+                or response.direct_passthrough or not 200 <= response.status_code < 300
+                or response.status_code == 204):
+            return response
+        encoding = choose_encoding()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            compressor = _Compressor(encoding, config)
+            response.response = _compress_stream(
+                response.response, compressor, config['COMPRESS_STREAM_FLUSH_BYTES']
+            )
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < config['COMPRESS_MIN_SIZE']:
+                return response
+            compressor = _Compressor(encoding, config)
+            response.set_data(compressor.compress(data) + compressor.finish())
+
+        response.content_encoding = encoding
+        response.vary.add('Accept-Encoding')
+        # The compressed body is a different representation of the same content
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+def choose_encoding():
+    """Return the preferred encoding accepted by the client, or None."""
+    for encoding in ('br', 'gzip'):
+        if encoding == 'br' and brotli is None:
+            continue
+        if request.accept_encodings.quality(encoding) > 0:
+            return encoding
+    return None
+
+
+class _Compressor:
+    """Common interface over zlib and brotli compressor objects."""
+
+    def __init__(self, encoding, config):
+        if encoding == 'br':
+            self._brotli = brotli.Compressor(quality=config['COMPRESS_BROTLI_QUALITY'])
+            self._zlib = None
+        else:
+            # wbits 31 writes a gzip header and trailer
+            self._zlib = zlib.compressobj(config['COMPRESS_LEVEL'], zlib.DEFLATED, 31)
+            self._brotli = None
+
+    def compress(self, data):
+        return self._zlib.compress(data) if self._zlib else self._brotli.process(data)
+
+    def flush(self):
+        return self._zlib.flush(zlib.Z_SYNC_FLUSH) if self._zlib else self._brotli.flush()
+
+    def finish(self):
+        return self._zlib.flush() if self._zlib else self._brotli.finish()
+
+
+def _compress_stream(chunks, compressor, flush_bytes):
+    pending = 0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            pending += len(chunk)
+            data = compressor.compress(chunk)
+            if pending >= flush_bytes:
+                data += compressor.flush()
+                pending = 0
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        # Lets generators such as stream_template run their cleanup
+        if hasattr(chunks, 'close'):
+            chunks.close()
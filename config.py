@@ -1,4 +1,6 @@
 import os
+import re
+import tempfile
 
 # Base directory of the application
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
@@ -6,17 +8,163 @@ BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
 class Config:
     # Database configuration
-    # Defines the URI for the SQLite database. The database file will be located in the base directory of the project.
-    SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(BASE_DIR, 'tasknest.db')}"
+    # Taken from DATABASE_URL; defaults to an SQLite database file in the base directory of the project.
+    # Hosting providers still hand out postgres:// URLs, which SQLAlchemy no longer accepts.
+    SQLALCHEMY_DATABASE_URI = re.sub(
+        r"^postgres://", "postgresql://",
+        os.environ.get("DATABASE_URL", f"sqlite:///{os.path.join(BASE_DIR, 'tasknest.db')}"),
+    )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Read replicas (see replicas.py): comma-separated database URLs, and how
+    # long a user who wrote keeps reading from the primary
+    DATABASE_REPLICA_URLS = [
+        re.sub(r"^postgres://", "postgresql://", url.strip())
+        for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if url.strip()
+    ]
+    REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", 5))
+
+    # Shards of users' data (see shards.py): comma-separated database URLs, in
+    # a fixed order, since users refer to their shard by its position
+    DATABASE_SHARD_URLS = [
+        re.sub(r"^postgres://", "postgresql://", url.strip())
+        for url in os.environ.get("DATABASE_SHARD_URLS", "").split(",") if url.strip()
+    ]
+
+    # SQLite profile (see database.py): applied to every connection
+    SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", 20000))
+    SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+
+    # Postgres profile: connection pool per worker process and a server-side statement timeout
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+    DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", 5000))
+
     # Secret key for CSRF and session management
     # Retrieves the secret key from an environment variable or defaults to a hardcoded value.
     SECRET_KEY = os.environ.get("SECRET_KEY", "a-very-secret-key")
 
+    # Password hashing method and cost (any werkzeug method, e.g.
+    # "scrypt:32768:8:1"); hashes made otherwise are upgraded at next login.
+    # Hashing runs in a pool of this many processes per worker; 0 hashes inline.
+    PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "pbkdf2:sha256:600000")
+    PASSWORD_SALT_LENGTH = int(os.environ.get("PASSWORD_SALT_LENGTH", 16))
+    PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+
+    # Number of tasks shown per page of the task list
+    TASKS_PER_PAGE = int(os.environ.get("TASKS_PER_PAGE", 50))
+
+    # Largest number of tasks accepted by one batch request
+    MAX_BATCH_TASKS = int(os.environ.get("MAX_BATCH_TASKS", 500))
+
+    # Notification stream: keep-alive interval, and how often each worker checks
+    # streamed users for writes made by other workers
+    NOTIFICATION_HEARTBEAT_SECONDS = int(os.environ.get("NOTIFICATION_HEARTBEAT_SECONDS", 15))
+    NOTIFICATION_RESYNC_SECONDS = int(os.environ.get("NOTIFICATION_RESYNC_SECONDS", 30))
+
+    # Per-user read cache: backend class, its size, and how long entries live.
+    # Entries are also invalidated whenever the user writes.
+    CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "cache.LRUCache")
+    CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 10000))
+    CACHE_TTL_SECONDS = int(os.environ.get("CACHE_TTL_SECONDS", 300))
+
+    # How long load_user trusts a cached identity before reading the user again
+    IDENTITY_CACHE_TTL_SECONDS = int(os.environ.get("IDENTITY_CACHE_TTL_SECONDS", 30))
+    # File shared by the workers on one host, where a change to a user's
+    # identity is announced to every worker's cache at once
+    IDENTITY_VERSIONS_FILE = os.environ.get(
+        "IDENTITY_VERSIONS_FILE", os.path.join(tempfile.gettempdir(), "tasknest-identity")
+    )
+
+    # Background purge of deleted accounts: rows per transaction, pause between
+    # chunks, and how often to look for accounts deleted by other processes
+    ACCOUNT_PURGE_CHUNK_SIZE = int(os.environ.get("ACCOUNT_PURGE_CHUNK_SIZE", 500))
+    ACCOUNT_PURGE_PAUSE_MS = int(os.environ.get("ACCOUNT_PURGE_PAUSE_MS", 20))
+    ACCOUNT_PURGE_INTERVAL_SECONDS = int(os.environ.get("ACCOUNT_PURGE_INTERVAL_SECONDS", 300))
+
+    # Rendered template fragments (task rows, dashboard widgets): entries per
+    # worker and how long they live. Keys change with the data they show.
+    FRAGMENT_CACHE_MAX_ENTRIES = int(os.environ.get("FRAGMENT_CACHE_MAX_ENTRIES", 20000))
+    FRAGMENT_CACHE_TTL_SECONDS = int(os.environ.get("FRAGMENT_CACHE_TTL_SECONDS", 3600))
+
+    # Directory for compiled template bytecode, reused across worker restarts
+    TEMPLATE_CACHE_DIR = os.environ.get(
+        "TEMPLATE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "tasknest-templates")
+    )
+
+    # HTML and JSON responses from this many bytes up are gzip/brotli compressed
+    COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", 500))
+
+    # Serve the static assets under content-hashed, precompressed, immutable URLs (see assets.py)
+    STATIC_FINGERPRINT = os.environ.get("STATIC_FINGERPRINT", "true").lower() in ("1", "true", "yes")
+
+    # Admission control (see admission.py): token buckets per endpoint for each
+    # logged-in user and each client address, as "<requests>/<second|minute|hour>"
+    # (also the burst allowed), refilled evenly over the period
+    RATE_LIMITS_ENABLED = os.environ.get("RATE_LIMITS_ENABLED", "true").lower() in ("1", "true", "yes")
+    RATE_LIMITS = {
+        "main.login": {"ip": "20/minute"},
+        "main.register": {"ip": "5/minute"},
+        "main.forgot_password": {"ip": "5/minute"},
+        "main.add_task": {"user": "60/minute", "ip": "300/minute"},
+        "main.add_tasks_batch": {"user": "20/minute", "ip": "100/minute"},
+        "main.update_task": {"user": "120/minute", "ip": "600/minute"},
+        "main.delete_task": {"user": "120/minute", "ip": "600/minute"},
+        "main.add_comment": {"user": "60/minute", "ip": "300/minute"},
+        "main.import_data": {"user": "5/minute", "ip": "20/minute"},
+        "main.get_notifications": {"user": "30/minute", "ip": "300/minute"},
+        "main.get_task_changes": {"user": "60/minute", "ip": "600/minute"},
+        "main.notification_stream": {"user": "10/minute", "ip": "60/minute"},
+    }
+    # Proxies in front of the app that append to X-Forwarded-For (1 on Heroku);
+    # 0 takes the client address from the connection
+    RATE_LIMIT_TRUSTED_PROXIES = int(os.environ.get("RATE_LIMIT_TRUSTED_PROXIES", 0))
+    # Requests served at once over all workers on this host; more are turned
+    # away with a 503 rather than queued for a database connection. 0 disables it.
+    MAX_CONCURRENT_REQUESTS = int(os.environ.get("MAX_CONCURRENT_REQUESTS", 32))
+    # File shared by the workers on one host, and the number of buckets it holds
+    ADMISSION_STATE_FILE = os.environ.get(
+        "ADMISSION_STATE_FILE", os.path.join(tempfile.gettempdir(), "tasknest-admission")
+    )
+    ADMISSION_BUCKETS = int(os.environ.get("ADMISSION_BUCKETS", 65536))
+
+    # Bearer token required to read /metrics; without one, /metrics is not served
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+    # Background jobs (see jobs.py): jobs a worker claims at a time, how long an
+    # idle worker sleeps, attempts before a job is given up, the retry backoff
+    # range, and the age at which a worker's lock is considered abandoned
+    JOB_CLAIM_SIZE = int(os.environ.get("JOB_CLAIM_SIZE", 1))
+    JOB_POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", 5))
+    JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 5))
+    JOB_RETRY_BASE_SECONDS = int(os.environ.get("JOB_RETRY_BASE_SECONDS", 30))
+    JOB_RETRY_MAX_SECONDS = int(os.environ.get("JOB_RETRY_MAX_SECONDS", 3600))
+    JOB_LOCK_TIMEOUT_SECONDS = int(os.environ.get("JOB_LOCK_TIMEOUT_SECONDS", 900))
+
+    # Daily reminder digests (see digests.py): users per job, each job using one
+    # SMTP connection, and the hour (UTC) at which digests become due
+    DIGEST_BATCH_SIZE = int(os.environ.get("DIGEST_BATCH_SIZE", 50))
+    DIGEST_HOUR = int(os.environ.get("DIGEST_HOUR", 7))
+
+    # Bulk export and import (see transfer.py): rows an export reads per batch,
+    # and records per bulk insert, each its own transaction
+    EXPORT_YIELD_PER = int(os.environ.get("EXPORT_YIELD_PER", 1000))
+    IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", 5000))
+
+    # Archival (see archive.py): days after completion at which a task moves to
+    # the archive tables (0 keeps every task in place), and tasks moved per transaction
+    ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", 30))
+    ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", 500))
+
     # Email server configuration
-    MAIL_SERVER = 'smtp.gmail.com'  # Specifies the email server (Gmail SMTP server in this case)
-    MAIL_PORT = 587  # Port for the email server
-    MAIL_USE_TLS = True
+    MAIL_SERVER = os.environ.get("MAIL_SERVER", "smtp.gmail.com")  # Specifies the email server (Gmail SMTP by default)
+    MAIL_PORT = int(os.environ.get("MAIL_PORT", 587))  # Port for the email server
+    MAIL_USE_TLS = os.environ.get("MAIL_USE_TLS", "true").lower() in ("1", "true", "yes")
     MAIL_USERNAME = os.environ.get("MAIL_USERNAME", "your-email@gmail.com")
     MAIL_PASSWORD = os.environ.get("MAIL_PASSWORD", "your-app-password")
+    MAIL_DEFAULT_SENDER = os.environ.get("MAIL_DEFAULT_SENDER", MAIL_USERNAME)
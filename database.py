@@ -0,0 +1,115 @@
+"""Engine profiles for the supported databases.
+
+The database is chosen by ``DATABASE_URL``; the engine is tuned for it:
+
+- SQLite: every connection gets WAL journaling, ``synchronous=NORMAL``, a
+  busy timeout, and larger page cache and mmap sizes. Readers then no longer
+  block the writer, and concurrent workers wait for the write lock instead of
+  failing with "database is locked". Foreign keys are enforced, so ON DELETE
+  CASCADE applies.
+- Postgres: a pool of ``DB_POOL_SIZE`` connections plus ``DB_MAX_OVERFLOW``
+  per worker process, optionally pre-pinged and recycled, and a server-side
+  ``statement_timeout``.
+
+Call ``init_app`` before ``db.init_app`` so the options reach the engine.
+
+The schema is never created as a side effect of starting the app. A new
+database is set up once with ``flask init-db``; existing ones are upgraded
+with ``flask db upgrade``. ``flask upgrade-db`` does whichever applies, as
+the release step of a deploy.
+"""
+import sqlite3
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import Engine, make_url
+
+from models import db
+
+# Pragmas applied to every new SQLite connection, set by init_app
+_sqlite_pragmas = []
+
+
+def init_app(app):
+    """Set SQLALCHEMY_ENGINE_OPTIONS for the configured database URL."""
+    config = app.config
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    options = config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+
+    if url.get_backend_name() == 'sqlite':
+        config.setdefault('SQLITE_JOURNAL_MODE', 'WAL')
+        config.setdefault('SQLITE_SYNCHRONOUS', 'NORMAL')
+        config.setdefault('SQLITE_BUSY_TIMEOUT_MS', 5000)
+        config.setdefault('SQLITE_CACHE_SIZE_KB', 20000)
+        config.setdefault('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)
+        _sqlite_pragmas[:] = [
+            f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+            f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}",
+            # Negative sizes are in KiB rather than pages
+            f"PRAGMA cache_size = -{int(config['SQLITE_CACHE_SIZE_KB'])}",
+            f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_SIZE'])}",
+            "PRAGMA foreign_keys = ON",
+        ]
+        if url.database and url.database != ':memory:':
+            # The journal mode is stored in the database file
+            _sqlite_pragmas.insert(1, f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}")
+    elif url.get_backend_name() == 'postgresql':
+        config.setdefault('DB_POOL_SIZE', 5)
+        config.setdefault('DB_MAX_OVERFLOW', 10)
+        config.setdefault('DB_POOL_PRE_PING', True)
+        config.setdefault('DB_POOL_RECYCLE', 1800)
+        config.setdefault('DB_STATEMENT_TIMEOUT_MS', 5000)
+        options.setdefault('pool_size', config['DB_POOL_SIZE'])
+        options.setdefault('max_overflow', config['DB_MAX_OVERFLOW'])
+        options.setdefault('pool_pre_ping', config['DB_POOL_PRE_PING'])
+        options.setdefault('pool_recycle', config['DB_POOL_RECYCLE'])
+        connect_args = options.setdefault('connect_args', {})
+        connect_args.setdefault('options', f"-c statement_timeout={int(config['DB_STATEMENT_TIMEOUT_MS'])}")
+
+
+@event.listens_for(Engine, 'connect')
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for pragma in _sqlite_pragmas:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create the schema of a new database and mark it as fully migrated."""
+    if not _is_new():
+        raise click.ClickException("The database already has tables; run `flask db upgrade` instead.")
+    _create()
+
+
+@click.command('upgrade-db')
+@with_appcontext
+def upgrade_db_command():
+    """Create the schema of a new database, or run the pending migrations of an existing one."""
+    from flask_migrate import upgrade
+
+    # The migrations start from a schema they do not create themselves
+    if _is_new():
+        _create()
+        return
+    upgrade()
+    click.echo("Database upgraded.")
+
+
+def _is_new():
+    # A first `flask db upgrade` that failed leaves an empty version table behind
+    return not set(inspect(db.engine).get_table_names()) - {'alembic_version'}
+
+
+def _create():
+    from flask_migrate import stamp
+
+    db.create_all()
+    # Later migrations start from here
+    stamp()
+    click.echo("Database created.")
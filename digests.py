@@ -0,0 +1,92 @@
+"""Daily reminder digests of overdue and upcoming tasks.
+
+Every user has a ``next_digest_at``. On each poll, a job worker claims up to
+``DIGEST_BATCH_SIZE`` users whose digest is due, moves their next digest to
+``DIGEST_HOUR`` (UTC) the following day and enqueues one ``reminder_digest``
+job for the batch, all in one transaction. The job loads the open, dated
+tasks of the whole batch with one query per shard and sends every user who
+has overdue or upcoming tasks one email, all over a single SMTP connection.
+If sending fails, the job is retried for the users not yet sent to.
+"""
+import smtplib
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from flask import current_app, render_template
+from sqlalchemy import select, update
+
+import jobs
+from mailer import get_mail
+from models import db, User, Task
+import shards
+
+
+def init_app(app):
+    app.config.setdefault('DIGEST_BATCH_SIZE', 50)
+    app.config.setdefault('DIGEST_HOUR', 7)
+
+
+@jobs.periodic
+def enqueue_due_digests():
+    """Claim one batch of users whose digest is due and enqueue its job; return the batch size."""
+    config = current_app.config
+    now = datetime.utcnow()
+    next_digest_at = datetime.combine(now.date() + timedelta(days=1), time(config['DIGEST_HOUR']))
+
+    due = select(User.id).where(User.deleted_at.is_(None), User.next_digest_at <= now) \
+        .order_by(User.next_digest_at).limit(config['DIGEST_BATCH_SIZE']).with_for_update(skip_locked=True)
+    user_ids = db.session.execute(
+        update(User).where(User.id.in_(due), User.next_digest_at <= now)
+        .values(next_digest_at=next_digest_at)
+        .returning(User.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    if user_ids:
+        # Due dates are compared with the server's local date, as in the task list
+        jobs.enqueue('reminder_digest', {"user_ids": sorted(user_ids), "date": date.today().isoformat()})
+    db.session.commit()
+    return len(user_ids)
+
+
+@jobs.handler('reminder_digest')
+def send_reminder_digests(payload):
+    """Email the digest to every user of the batch who has overdue or upcoming tasks."""
+    today = date.fromisoformat(payload["date"])
+    users = User.query.filter(User.id.in_(payload["user_ids"]), User.deleted_at.is_(None)) \
+        .order_by(User.id).all()
+
+    # Open tasks due up to tomorrow, for the whole batch at once on each shard
+    tasks_by_user = defaultdict(list)
+    for shard, user_ids in shards.group_by_shard(user.id for user in users).items():
+        with shards.use(shard):
+            for task in Task.query.filter_by(completed=False).filter(
+                Task.user_id.in_(user_ids),
+                Task.due_date <= today + timedelta(days=1),
+            ).order_by(Task.user_id, Task.due_date, Task.id):
+                tasks_by_user[task.user_id].append(task)
+
+    sent = set()
+    try:
+        with get_mail().connect() as connection:
+            for user in users:
+                overdue = [task for task in tasks_by_user[user.id] if task.due_date < today]
+                upcoming = [task for task in tasks_by_user[user.id] if task.due_date >= today]
+                if overdue or upcoming:
+                    connection.send(digest_message(user, overdue, upcoming, today))
+                sent.add(user.id)
+    except (smtplib.SMTPException, OSError) as error:
+        remaining = [user.id for user in users if user.id not in sent]
+        if remaining:
+            raise jobs.Retry(dict(payload, user_ids=remaining), f"{len(remaining)} digests not sent: {error}") \
+                from error
+
+
+def digest_message(user, overdue, upcoming, today):
+    from flask_mail import Message  # Only workers send mail (see mailer.py)
+    return Message(
+        subject=f"TaskNest: {len(overdue)} overdue, {len(upcoming)} due soon",
+        recipients=[user.email],
+        body=render_template(
+            'email/reminder_digest.txt', user=user, overdue=overdue, upcoming=upcoming, today=today
+        ),
+    )
@@ -1,6 +1,7 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField, BooleanField, SelectField, TextAreaField
 from wtforms.validators import DataRequired, Email, EqualTo, Length
+from models import categories, priorities
 
 
 # Registration form for user sign-up
@@ -37,16 +38,9 @@ class ResetPasswordForm(FlaskForm):
 # Form for creating and editing tasks
 class TaskForm(FlaskForm):
     name = StringField('Task Name', validators=[DataRequired()])
-    category = SelectField(
-        'Category',
-        choices=[('Work', 'Work'), ('Personal', 'Personal'), ('Other', 'Other')],
-        validators=[DataRequired()],
-    )
-    priority = SelectField(
-        'Priority',
-        choices=[('Low', 'Low'), ('Medium', 'Medium'), ('High', 'High')],
-        validators=[DataRequired()],
-    )
+    # Choices are read from the lookup tables, so they match what the app stores
+    category = SelectField('Category', choices=categories.names, validators=[DataRequired()])
+    priority = SelectField('Priority', choices=priorities.names, validators=[DataRequired()])
     due_date = StringField('Due Date')  # Optional field for due dates
     completed = BooleanField('Completed')
     submit = SubmitField('Add Task')
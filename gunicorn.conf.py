@@ -0,0 +1,41 @@
+"""Gunicorn settings; the Procfile starts gunicorn with this file.
+
+With --preload the master builds the app once and the workers inherit it
+copy-on-write. The app does not connect to the database while it is built,
+and any connection the master does hold is left to the master.
+"""
+import gc
+import os
+import shutil
+import tempfile
+
+# Worker processes write their metrics here, so /metrics can aggregate them.
+# Set before any worker imports prometheus_client.
+metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'tasknest-metrics')
+)
+
+
+def on_starting(server):
+    # Values left over from a previous run would be summed into the new ones
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def pre_fork(server, worker):
+    # Objects built so far are never collected, so the garbage collector does
+    # not write to (and thereby copy) the pages the workers share
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        # Pooled connections are sockets; a worker must open its own
+        from models import db
+        with worker.app.wsgi().app_context():
+            db.engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,205 @@
+"""Background jobs, stored in the ``job`` table and run by worker processes.
+
+``enqueue`` adds a job to the caller's transaction, so the job exists exactly
+when the write that asked for it commits. ``flask jobs work`` (the Procfile's
+``worker`` process) claims runnable jobs and runs the handler registered for
+each job's kind. A claim is a single UPDATE of the job rows, skipping rows
+another worker has locked on Postgres, so any number of worker processes can
+run side by side without running a job twice.
+
+A job whose handler raises is retried with exponential backoff and jitter,
+up to ``JOB_MAX_ATTEMPTS`` attempts, after which it is kept with
+``failed_at`` set. A handler that got part of the way raises ``Retry`` with
+the payload left to do. Jobs locked by a worker that died are run again once
+the lock is ``JOB_LOCK_TIMEOUT_SECONDS`` old.
+
+Functions registered with ``periodic`` run on every poll of every worker, to
+enqueue work that has become due (see digests.py).
+"""
+import os
+import random
+import signal
+import socket
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import or_, select, update
+
+from models import db, Job
+
+# Job kind -> handler, and the functions run on every poll
+_handlers = {}
+_periodic = []
+
+
+def init_app(app):
+    app.config.setdefault('JOB_CLAIM_SIZE', 1)
+    app.config.setdefault('JOB_POLL_SECONDS', 5)
+    app.config.setdefault('JOB_MAX_ATTEMPTS', 5)
+    app.config.setdefault('JOB_RETRY_BASE_SECONDS', 30)
+    app.config.setdefault('JOB_RETRY_MAX_SECONDS', 3600)
+    app.config.setdefault('JOB_LOCK_TIMEOUT_SECONDS', 900)
+    app.cli.add_command(jobs_command)
+
+
+class Retry(Exception):
+    """Raised by a handler to retry its job with a new payload, such as the part left to do."""
+
+    def __init__(self, payload, reason='retry'):
+        super().__init__(reason)
+        self.payload = payload
+
+
+def handler(kind):
+    """Register the decorated function to run jobs of kind; it is called with the payload."""
+    def decorator(function):
+        _handlers[kind] = function
+        return function
+    return decorator
+
+
+def periodic(function):
+    """Register a function to run on every worker poll; it returns whether it did any work."""
+    _periodic.append(function)
+    return function
+
+
+def enqueue(kind, payload, run_at=None):
+    """Add a job to the session; it becomes runnable when the session commits."""
+    job = Job(kind=kind, payload=payload, run_at=run_at or datetime.utcnow())
+    db.session.add(job)
+    return job
+
+
+def claim(worker_id, limit):
+    """Lock up to limit runnable jobs for worker_id and return them, oldest first."""
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=current_app.config['JOB_LOCK_TIMEOUT_SECONDS'])
+    runnable = (
+        Job.failed_at.is_(None),
+        Job.run_at <= now,
+        or_(Job.locked_at.is_(None), Job.locked_at < stale),
+    )
+    candidates = select(Job.id).where(*runnable).order_by(Job.run_at).limit(limit) \
+        .with_for_update(skip_locked=True)
+    # The conditions are repeated, so a row another worker claimed first is skipped
+    claimed = db.session.execute(
+        update(Job).where(Job.id.in_(candidates), *runnable)
+        .values(locked_by=worker_id, locked_at=now)
+        .returning(Job.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    db.session.commit()
+    if not claimed:
+        return []
+    return Job.query.filter(Job.id.in_(claimed)).order_by(Job.run_at, Job.id).all()
+
+
+def run_job(job):
+    """
+        Run a claimed job.
+        - On success the job is deleted, in the transaction of the handler's writes
+        - On failure the handler's writes are rolled back and the job is
+          scheduled for a retry, or given up after JOB_MAX_ATTEMPTS
+        Returns whether the job succeeded.
+        """
+    job_id, kind, payload, attempts = job.id, job.kind, job.payload, job.attempts + 1
+    try:
+        if kind not in _handlers:
+            raise LookupError(f"No handler for jobs of kind {kind!r}")
+        _handlers[kind](payload)
+        db.session.query(Job).filter_by(id=job_id).delete()
+        db.session.commit()
+        return True
+    except Exception as error:
+        db.session.rollback()
+        if isinstance(error, Retry):
+            payload = error.payload
+        _record_failure(job_id, kind, payload, attempts, error)
+        return False
+
+
+def retry_delay(attempts):
+    """Return the seconds to wait before attempt number attempts + 1."""
+    config = current_app.config
+    delay = min(config['JOB_RETRY_MAX_SECONDS'], config['JOB_RETRY_BASE_SECONDS'] * 2 ** (attempts - 1))
+    # Jitter keeps jobs that failed together from being retried together
+    return random.uniform(delay / 2, delay)
+
+
+def _record_failure(job_id, kind, payload, attempts, error):
+    values = dict(payload=payload, attempts=attempts, locked_by=None, locked_at=None,
+                  last_error=f"{type(error).__name__}: {error}")
+    if attempts >= current_app.config['JOB_MAX_ATTEMPTS']:
+        values['failed_at'] = datetime.utcnow()
+        current_app.logger.error("Job %s (%s) failed for good after %s attempts: %s", job_id, kind, attempts, error)
+    else:
+        values['run_at'] = datetime.utcnow() + timedelta(seconds=retry_delay(attempts))
+        current_app.logger.warning("Job %s (%s) failed, attempt %s: %s", job_id, kind, attempts, error)
+    db.session.query(Job).filter_by(id=job_id).update(values)
+    db.session.commit()
+
+
+class Worker:
+    """
+        Runs jobs in the current process until stopped.
+        - run_once runs the periodic functions and one claim of jobs
+        - SIGTERM and SIGINT stop the worker after the job it is running
+        """
+
+    def __init__(self, app):
+        self.app = app
+        self.id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping = False
+
+    def stop(self, *args):
+        self._stopping = True
+
+    def run_once(self):
+        """Return whether there was any work: jobs run or work enqueued."""
+        with self.app.app_context():
+            busy = False
+            for function in _periodic:
+                try:
+                    busy = bool(function()) or busy
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception("Periodic job function %s failed", function.__name__)
+
+            jobs = claim(self.id, self.app.config['JOB_CLAIM_SIZE'])
+            for index, job in enumerate(jobs):
+                if self._stopping:
+                    # Unlock the rest so another worker can take them now
+                    unstarted = [pending.id for pending in jobs[index:]]
+                    Job.query.filter(Job.id.in_(unstarted)) \
+                        .update(dict(locked_by=None, locked_at=None), synchronize_session=False)
+                    db.session.commit()
+                    break
+                run_job(job)
+            return busy or bool(jobs)
+
+    def run(self, burst=False):
+        """Run jobs until stopped, or with burst until there is no work left."""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        while not self._stopping:
+            if not self.run_once():
+                if burst:
+                    break
+                time.sleep(self.app.config['JOB_POLL_SECONDS'])
+
+
+@click.group('jobs')
+def jobs_command():
+    """Run background jobs."""
+
+
+@jobs_command.command('work')
+@click.option('--burst', is_flag=True, help='Exit once there is no work left.')
+@with_appcontext
+def work_command(burst):
+    """Run jobs until stopped."""
+    Worker(current_app._get_current_object()).run(burst=burst)
@@ -0,0 +1,14 @@
+"""Outgoing email, set up on first use.
+
+Flask-Mail is only needed by the code paths that send mail, so the app does
+not import or configure it at startup.
+"""
+from flask import current_app
+
+
+def get_mail():
+    """Return the app's Flask-Mail extension, setting it up on first use."""
+    if 'mail' not in current_app.extensions:
+        from flask_mail import Mail
+        Mail(current_app._get_current_object())
+    return current_app.extensions['mail']
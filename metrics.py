@@ -0,0 +1,113 @@
+"""Request and SQL instrumentation, exported in Prometheus text format.
+
+Every request records its latency, status code and the number and total time
+of the SQL statements it ran. The read cache counts its hits and misses. For streamed responses this covers the whole
+stream, since the request context stays open until the stream ends. The
+statements are counted through SQLAlchemy engine events; the counters live
+on ``flask.g``, so background threads are not counted.
+
+Each gunicorn worker process has its own metric values. When
+``PROMETHEUS_MULTIPROC_DIR`` is set (gunicorn.conf.py sets it), the workers
+write them to files in that directory and ``/metrics`` sums them over all
+workers. Without it, ``/metrics`` shows the current process only.
+
+``/metrics`` is only served when ``METRICS_TOKEN`` is set, to scrapers that
+send it as a bearer token.
+"""
+import os
+import time
+
+from flask import g, has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+REQUEST_LATENCY = Histogram(
+    'tasknest_request_duration_seconds', 'Request latency, including streamed bodies.',
+    ['endpoint', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUESTS = Counter('tasknest_requests_total', 'Requests by status code.', ['endpoint', 'method', 'status'])
+REJECTED = Counter(
+    'tasknest_requests_rejected_total', 'Requests turned away by admission control (see admission.py).',
+    ['endpoint', 'reason'],
+)
+IN_FLIGHT = Gauge('tasknest_requests_in_flight', 'Requests being served.', multiprocess_mode='livesum')
+SQL_STATEMENTS = Histogram(
+    'tasknest_request_sql_statements', 'SQL statements run per request.',
+    ['endpoint'], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+SQL_DURATION = Histogram(
+    'tasknest_request_sql_duration_seconds', 'Time spent in SQL per request.',
+    ['endpoint'], buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+CACHE_LOOKUPS = Counter(
+    'tasknest_read_cache_lookups_total', 'Read cache lookups by cached view (see cache.py).',
+    ['namespace', 'result'],
+)
+
+
+def init_app(app):
+    app.before_request(_start_request)
+    app.after_request(_record_status)
+    app.teardown_request(_finish_request)
+
+
+def render():
+    """Return the metrics of all worker processes as (body, content type)."""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_statements = 0
+    g.metrics_sql_seconds = 0.0
+    IN_FLIGHT.inc()
+
+
+def _record_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def _finish_request(exc):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return  # An earlier before_request handler failed
+    IN_FLIGHT.dec()
+    # Unmatched URLs share one label so they cannot grow the label set
+    endpoint = request.endpoint or 'unmatched'
+    status = 500 if exc is not None else g.get('metrics_status', 500)
+    REQUEST_LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - started)
+    REQUESTS.labels(endpoint, request.method, str(status)).inc()
+    SQL_STATEMENTS.labels(endpoint).observe(g.metrics_statements)
+    SQL_DURATION.labels(endpoint).observe(g.metrics_sql_seconds)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'metrics_started' in g:
+        conn.info.setdefault('metrics_query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_query_started')
+    if started and has_request_context() and 'metrics_started' in g:
+        g.metrics_statements += 1
+        g.metrics_sql_seconds += time.perf_counter() - started.pop()
+
+
+@event.listens_for(Engine, 'handle_error')
+def _discard_failed_query(exception_context):
+    # after_cursor_execute does not run for failed statements
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('metrics_query_started'):
+        connection.info['metrics_query_started'].pop()
@@ -51,6 +51,14 @@ def get_metadata():
     return target_db.metadata
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    # The search index (see search.py) is created outside the models'
+    # metadata; autogenerate must not drop it
+    if type_ == 'table' and reflected and compare_to is None and name.startswith('task_search'):
+        return False
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -65,7 +73,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -93,10 +102,20 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    if conf_args.get("include_object") is None:
+        conf_args["include_object"] = include_object
 
     connectable = get_engine()
 
     with connectable.connect() as connection:
+        foreign_keys = None
+        if connection.dialect.name == 'sqlite':
+            # Batch migrations rebuild tables by dropping them; with foreign
+            # keys enforced that would cascade into the referencing tables
+            foreign_keys = connection.exec_driver_sql('PRAGMA foreign_keys').scalar()
+            connection.exec_driver_sql('PRAGMA foreign_keys = OFF')
+            connection.commit()
+
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
@@ -106,6 +125,10 @@ def run_migrations_online():
         with context.begin_transaction():
             context.run_migrations()
 
+        if foreign_keys:
+            connection.exec_driver_sql('PRAGMA foreign_keys = ON')
+            connection.commit()
+
 
 if context.is_offline_mode():
     run_migrations_offline()
@@ -0,0 +1,28 @@
+"""Add client_key idempotency column to task
+
+Revision ID: 0fd2c47ee55c
+Revises: 6bda4a317434
+Create Date: 2026-10-17 13:55:42.118603
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0fd2c47ee55c'
+down_revision = '6bda4a317434'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Plain ALTER TABLE rather than batch mode: rebuilding the task table on
+    # SQLite would drop the full-text search triggers
+    op.add_column('task', sa.Column('client_key', sa.String(length=64), nullable=True))
+    op.create_index('uq_task_user_client_key', 'task', ['user_id', 'client_key'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_task_user_client_key', table_name='task')
+    op.drop_column('task', 'client_key')
@@ -0,0 +1,36 @@
+"""Add user_stats table for incrementally maintained dashboard statistics
+
+Revision ID: 6a44f6717c6d
+Revises: 5fef7707dbee
+Create Date: 2026-10-17 09:12:40.318214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a44f6717c6d'
+down_revision = '5fef7707dbee'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Rows are built lazily from aggregates on the next dashboard view
+    op.create_table('user_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('total_tasks', sa.Integer(), nullable=False),
+    sa.Column('completed_tasks', sa.Integer(), nullable=False),
+    sa.Column('week_start', sa.String(length=10), nullable=False),
+    sa.Column('completed_this_week', sa.Integer(), nullable=False),
+    sa.Column('month_start', sa.String(length=10), nullable=False),
+    sa.Column('completed_this_month', sa.Integer(), nullable=False),
+    sa.Column('category_counts', sa.JSON(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('user_stats')
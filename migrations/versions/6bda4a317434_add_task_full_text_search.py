@@ -0,0 +1,141 @@
+"""Add full-text search index over task names and comments
+
+Revision ID: 6bda4a317434
+Revises: 0d9d5d44147d
+Create Date: 2026-10-17 12:40:18.207339
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6bda4a317434'
+down_revision = '0d9d5d44147d'
+branch_labels = None
+depends_on = None
+
+# SQLite: FTS5 table kept in sync by triggers, then backfilled
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE task_search USING fts5(
+        owner, name, comments, prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER task_search_ai AFTER INSERT ON task BEGIN
+        INSERT INTO task_search(rowid, owner, name, comments)
+        VALUES (new.id, 'u' || new.user_id, new.name, '');
+    END
+    """,
+    """
+    CREATE TRIGGER task_search_au AFTER UPDATE OF name, user_id ON task BEGIN
+        UPDATE task_search SET owner = 'u' || new.user_id, name = new.name WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER task_search_ad AFTER DELETE ON task BEGIN
+        DELETE FROM task_search WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER comment_search_ai AFTER INSERT ON comment BEGIN
+        UPDATE task_search SET comments = comments || ' ' || new.content WHERE rowid = new.task_id;
+    END
+    """,
+    """
+    CREATE TRIGGER comment_search_au AFTER UPDATE OF content, task_id ON comment BEGIN
+        UPDATE task_search
+        SET comments = coalesce((
+            SELECT group_concat(content, ' ') FROM comment WHERE comment.task_id = task_search.rowid
+        ), '')
+        WHERE rowid IN (old.task_id, new.task_id);
+    END
+    """,
+    """
+    CREATE TRIGGER comment_search_ad AFTER DELETE ON comment BEGIN
+        UPDATE task_search
+        SET comments = coalesce((SELECT group_concat(content, ' ') FROM comment WHERE task_id = old.task_id), '')
+        WHERE rowid = old.task_id;
+    END
+    """,
+    """
+    INSERT INTO task_search(rowid, owner, name, comments)
+    SELECT task.id, 'u' || task.user_id, task.name,
+           coalesce((SELECT group_concat(content, ' ') FROM comment WHERE comment.task_id = task.id), '')
+    FROM task
+    """,
+]
+
+# Postgres: weighted tsvector column kept in sync by triggers, with a GIN index
+POSTGRES_DDL = [
+    "ALTER TABLE task ADD COLUMN search_vector tsvector",
+    """
+    CREATE FUNCTION task_search_vector(task_name text, task_id integer) RETURNS tsvector AS $$
+        SELECT setweight(to_tsvector('simple', coalesce(task_name, '')), 'A') ||
+               setweight(to_tsvector('simple', coalesce(
+                   (SELECT string_agg(content, ' ') FROM comment WHERE comment.task_id = $2), ''
+               )), 'B')
+    $$ LANGUAGE sql STABLE
+    """,
+    """
+    CREATE FUNCTION task_search_task_trigger() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := task_search_vector(NEW.name, NEW.id);
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER task_search_biu BEFORE INSERT OR UPDATE OF name ON task
+    FOR EACH ROW EXECUTE FUNCTION task_search_task_trigger()
+    """,
+    """
+    CREATE FUNCTION task_search_comment_trigger() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE task SET search_vector = task_search_vector(name, id) WHERE id = OLD.task_id;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            UPDATE task SET search_vector = task_search_vector(name, id) WHERE id = NEW.task_id;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER comment_search_aiud AFTER INSERT OR UPDATE OF content, task_id OR DELETE ON comment
+    FOR EACH ROW EXECUTE FUNCTION task_search_comment_trigger()
+    """,
+    "UPDATE task SET search_vector = task_search_vector(name, id)",
+    "CREATE INDEX ix_task_search_vector ON task USING gin (search_vector)",
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        statements = SQLITE_DDL
+    elif dialect == 'postgresql':
+        statements = POSTGRES_DDL
+    else:
+        return
+    for statement in statements:
+        op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for trigger in ('task_search_ai', 'task_search_au', 'task_search_ad',
+                        'comment_search_ai', 'comment_search_au', 'comment_search_ad'):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        op.execute('DROP TABLE IF EXISTS task_search')
+    elif dialect == 'postgresql':
+        op.execute('DROP TRIGGER IF EXISTS comment_search_aiud ON comment')
+        op.execute('DROP TRIGGER IF EXISTS task_search_biu ON task')
+        op.execute('DROP FUNCTION IF EXISTS task_search_comment_trigger()')
+        op.execute('DROP FUNCTION IF EXISTS task_search_task_trigger()')
+        op.execute('DROP INDEX IF EXISTS ix_task_search_vector')
+        op.execute('ALTER TABLE task DROP COLUMN IF EXISTS search_vector')
+        op.execute('DROP FUNCTION IF EXISTS task_search_vector(text, integer)')
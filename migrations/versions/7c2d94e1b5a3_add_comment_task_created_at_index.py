@@ -0,0 +1,25 @@
+"""Add index for newest-first comment lists
+
+Revision ID: 7c2d94e1b5a3
+Revises: c3e1f0a9b7d2
+Create Date: 2026-10-17 17:20:44.905113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2d94e1b5a3'
+down_revision = 'c3e1f0a9b7d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Plain CREATE INDEX rather than batch mode keeps the search triggers on SQLite
+    op.create_index('ix_comment_task_created_at', 'comment', ['task_id', 'created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_comment_task_created_at', table_name='comment')
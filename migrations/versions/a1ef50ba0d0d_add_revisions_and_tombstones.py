@@ -0,0 +1,53 @@
+"""Add revision columns and tombstone table for delta sync
+
+Revision ID: a1ef50ba0d0d
+Revises: 0fd2c47ee55c
+Create Date: 2026-10-17 15:02:33.474920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1ef50ba0d0d'
+down_revision = '0fd2c47ee55c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Plain ALTER TABLE rather than batch mode keeps the search triggers on SQLite
+    op.add_column('user', sa.Column('revision', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('task', sa.Column('revision', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('comment', sa.Column('revision', sa.Integer(), server_default='0', nullable=False))
+
+    # Existing rows become revision 1, so a sync from revision 0 returns them
+    op.execute('UPDATE "user" SET revision = 1')
+    op.execute('UPDATE task SET revision = 1')
+    op.execute('UPDATE comment SET revision = 1')
+
+    op.create_index('ix_task_user_revision', 'task', ['user_id', 'revision'], unique=False)
+    op.create_index('ix_comment_task_revision', 'comment', ['task_id', 'revision'], unique=False)
+
+    op.create_table('tombstone',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('revision', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('ref_id', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_tombstone_user_revision', 'tombstone', ['user_id', 'revision'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_tombstone_user_revision', table_name='tombstone')
+    op.drop_table('tombstone')
+    op.drop_index('ix_comment_task_revision', table_name='comment')
+    op.drop_index('ix_task_user_revision', table_name='task')
+    op.drop_column('comment', 'revision')
+    op.drop_column('task', 'revision')
+    op.drop_column('user', 'revision')
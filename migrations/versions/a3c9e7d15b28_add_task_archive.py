@@ -0,0 +1,109 @@
+"""Add task.completed_at and the archive tables for completed tasks
+
+Revision ID: a3c9e7d15b28
+Revises: f2d8a6c41e93
+Create Date: 2026-10-17 22:41:06.519834
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c9e7d15b28'
+down_revision = 'f2d8a6c41e93'
+branch_labels = None
+depends_on = None
+
+# Columns moved back to the live tables on downgrade
+TASK_COLUMNS = 'id, user_id, name, category_id, priority_rank, due_date, completed, completed_at, client_key, revision'
+COMMENT_COLUMNS = 'id, task_id, content, created_at, revision'
+
+# Rebuilding task on SQLite drops its search triggers, which are recreated as
+# they were created in 6bda4a317434
+SQLITE_SEARCH_TRIGGERS = [
+    """
+    CREATE TRIGGER task_search_ai AFTER INSERT ON task BEGIN
+        INSERT INTO task_search(rowid, owner, name, comments)
+        VALUES (new.id, 'u' || new.user_id, new.name, '');
+    END
+    """,
+    """
+    CREATE TRIGGER task_search_au AFTER UPDATE OF name, user_id ON task BEGIN
+        UPDATE task_search SET owner = 'u' || new.user_id, name = new.name WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER task_search_ad AFTER DELETE ON task BEGIN
+        DELETE FROM task_search WHERE rowid = old.id;
+    END
+    """,
+]
+
+
+def upgrade():
+    op.add_column('task', sa.Column('completed_at', sa.DateTime(), nullable=True))
+    # Completion times were not recorded before; tasks already completed are
+    # counted from now, so the first ones are archived ARCHIVE_AFTER_DAYS later
+    op.get_bind().execute(
+        sa.text("UPDATE task SET completed_at = :now WHERE completed"), {"now": datetime.utcnow()}
+    )
+    op.create_index('ix_task_completed_at', 'task', ['completed_at'], unique=False)
+
+    op.create_table(
+        'archived_task',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=150), nullable=False),
+        sa.Column('category_id', sa.SmallInteger(), nullable=True),
+        sa.Column('priority_rank', sa.SmallInteger(), nullable=True),
+        sa.Column('due_date', sa.Date(), nullable=True),
+        sa.Column('completed', sa.Boolean(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.Column('client_key', sa.String(length=64), nullable=True),
+        sa.Column('revision', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['category_id'], ['category.id'], name='fk_archived_task_category_id_category'),
+        sa.ForeignKeyConstraint(['priority_rank'], ['priority.rank'], name='fk_archived_task_priority_rank_priority'),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], name='fk_archived_task_user_id_user', ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    with op.batch_alter_table('archived_task', schema=None) as batch_op:
+        batch_op.create_index('ix_archived_task_user_id', ['user_id', 'id'], unique=False)
+        batch_op.create_index('ix_archived_task_user_client_key', ['user_id', 'client_key'], unique=False)
+
+    op.create_table(
+        'archived_comment',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('task_id', sa.Integer(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('revision', sa.Integer(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(
+            ['task_id'], ['archived_task.id'], name='fk_archived_comment_task_id_archived_task', ondelete='CASCADE'
+        ),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    with op.batch_alter_table('archived_comment', schema=None) as batch_op:
+        batch_op.create_index('ix_archived_comment_task_created_at', ['task_id', 'created_at'], unique=False)
+
+
+def downgrade():
+    # Archived tasks and comments go back to the live tables rather than being lost
+    op.execute(f"INSERT INTO task ({TASK_COLUMNS}) SELECT {TASK_COLUMNS} FROM archived_task")
+    op.execute(f"INSERT INTO comment ({COMMENT_COLUMNS}) SELECT {COMMENT_COLUMNS} FROM archived_comment")
+    op.drop_table('archived_comment')
+    op.drop_table('archived_task')
+
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.drop_index('ix_task_completed_at')
+        batch_op.drop_column('completed_at')
+
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite' and sa.inspect(bind).has_table('task_search'):
+        for statement in SQLITE_SEARCH_TRIGGERS:
+            trigger = statement.split()[2]
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            op.execute(statement)
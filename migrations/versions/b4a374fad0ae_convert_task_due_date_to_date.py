@@ -0,0 +1,99 @@
+"""Convert task.due_date to a DATE column and index (user_id, completed, due_date)
+
+Revision ID: b4a374fad0ae
+Revises: 6a44f6717c6d
+Create Date: 2026-10-17 10:03:51.902114
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4a374fad0ae'
+down_revision = '6a44f6717c6d'
+branch_labels = None
+depends_on = None
+
+# Rows are backfilled in keyset batches so large tables are not loaded at once
+BATCH_SIZE = 5000
+
+task = sa.table(
+    'task',
+    sa.column('id', sa.Integer),
+    sa.column('completed', sa.Boolean),
+    sa.column('due_date', sa.String),
+    sa.column('due_on', sa.Date),
+)
+
+
+def _parse(value):
+    try:
+        return datetime.strptime(value.strip(), '%Y-%m-%d').date()
+    except ValueError:
+        # Unparseable values were never usable as due dates
+        return None
+
+
+def _backfill(conn, source, target, convert):
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(task.c.id, task.c[source])
+            .where(task.c.id > last_id, task.c[source].isnot(None))
+            .order_by(task.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        conn.execute(
+            task.update().where(task.c.id == sa.bindparam('task_id')).values({target: sa.bindparam('value')}),
+            [{'task_id': row[0], 'value': convert(row[1])} for row in rows],
+        )
+        last_id = rows[-1][0]
+
+
+def upgrade():
+    conn = op.get_bind()
+
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('due_on', sa.Date(), nullable=True))
+
+    _backfill(conn, 'due_date', 'due_on', _parse)
+    conn.execute(task.update().where(task.c.completed.is_(None)).values(completed=False))
+
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.drop_column('due_date')
+        batch_op.alter_column('due_on', new_column_name='due_date', existing_type=sa.Date(), existing_nullable=True)
+
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.create_index('ix_task_user_completed_due', ['user_id', 'completed', 'due_date'], unique=False)
+
+    # Statistics rows are rebuilt on the next dashboard view
+    op.execute('DELETE FROM user_stats')
+    with op.batch_alter_table('user_stats', schema=None) as batch_op:
+        batch_op.alter_column('week_start', existing_type=sa.String(length=10), type_=sa.Date(), existing_nullable=False)
+        batch_op.alter_column('month_start', existing_type=sa.String(length=10), type_=sa.Date(), existing_nullable=False)
+
+
+def downgrade():
+    conn = op.get_bind()
+
+    op.execute('DELETE FROM user_stats')
+    with op.batch_alter_table('user_stats', schema=None) as batch_op:
+        batch_op.alter_column('month_start', existing_type=sa.Date(), type_=sa.String(length=10), existing_nullable=False)
+        batch_op.alter_column('week_start', existing_type=sa.Date(), type_=sa.String(length=10), existing_nullable=False)
+
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.drop_index('ix_task_user_completed_due')
+        batch_op.alter_column('due_date', new_column_name='due_on', existing_type=sa.Date(), existing_nullable=True)
+
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('due_date', sa.String(length=50), nullable=True))
+
+    _backfill(conn, 'due_on', 'due_date', lambda value: value.isoformat())
+
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.drop_column('due_on')
@@ -0,0 +1,50 @@
+"""Add user.shard and move the user revision to the user_revision table
+
+Revision ID: c5d1e8f27a94
+Revises: a3c9e7d15b28
+Create Date: 2026-10-17 23:52:40.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d1e8f27a94'
+down_revision = 'a3c9e7d15b28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing users keep their data in this database, which NULL stands for
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('shard', sa.SmallInteger(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_user_shard'), ['shard'], unique=False)
+
+    op.create_table(
+        'user_revision',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('revision', sa.Integer(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], name='fk_user_revision_user_id_user', ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+    op.execute('INSERT INTO user_revision (user_id, revision) SELECT id, revision FROM "user"')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('revision')
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('revision', sa.Integer(), server_default='0', nullable=False))
+    # Only the revisions of users whose data is in this database are known here
+    op.execute(
+        'UPDATE "user" SET revision = coalesce('
+        '(SELECT revision FROM user_revision WHERE user_revision.user_id = "user".id), 0)'
+    )
+    op.drop_table('user_revision')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_shard'))
+        batch_op.drop_column('shard')
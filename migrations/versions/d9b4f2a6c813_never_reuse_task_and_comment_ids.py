@@ -0,0 +1,92 @@
+"""Never reuse task and comment ids on SQLite
+
+Revision ID: d9b4f2a6c813
+Revises: c5d1e8f27a94
+Create Date: 2026-10-18 10:12:47.530916
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9b4f2a6c813'
+down_revision = 'c5d1e8f27a94'
+branch_labels = None
+depends_on = None
+
+# Rebuilding task and comment on SQLite drops their search triggers, which
+# are recreated as they were created in 6bda4a317434
+SQLITE_SEARCH_TRIGGERS = [
+    """
+    CREATE TRIGGER task_search_ai AFTER INSERT ON task BEGIN
+        INSERT INTO task_search(rowid, owner, name, comments)
+        VALUES (new.id, 'u' || new.user_id, new.name, '');
+    END
+    """,
+    """
+    CREATE TRIGGER task_search_au AFTER UPDATE OF name, user_id ON task BEGIN
+        UPDATE task_search SET owner = 'u' || new.user_id, name = new.name WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER task_search_ad AFTER DELETE ON task BEGIN
+        DELETE FROM task_search WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER comment_search_ai AFTER INSERT ON comment BEGIN
+        UPDATE task_search SET comments = comments || ' ' || new.content WHERE rowid = new.task_id;
+    END
+    """,
+    """
+    CREATE TRIGGER comment_search_au AFTER UPDATE OF content, task_id ON comment BEGIN
+        UPDATE task_search
+        SET comments = coalesce((
+            SELECT group_concat(content, ' ') FROM comment WHERE comment.task_id = task_search.rowid
+        ), '')
+        WHERE rowid IN (old.task_id, new.task_id);
+    END
+    """,
+    """
+    CREATE TRIGGER comment_search_ad AFTER DELETE ON comment BEGIN
+        UPDATE task_search
+        SET comments = coalesce((SELECT group_concat(content, ' ') FROM comment WHERE task_id = old.task_id), '')
+        WHERE rowid = old.task_id;
+    END
+    """,
+]
+
+
+def upgrade():
+    # Other databases draw ids from sequences, which never go back. SQLite
+    # hands out the largest id plus one, so once the newest task is archived
+    # its id would be given to the next task.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    _rebuild(autoincrement=True)
+    # Continue after every id handed out so far, archived ones included
+    for table, archive in (('task', 'archived_task'), ('comment', 'archived_comment')):
+        op.execute(f"DELETE FROM sqlite_sequence WHERE name = '{table}'")
+        op.execute(
+            f"INSERT INTO sqlite_sequence (name, seq) SELECT '{table}', "
+            f"max(coalesce((SELECT max(id) FROM {table}), 0), coalesce((SELECT max(id) FROM {archive}), 0))"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    _rebuild(autoincrement=False)
+
+
+def _rebuild(autoincrement):
+    for table in ('task', 'comment'):
+        with op.batch_alter_table(table, recreate='always', table_kwargs={'sqlite_autoincrement': autoincrement}):
+            pass
+
+    if sa.inspect(op.get_bind()).has_table('task_search'):
+        for statement in SQLITE_SEARCH_TRIGGERS:
+            trigger = statement.split()[2]
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            op.execute(statement)
@@ -0,0 +1,102 @@
+"""Add user.deleted_at and ON DELETE CASCADE foreign keys
+
+Revision ID: e8a5b3c61f04
+Revises: 7c2d94e1b5a3
+Create Date: 2026-10-17 18:05:52.630417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8a5b3c61f04'
+down_revision = '7c2d94e1b5a3'
+branch_labels = None
+depends_on = None
+
+# Lets batch mode find the unnamed foreign keys SQLite reflects
+NAMING_CONVENTION = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+
+# (table, column, referred table) of each foreign key that gains a cascade
+FOREIGN_KEYS = [
+    ('task', 'user_id', 'user'),
+    ('comment', 'task_id', 'task'),
+    ('tombstone', 'user_id', 'user'),
+    ('user_stats', 'user_id', 'user'),
+]
+
+# Rebuilding task and comment on SQLite drops the search triggers, which are
+# recreated as they were created in 6bda4a317434
+SQLITE_SEARCH_TRIGGERS = [
+    """
+    CREATE TRIGGER task_search_ai AFTER INSERT ON task BEGIN
+        INSERT INTO task_search(rowid, owner, name, comments)
+        VALUES (new.id, 'u' || new.user_id, new.name, '');
+    END
+    """,
+    """
+    CREATE TRIGGER task_search_au AFTER UPDATE OF name, user_id ON task BEGIN
+        UPDATE task_search SET owner = 'u' || new.user_id, name = new.name WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER task_search_ad AFTER DELETE ON task BEGIN
+        DELETE FROM task_search WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER comment_search_ai AFTER INSERT ON comment BEGIN
+        UPDATE task_search SET comments = comments || ' ' || new.content WHERE rowid = new.task_id;
+    END
+    """,
+    """
+    CREATE TRIGGER comment_search_au AFTER UPDATE OF content, task_id ON comment BEGIN
+        UPDATE task_search
+        SET comments = coalesce((
+            SELECT group_concat(content, ' ') FROM comment WHERE comment.task_id = task_search.rowid
+        ), '')
+        WHERE rowid IN (old.task_id, new.task_id);
+    END
+    """,
+    """
+    CREATE TRIGGER comment_search_ad AFTER DELETE ON comment BEGIN
+        UPDATE task_search
+        SET comments = coalesce((SELECT group_concat(content, ' ') FROM comment WHERE task_id = old.task_id), '')
+        WHERE rowid = old.task_id;
+    END
+    """,
+]
+
+
+def upgrade():
+    op.add_column('user', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_user_deleted_at', 'user', ['deleted_at'], unique=False)
+    _replace_foreign_keys(ondelete='CASCADE')
+
+
+def downgrade():
+    _replace_foreign_keys(ondelete=None)
+    op.drop_index('ix_user_deleted_at', table_name='user')
+    op.drop_column('user', 'deleted_at')
+
+
+def _replace_foreign_keys(ondelete):
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    for table, column, referred in FOREIGN_KEYS:
+        name = NAMING_CONVENTION['fk'] % {
+            'table_name': table, 'column_0_name': column, 'referred_table_name': referred,
+        }
+        existing = next(
+            fk['name'] for fk in inspector.get_foreign_keys(table) if fk['constrained_columns'] == [column]
+        )
+        with op.batch_alter_table(table, schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+            batch_op.drop_constraint(existing or name, type_='foreignkey')
+            batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete)
+
+    if bind.dialect.name == 'sqlite' and inspector.has_table('task_search'):
+        for statement in SQLITE_SEARCH_TRIGGERS:
+            trigger = statement.split()[2]
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            op.execute(statement)
@@ -0,0 +1,123 @@
+"""Store task category and priority as codes of lookup tables
+
+Revision ID: f2d8a6c41e93
+Revises: b7f3c2d91a46
+Create Date: 2026-10-17 21:34:18.226071
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2d8a6c41e93'
+down_revision = 'b7f3c2d91a46'
+branch_labels = None
+depends_on = None
+
+# Lets batch mode find the unnamed foreign keys SQLite reflects
+NAMING_CONVENTION = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+
+# The app's categories and priorities at the time of this migration; a
+# priority's rank is its position, most urgent first
+CATEGORIES = ["Work", "Personal", "Urgent"]
+PRIORITIES = ["High", "Medium", "Low"]
+
+# Rebuilding task on SQLite drops its search triggers, which are recreated as
+# they were created in 6bda4a317434
+SQLITE_SEARCH_TRIGGERS = [
+    """
+    CREATE TRIGGER task_search_ai AFTER INSERT ON task BEGIN
+        INSERT INTO task_search(rowid, owner, name, comments)
+        VALUES (new.id, 'u' || new.user_id, new.name, '');
+    END
+    """,
+    """
+    CREATE TRIGGER task_search_au AFTER UPDATE OF name, user_id ON task BEGIN
+        UPDATE task_search SET owner = 'u' || new.user_id, name = new.name WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER task_search_ad AFTER DELETE ON task BEGIN
+        DELETE FROM task_search WHERE rowid = old.id;
+    END
+    """,
+]
+
+
+def upgrade():
+    category = op.create_table(
+        'category',
+        sa.Column('id', sa.SmallInteger(), autoincrement=False, nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name'),
+    )
+    priority = op.create_table(
+        'priority',
+        sa.Column('rank', sa.SmallInteger(), autoincrement=False, nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.PrimaryKeyConstraint('rank'),
+        sa.UniqueConstraint('name'),
+    )
+
+    # The app's values, then any other value found in existing tasks, so no data is lost
+    bind = op.get_bind()
+    for table, code, column, names in ((category, 'id', 'category', CATEGORIES),
+                                       (priority, 'rank', 'priority', PRIORITIES)):
+        found = bind.execute(sa.text(
+            f"SELECT DISTINCT {column} FROM task WHERE {column} IS NOT NULL ORDER BY {column}"
+        )).scalars()
+        names = names + sorted(set(found) - set(names))
+        op.bulk_insert(table, [{code: index, 'name': name} for index, name in enumerate(names, 1)])
+
+    op.add_column('task', sa.Column('category_id', sa.SmallInteger(), nullable=True))
+    op.add_column('task', sa.Column('priority_rank', sa.SmallInteger(), nullable=True))
+    op.execute("""
+        UPDATE task SET
+            category_id = (SELECT id FROM category WHERE category.name = task.category),
+            priority_rank = (SELECT rank FROM priority WHERE priority.name = task.priority)
+    """)
+
+    with op.batch_alter_table('task', schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.create_foreign_key('fk_task_category_id_category', 'category', ['category_id'], ['id'])
+        batch_op.create_foreign_key('fk_task_priority_rank_priority', 'priority', ['priority_rank'], ['rank'])
+        batch_op.drop_index('ix_task_user_priority_id')
+        batch_op.drop_column('priority')
+        batch_op.drop_column('category')
+        batch_op.create_index('ix_task_user_priority_due', ['user_id', 'priority_rank', 'due_date'], unique=False)
+        batch_op.create_index('ix_task_user_category', ['user_id', 'category_id'], unique=False)
+
+    _recreate_search_triggers()
+
+
+def downgrade():
+    op.add_column('task', sa.Column('category', sa.String(length=50), nullable=True))
+    op.add_column('task', sa.Column('priority', sa.String(length=50), nullable=True))
+    op.execute("""
+        UPDATE task SET
+            category = (SELECT name FROM category WHERE category.id = task.category_id),
+            priority = (SELECT name FROM priority WHERE priority.rank = task.priority_rank)
+    """)
+
+    with op.batch_alter_table('task', schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.drop_index('ix_task_user_category')
+        batch_op.drop_index('ix_task_user_priority_due')
+        batch_op.drop_constraint('fk_task_priority_rank_priority', type_='foreignkey')
+        batch_op.drop_constraint('fk_task_category_id_category', type_='foreignkey')
+        batch_op.drop_column('priority_rank')
+        batch_op.drop_column('category_id')
+        batch_op.create_index('ix_task_user_priority_id', ['user_id', 'priority', 'id'], unique=False)
+
+    _recreate_search_triggers()
+    op.drop_table('priority')
+    op.drop_table('category')
+
+
+def _recreate_search_triggers():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite' and sa.inspect(bind).has_table('task_search'):
+        for statement in SQLITE_SEARCH_TRIGGERS:
+            trigger = statement.split()[2]
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            op.execute(statement)
@@ -1,12 +1,15 @@
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+from sqlalchemy import event, select
 from itsdangerous import URLSafeTimedSerializer as Serializer
 from config import Config
+import passwords
+import shards
 from datetime import datetime
 
-# Initialize the database instance
-db = SQLAlchemy()
+# Initialize the database instance; users' data is routed to their shard, and
+# reads of read-only views can go to replicas
+db = SQLAlchemy(session_options={"class_": shards.ShardedSession})
 
 
 # User model to represent users of the application
@@ -14,14 +17,24 @@ class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(150), unique=True, nullable=False)
     email = db.Column(db.String(150), unique=True, nullable=False)
-    password_hash = db.Column(db.String(150), nullable=False)
-    tasks = db.relationship('Task', backref='user', lazy=True)
+    password_hash = db.Column(db.String(255), nullable=False)
+    # Index of the shard holding the user's data; NULL for the global database (see shards.py)
+    shard = db.Column(db.SmallInteger, nullable=True, index=True)
+    # Set when the account is deleted; the rows are then purged in the background
+    deleted_at = db.Column(db.DateTime, nullable=True, index=True)
+    # When the user's next reminder digest is due (see digests.py)
+    next_digest_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow, index=True)
+    tasks = db.relationship('Task', backref='user', lazy=True, passive_deletes=True)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return passwords.verify_password(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        """Return True if the stored hash predates the configured hashing method."""
+        return passwords.needs_rehash(self.password_hash)
 
     def get_reset_token(self, expires_sec=1800):
         """Generate a secure reset token that expires in 30 minutes."""
@@ -39,22 +52,281 @@ class User(UserMixin, db.Model):
             return None
         return User.query.get(user_id)
 
+    def identity(self):
+        """Return the fields cached to authorize the user's requests."""
+        return {"id": self.id, "username": self.username, "email": self.email, "shard": self.shard}
+
+
+# Identity of a logged-in user, as cached between requests
+class UserIdentity(UserMixin):
+    """
+        The cached identity of a logged-in user, returned by load_user.
+        Routes that modify the user load the User row itself.
+        """
+
+    def __init__(self, id, username, email, shard=None):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.shard = shard
+
+
+# Task categories and priorities offered by the app, in display order
+CATEGORIES = ["Work", "Personal", "Urgent"]
+PRIORITIES = ["High", "Medium", "Low"]
+
+
+# Lookup table of task categories; tasks store the small integer id
+class Category(db.Model):
+    id = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+
+
+# Lookup table of task priorities; a lower rank is more urgent and sorts first
+class Priority(db.Model):
+    rank = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+
+
+@event.listens_for(Category.__table__, 'after_create')
+def seed_categories(target, connection, **kw):
+    connection.execute(target.insert(), [{"id": code, "name": name} for code, name in enumerate(CATEGORIES, 1)])
+
+
+@event.listens_for(Priority.__table__, 'after_create')
+def seed_priorities(target, connection, **kw):
+    connection.execute(target.insert(), [{"rank": rank, "name": name} for rank, name in enumerate(PRIORITIES, 1)])
+
+
+class Lookup:
+    """
+        Maps the names of a lookup table to their codes and back.
+        The tables only change with migrations, so each process reads them
+        once, from the global database whatever shard the session is routed
+        to. Unknown names and codes map to None.
+        """
+
+    def __init__(self, code_column, name_column):
+        self.code_column = code_column
+        self.name_column = name_column
+        self._codes = None
+        self._names = None
+
+    def _load(self):
+        if self._codes is None:
+            rows = db.session.execute(
+                select(self.code_column, self.name_column).order_by(self.code_column),
+                bind_arguments={"bind": db.engine},
+            ).all()
+            if not rows:
+                # Not created yet; read again next time
+                return {}, {}
+            self._names = dict(rows)
+            self._codes = {name: code for code, name in rows}
+        return self._codes, self._names
+
+    def names(self):
+        """Return the names in code order."""
+        return list(self._load()[0])
+
+    def codes(self):
+        """Return the codes in order."""
+        return list(self._load()[1])
+
+    def code(self, name):
+        return self._load()[0].get(name) if isinstance(name, str) else None
+
+    def name(self, code):
+        return self._load()[1].get(code) if code is not None else None
+
+
+categories = Lookup(Category.id, Category.name)
+priorities = Lookup(Priority.rank, Priority.name)
+
+
+# Name properties over the category and priority codes of a task row
+class CategoryPriorityNames:
+    @property
+    def category(self):
+        return categories.name(self.category_id)
+
+    @category.setter
+    def category(self, name):
+        self.category_id = _lookup_code(categories, name, "category")
+
+    @property
+    def priority(self):
+        return priorities.name(self.priority_rank)
+
+    @priority.setter
+    def priority(self, name):
+        self.priority_rank = _lookup_code(priorities, name, "priority")
+
+
+def _lookup_code(lookup, name, field):
+    code = lookup.code(name)
+    if code is None and name is not None:
+        raise ValueError(f"Unknown {field}: {name!r}")
+    return code
+
 
 # Task model to represent tasks created by users
-class Task(db.Model):
+class Task(CategoryPriorityNames, db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
     name = db.Column(db.String(150), nullable=False)
-    category = db.Column(db.String(50), nullable=True)
-    priority = db.Column(db.String(50), nullable=True)
-    due_date = db.Column(db.String(50), nullable=True)
+    # Codes from the category and priority lookup tables; see the properties below
+    category_id = db.Column(db.SmallInteger, db.ForeignKey('category.id'), nullable=True)
+    priority_rank = db.Column(db.SmallInteger, db.ForeignKey('priority.rank'), nullable=True)
+    due_date = db.Column(db.Date, nullable=True)
     completed = db.Column(db.Boolean, default=False)
-    comments = db.relationship('Comment', backref='task', lazy=True)
+    # When the task was last completed; completed tasks move to the archive
+    # ARCHIVE_AFTER_DAYS later (see archive.py)
+    completed_at = db.Column(db.DateTime, nullable=True, index=True)
+    # Client-generated idempotency key for tasks created through the batch API
+    client_key = db.Column(db.String(64), nullable=True)
+    # User revision of the last write to the task or its comments
+    revision = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Newest first, as shown on the task page
+    # Comments are removed by the database's ON DELETE CASCADE
+    comments = db.relationship(
+        'Comment', backref='task', lazy=True, order_by='Comment.created_at.desc()',
+        cascade='all, delete-orphan', passive_deletes=True,
+    )
+
+    # Filled in by queries that ask for them (see with_comment_summary in app.py)
+    comment_count = db.query_expression()
+    last_comment_at = db.query_expression()
+
+    __table_args__ = (
+        # Serves the per-user overdue, upcoming and this-week range queries
+        db.Index('ix_task_user_completed_due', 'user_id', 'completed', 'due_date'),
+        # Serve the keyset-paginated task list for each sort option; the
+        # priority sort lists each priority by due date
+        db.Index('ix_task_user_id', 'user_id', 'id'),
+        db.Index('ix_task_user_due_date_id', 'user_id', 'due_date', 'id'),
+        db.Index('ix_task_user_priority_due', 'user_id', 'priority_rank', 'due_date'),
+        db.Index('ix_task_user_completed_id', 'user_id', 'completed', 'id'),
+        # Serves the category filter and the category counts
+        db.Index('ix_task_user_category', 'user_id', 'category_id'),
+        # A retried batch must not create the same task twice
+        db.Index('uq_task_user_client_key', 'user_id', 'client_key', unique=True),
+        # Serves the delta sync query for changed tasks
+        db.Index('ix_task_user_revision', 'user_id', 'revision'),
+        # Ids are never reused, so an archived task's id stays its own
+        {'sqlite_autoincrement': True},
+    )
 
 
 # Comment model to represent comments associated with tasks
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    task_id = db.Column(db.Integer, db.ForeignKey('task.id'), nullable=False)
+    task_id = db.Column(db.Integer, db.ForeignKey('task.id', ondelete='CASCADE'), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # User revision of the last write to the comment
+    revision = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        db.Index('ix_comment_task_revision', 'task_id', 'revision'),
+        # Serves the newest-first comment list of a task and its latest comment
+        db.Index('ix_comment_task_created_at', 'task_id', 'created_at'),
+        # Ids are never reused, so an archived comment's id stays its own
+        {'sqlite_autoincrement': True},
+    )
+
+
+# Completed task moved out of the task table by the archival job; keeps the task's id
+class ArchivedTask(CategoryPriorityNames, db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    name = db.Column(db.String(150), nullable=False)
+    category_id = db.Column(db.SmallInteger, db.ForeignKey('category.id'), nullable=True)
+    priority_rank = db.Column(db.SmallInteger, db.ForeignKey('priority.rank'), nullable=True)
+    due_date = db.Column(db.Date, nullable=True)
+    completed = db.Column(db.Boolean, default=True)
+    completed_at = db.Column(db.DateTime, nullable=True)
+    client_key = db.Column(db.String(64), nullable=True)
+    revision = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    comments = db.relationship(
+        'ArchivedComment', backref='task', lazy=True, order_by='ArchivedComment.created_at.desc()',
+        cascade='all, delete-orphan', passive_deletes=True,
+    )
+
+    __table_args__ = (
+        # Serves the paginated archive view and export
+        db.Index('ix_archived_task_user_id', 'user_id', 'id'),
+        # Lets imports skip tasks that were archived
+        db.Index('ix_archived_task_user_client_key', 'user_id', 'client_key'),
+    )
+
+
+# Comment of an archived task, moved with it
+class ArchivedComment(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    task_id = db.Column(db.Integer, db.ForeignKey('archived_task.id', ondelete='CASCADE'), nullable=False)
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    revision = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        db.Index('ix_archived_comment_task_created_at', 'task_id', 'created_at'),
+    )
+
+
+# Revision counter of a user's data, kept next to the data on the user's shard
+class UserRevision(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    # Incremented on every write to the user's data; drives delta sync and ETags
+    revision = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+
+# Record of a deleted task or comment, so delta sync clients learn about deletions
+class Tombstone(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    revision = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # 'task' or 'comment'
+    ref_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_tombstone_user_revision', 'user_id', 'revision'),
+    )
+
+
+# Dashboard statistics for a user, kept up to date by the task write routes
+class UserStats(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    total_tasks = db.Column(db.Integer, nullable=False, default=0)
+    completed_tasks = db.Column(db.Integer, nullable=False, default=0)
+    # Completion counts are relative to the period they were computed for
+    week_start = db.Column(db.Date, nullable=False)
+    completed_this_week = db.Column(db.Integer, nullable=False, default=0)
+    month_start = db.Column(db.Date, nullable=False)
+    completed_this_month = db.Column(db.Integer, nullable=False, default=0)
+    category_counts = db.Column(db.JSON, nullable=False, default=dict)
+
+
+# Unit of background work, run by the job worker (see jobs.py)
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    # Not run before this time; pushed back after each failed attempt
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Set while a worker runs the job; a lock older than JOB_LOCK_TIMEOUT_SECONDS
+    # belonged to a worker that died, and the job is run again
+    locked_by = db.Column(db.String(100), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    # Set once the last attempt has failed; the job is then kept for inspection
+    failed_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Serves the workers' query for runnable jobs
+        db.Index('ix_job_failed_run_at', 'failed_at', 'run_at'),
+    )
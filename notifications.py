@@ -0,0 +1,243 @@
+"""Server-pushed due-date notifications.
+
+A task is *upcoming* from the start of the day before it is due, and *overdue*
+from the start of the day after it. Those moments are known in advance, so
+each worker process keeps them in a min-heap and wakes only when the next one
+arrives. Clients get an event only when a task actually changes state. Nobody
+re-scans task lists on a polling interval.
+
+Only users with an open stream are tracked. Their open, dated tasks are
+loaded when they connect. They are reloaded after any commit in this process
+that touches them (see ``sync.on_commit``), and when their revision moves
+because another worker process wrote to them; the revision check is one
+query per shard for all tracked users every
+``NOTIFICATION_RESYNC_SECONDS``. No external broker is involved.
+"""
+import heapq
+import itertools
+import queue
+import threading
+from datetime import datetime, time, timedelta
+
+from models import db, Task, UserRevision
+import shards
+import sync
+
+UPCOMING, OVERDUE = 'upcoming', 'overdue'
+
+
+def task_state(due_date, today):
+    """Return UPCOMING, OVERDUE or None for an open task due on due_date."""
+    if due_date < today:
+        return OVERDUE
+    if (due_date - today).days <= 1:
+        return UPCOMING
+    return None
+
+
+def next_transition(due_date, now):
+    """Return the next moment after now at which the task's state changes, if any."""
+    for moment in (datetime.combine(due_date - timedelta(days=1), time.min),
+                   datetime.combine(due_date + timedelta(days=1), time.min)):
+        if moment > now:
+            return moment
+    return None
+
+
+class _Tracked:
+    """Scheduler state for one user with at least one open stream."""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.tasks = {}  # task id -> (name, due_date, state)
+        self.revision = None
+        self.generation = 0
+
+
+class DueDateScheduler:
+    """
+        Per-process timer heap of due-date transitions for streamed users.
+        - subscribe/unsubscribe manage one queue per open stream
+        - a background thread pops transitions as they come due and
+          publishes events to the owner's queues
+        The thread starts with the first subscriber, so it is never started in
+        a process that only imports the app.
+        """
+
+    def __init__(self, app=None, clock=datetime.now):
+        self.app = app
+        self.clock = clock
+        self._users = {}
+        self._heap = []
+        self._sequence = itertools.count()
+        self._dirty = set()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._next_resync = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('NOTIFICATION_RESYNC_SECONDS', 30)
+        sync.on_commit(self.refresh)
+
+    def subscribe(self, user_id):
+        """Open a stream for user_id; the returned queue starts with a snapshot event."""
+        subscription = queue.Queue()
+        with self._condition:
+            tracked = self._users.setdefault(user_id, _Tracked())
+            tracked.subscribers.add(subscription)
+            loaded = tracked.revision is not None
+        if not loaded:
+            # Queried without the lock, like the thread's reloads; a commit in
+            # the meantime finds the user tracked and has them reloaded
+            revision, rows = self._query(user_id)
+        with self._condition:
+            if not loaded and tracked.revision is None:
+                self._apply(user_id, tracked, revision, rows, announce=False)
+            subscription.put(self._snapshot(tracked))
+            self._ensure_thread()
+            # The new user's transitions may come before the current deadline
+            self._condition.notify()
+        return subscription
+
+    def unsubscribe(self, user_id, subscription):
+        """Close a stream; users without streams are no longer tracked."""
+        with self._condition:
+            tracked = self._users.get(user_id)
+            if tracked is not None:
+                tracked.subscribers.discard(subscription)
+                if not tracked.subscribers:
+                    del self._users[user_id]
+
+    def refresh(self, user_ids):
+        """Reload tracked users after their data changed in this process."""
+        with self._condition:
+            dirty = {user_id for user_id in user_ids if user_id in self._users}
+            if dirty:
+                self._dirty |= dirty
+                self._condition.notify()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='due-date-scheduler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            # Only the bookkeeping happens under the lock: refresh() runs after
+            # every commit in the process and must not wait for the queries
+            with self._condition:
+                now = self.clock()
+                resync = self._next_resync is None or now >= self._next_resync
+                if resync:
+                    self._next_resync = now + timedelta(seconds=self.app.config['NOTIFICATION_RESYNC_SECONDS'])
+                known = {user_id: tracked.revision for user_id, tracked in self._users.items()}
+                dirty, self._dirty = self._dirty, set()
+
+            if resync:
+                dirty |= self._stale_users(known)
+            loaded = {user_id: self._query(user_id) for user_id in dirty if user_id in known}
+
+            with self._condition:
+                for user_id, (revision, rows) in loaded.items():
+                    if user_id in self._users:
+                        self._apply(user_id, self._users[user_id], revision, rows, announce=True)
+                self._fire_due(self.clock())
+                # Users marked dirty while the queries ran are reloaded at once
+                if not self._dirty:
+                    deadline = self._next_resync
+                    if self._heap:
+                        deadline = min(deadline, self._heap[0][0])
+                    self._condition.wait(max((deadline - self.clock()).total_seconds(), 0))
+
+    def _fire_due(self, now):
+        today = now.date()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, user_id, generation, task_id = heapq.heappop(self._heap)
+            tracked = self._users.get(user_id)
+            if tracked is None or tracked.generation != generation or task_id not in tracked.tasks:
+                continue  # Superseded by a reload or an unsubscribe
+            name, due_date, state = tracked.tasks[task_id]
+            new_state = task_state(due_date, today)
+            tracked.tasks[task_id] = (name, due_date, new_state)
+            if new_state != state and new_state is not None:
+                self._publish(tracked, new_state, task_id, name, due_date)
+            self._schedule(user_id, tracked, task_id, due_date, now)
+
+    def _stale_users(self, known):
+        # Picks up writes made by other worker processes, given the
+        # revision each tracked user was loaded at
+        if not known:
+            return set()
+        revisions = {}
+        with self.app.app_context():
+            for shard, user_ids in shards.group_by_shard(known).items():
+                with shards.use(shard):
+                    revisions.update(
+                        db.session.query(UserRevision.user_id, UserRevision.revision)
+                        .filter(UserRevision.user_id.in_(user_ids))
+                    )
+        return {user_id for user_id, revision in known.items() if revisions.get(user_id, 0) != revision}
+
+    def _query(self, user_id):
+        """Return the user's revision and open, dated tasks; runs without the lock."""
+        with self.app.app_context(), shards.for_user(user_id):
+            revision = sync.current_revision(user_id)
+            rows = Task.query.with_entities(Task.id, Task.name, Task.due_date) \
+                .filter_by(user_id=user_id, completed=False) \
+                .filter(Task.due_date.isnot(None)).all()
+        return revision, rows
+
+    def _apply(self, user_id, tracked, revision, rows, announce):
+        # Called with the lock held
+        now = self.clock()
+        today = now.date()
+        previous = tracked.tasks
+        tracked.revision = revision
+        tracked.generation += 1
+        tracked.tasks = {}
+        for task_id, name, due_date in rows:
+            state = task_state(due_date, today)
+            tracked.tasks[task_id] = (name, due_date, state)
+            old_state = previous[task_id][2] if task_id in previous else None
+            if announce and state is not None and state != old_state:
+                self._publish(tracked, state, task_id, name, due_date)
+            self._schedule(user_id, tracked, task_id, due_date, now)
+        self._compact()
+
+    def _schedule(self, user_id, tracked, task_id, due_date, now):
+        moment = next_transition(due_date, now)
+        if moment is not None:
+            heapq.heappush(self._heap, (moment, next(self._sequence), user_id, tracked.generation, task_id))
+
+    def _compact(self):
+        # Drop entries superseded by reloads once they dominate the heap
+        live = sum(len(tracked.tasks) for tracked in self._users.values())
+        if len(self._heap) > 2 * live + 64:
+            self._heap = [
+                entry for entry in self._heap
+                if entry[2] in self._users and entry[3] == self._users[entry[2]].generation
+            ]
+            heapq.heapify(self._heap)
+
+    def _snapshot(self, tracked):
+        tasks = sorted(tracked.tasks.values(), key=lambda item: item[1])
+        return {
+            "type": "snapshot",
+            "overdue_tasks": [_task_payload(name, due) for name, due, state in tasks if state == OVERDUE],
+            "upcoming_tasks": [_task_payload(name, due) for name, due, state in tasks if state == UPCOMING],
+        }
+
+    def _publish(self, tracked, state, task_id, name, due_date):
+        event = {"type": state, "id": task_id, **_task_payload(name, due_date)}
+        for subscription in tracked.subscribers:
+            subscription.put(event)
+
+
+def _task_payload(name, due_date):
+    return {"name": name, "due_date": due_date.isoformat()}
+
+
+scheduler = DueDateScheduler()
@@ -0,0 +1,189 @@
+"""Cursor pagination for task listings.
+
+Sorted listings use keyset pagination: pages are addressed by the sort key of
+the last row shown instead of an OFFSET, so every page is an index range scan
+of the same cost. Rows are ordered by the sort column and then by id; rows
+whose sort column is NULL come after all others, ordered by id alone. The
+cursor records which of the two regions the previous page ended in.
+
+A listing can also be grouped by a column with a few known values, such as
+the priority: the groups are listed one after another in a given order, each
+sorted as above, and the cursor also records the group it ended in. Each
+group is then a range of an index on (group column, sort column).
+
+Relevance-ranked search results have no stable key to seek to and are paged
+by position instead.
+"""
+import base64
+import binascii
+import json
+from datetime import date
+
+from sqlalchemy import Date, and_, literal, or_, true
+
+# Cursor regions: rows with a value in the sort column, then rows without one.
+# OFFSET cursors address positions in ranked results.
+VALUES, NULLS, OFFSET = 'v', 'n', 'o'
+
+
+def encode_cursor(region, value, row_id, group=None):
+    """Encode the position after a row as an opaque URL-safe string."""
+    if isinstance(value, date):
+        value = value.isoformat()
+    position = [region, value, row_id] if group is None else [region, value, row_id, group]
+    payload = json.dumps(position, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor, column=None, regions=(VALUES, NULLS), grouped=False):
+    """
+        Decode a cursor into (region, value, row id, group index).
+        Returns None when it is missing or malformed, or lacks the group
+        index a grouped listing needs.
+        """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        region, value, row_id, *group = json.loads(base64.urlsafe_b64decode(padded))
+        if region not in regions or not isinstance(row_id, int):
+            return None
+        if grouped != bool(group) or (group and (len(group) > 1 or not isinstance(group[0], int))):
+            return None
+        if value is not None and column is not None and isinstance(column.type, Date):
+            value = date.fromisoformat(value)
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    return region, value, row_id, group[0] if group else None
+
+
+class KeysetPage:
+    """
+        One page of a keyset-paginated query.
+        Rows are fetched lazily while the page is iterated, so a streamed
+        template can send rows as they arrive. ``next_cursor`` is known once
+        iteration has finished. Pass ``group_column`` and the ordered list of
+        its values, None included if it is nullable, to group the rows.
+        """
+
+    def __init__(self, query, id_column, sort_column=None, cursor=None, per_page=50, group_column=None, groups=()):
+        self.query = query
+        self.id_column = id_column
+        self.sort_column = sort_column
+        self.group_column = group_column
+        self.groups = list(groups)
+        self.position = decode_cursor(cursor, sort_column, grouped=group_column is not None)
+        if self.position and self.position[3] is not None and not 0 <= self.position[3] < len(self.groups):
+            self.position = None
+        self.per_page = per_page
+        self.next_cursor = None
+        self.is_first = self.position is None
+
+    def __iter__(self):
+        count = 0
+        last = None
+        for row in self._rows():
+            if count == self.per_page:
+                # One row beyond the page means another page exists
+                self.next_cursor = encode_cursor(*self._key(last))
+                return
+            count += 1
+            last = row
+            yield row
+
+    def _rows(self):
+        if self.sort_column is None:
+            after_id = self.position[2] if self.position else 0
+            yield from self._fetch(self.id_column > after_id, self.per_page + 1, self.id_column)
+            return
+
+        region, value, after_id, group = self.position or (VALUES, None, 0, 0)
+        if self.group_column is None:
+            yield from self._sorted_rows(true(), region, value, after_id, self.per_page + 1)
+            return
+
+        # Continue in the group the cursor ended in, then go through the rest
+        fetched = 0
+        for group_value in self.groups[group:]:
+            if group_value is None:
+                in_group = self.group_column.is_(None)
+            else:
+                in_group = self.group_column == group_value
+            for row in self._sorted_rows(in_group, region, value, after_id, self.per_page + 1 - fetched):
+                fetched += 1
+                yield row
+            if fetched > self.per_page:
+                return
+            region, value, after_id = VALUES, None, 0
+
+    def _sorted_rows(self, condition, region, value, after_id, limit):
+        # Rows with a sort value after the cursor, then those without one
+        column = self.sort_column
+        fetched = 0
+        if region == VALUES:
+            in_region = column.isnot(None)
+            if value is not None:
+                value = literal(value, column.type)
+                in_region = and_(
+                    in_region, or_(column > value, and_(column == value, self.id_column > after_id))
+                )
+            for row in self._fetch(and_(condition, in_region), limit, column, self.id_column):
+                fetched += 1
+                yield row
+            after_id = 0
+        if fetched < limit:
+            yield from self._fetch(
+                and_(condition, column.is_(None), self.id_column > after_id), limit - fetched, self.id_column
+            )
+
+    def _fetch(self, condition, limit, *order_by):
+        return self.query.filter(condition).order_by(*order_by).limit(limit)
+
+    def _key(self, row):
+        row_id = getattr(row, self.id_column.key)
+        if self.sort_column is None:
+            return VALUES, None, row_id
+        value = getattr(row, self.sort_column.key)
+        group = None
+        if self.group_column is not None:
+            group = self.groups.index(getattr(row, self.group_column.key))
+        return (VALUES if value is not None else NULLS), value, row_id, group
+
+
+class RankedPage:
+    """
+        One page of a query that is already ordered by relevance.
+        Has the same interface as ``KeysetPage``; the cursor holds the
+        position of the next row.
+        """
+
+    def __init__(self, query, cursor=None, per_page=50):
+        self.query = query
+        position = decode_cursor(cursor, regions=(OFFSET,))
+        self.offset = max(position[2], 0) if position else 0
+        self.per_page = per_page
+        self.next_cursor = None
+        self.is_first = self.offset == 0
+
+    def __iter__(self):
+        rows = self.query.offset(self.offset).limit(self.per_page + 1)
+        for count, row in enumerate(rows):
+            if count == self.per_page:
+                self.next_cursor = encode_cursor(OFFSET, None, self.offset + self.per_page)
+                return
+            yield row
+
+
+class StaticPage:
+    """
+        A page whose rows were fetched earlier, e.g. one served from a cache.
+        Has the same interface as ``KeysetPage``.
+        """
+
+    def __init__(self, rows, next_cursor=None, is_first=True):
+        self.rows = rows
+        self.next_cursor = next_cursor
+        self.is_first = is_first
+
+    def __iter__(self):
+        return iter(self.rows)
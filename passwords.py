@@ -0,0 +1,96 @@
+"""Password hashing off the request threads.
+
+Hashing and verifying passwords are deliberately slow, CPU-bound calls. They
+run in a small process pool per worker process, so a burst of logins or
+registrations can use at most ``PASSWORD_HASH_WORKERS`` cores per worker
+while the request threads keep serving other traffic. Set it to 0 to hash
+inline.
+
+The method and cost come from ``PASSWORD_HASH_METHOD`` (any method werkzeug
+accepts, e.g. ``pbkdf2:sha256:600000`` or ``scrypt:32768:8:1``). Hashes made
+with another method keep working and are replaced on the user's next login
+(see ``needs_rehash``).
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+# Stored method prefix for each configured method, e.g. 'pbkdf2:sha256' ->
+# 'pbkdf2:sha256:600000'
+_normalized_methods = {}
+
+
+def init_app(app):
+    app.config.setdefault('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    app.config.setdefault('PASSWORD_SALT_LENGTH', 16)
+    app.config.setdefault('PASSWORD_HASH_WORKERS', 2)
+
+
+def hash_password(password):
+    """Hash a password with the configured method and cost."""
+    config = current_app.config
+    return _run(generate_password_hash, password, config['PASSWORD_HASH_METHOD'], config['PASSWORD_SALT_LENGTH'])
+
+
+def verify_password(password_hash, password):
+    """Check a password against a stored hash made with any supported method."""
+    return _run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """Return True if a stored hash was not made with the configured method."""
+    return password_hash.split('$', 1)[0] != _normalized_method(current_app.config['PASSWORD_HASH_METHOD'])
+
+
+def _normalized_method(method):
+    # werkzeug fills in default parameters, so the stored prefix can differ
+    # from the configured method; hash once to learn it
+    normalized = _normalized_methods.get(method)
+    if normalized is None:
+        normalized = _normalized_methods[method] = generate_password_hash('', method, 1).split('$', 1)[0]
+    return normalized
+
+
+def _run(function, *args):
+    pool = _get_pool()
+    if pool is None:
+        return function(*args)
+    try:
+        return pool.submit(function, *args).result()
+    except BrokenProcessPool:
+        # A pool process died; start a fresh pool for later calls
+        _reset_pool(pool)
+        return function(*args)
+
+
+def _get_pool():
+    global _pool, _pool_pid
+    workers = current_app.config['PASSWORD_HASH_WORKERS']
+    if workers <= 0:
+        return None
+    with _pool_lock:
+        # Pools do not survive a fork, so each worker process starts its own
+        if _pool is None or _pool_pid != os.getpid():
+            # Forking a threaded server process is unsafe; start pool
+            # processes from a clean server process instead
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _reset_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
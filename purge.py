@@ -0,0 +1,110 @@
+"""Background removal of deleted accounts.
+
+Deleting an account only sets ``User.deleted_at``; from then on the user can
+no longer log in and their data is no longer served. A background thread in
+each worker process then removes the user's comments, tasks, archived
+comments, archived tasks, tombstones, statistics and revision from the
+user's shard, and finally the user row. Every chunk of
+``ACCOUNT_PURGE_CHUNK_SIZE`` rows is its own short transaction, so other
+users' writes get the write lock in between. Comments go before their tasks,
+so a task with many comments does not take them all in one transaction.
+
+The thread wakes when an account is deleted in its process, and otherwise
+every ``ACCOUNT_PURGE_INTERVAL_SECONDS`` to pick up accounts left behind by
+restarts or by other processes.
+"""
+import threading
+import time
+
+from models import db, User, UserRevision, Task, Comment, ArchivedTask, ArchivedComment, Tombstone
+import shards
+import stats as user_stats
+
+
+class AccountPurger:
+    """
+        Per-process worker that purges accounts marked as deleted.
+        - wake asks for a purge pass as soon as possible
+        - ensure_started starts the thread on first use in a process
+        """
+
+    def __init__(self, app=None):
+        self.app = app
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('ACCOUNT_PURGE_CHUNK_SIZE', 500)
+        app.config.setdefault('ACCOUNT_PURGE_PAUSE_MS', 20)
+        app.config.setdefault('ACCOUNT_PURGE_INTERVAL_SECONDS', 300)
+        app.before_request(self.ensure_started)
+
+    def wake(self):
+        """Start a purge pass now, e.g. right after an account was deleted."""
+        self.ensure_started()
+        self._wakeup.set()
+
+    def ensure_started(self):
+        # Threads do not survive a fork, so this runs on each request
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='account-purger', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    self.purge_deleted_accounts()
+            except Exception:
+                self.app.logger.exception('Account purge failed')
+            self._wakeup.wait(self.app.config['ACCOUNT_PURGE_INTERVAL_SECONDS'])
+            self._wakeup.clear()
+
+    def purge_deleted_accounts(self):
+        """Purge every account marked as deleted."""
+        user_ids = [user_id for user_id, in db.session.query(User.id).filter(User.deleted_at.isnot(None))]
+        db.session.rollback()
+        for user_id in user_ids:
+            self.purge_account(user_id)
+
+    def purge_account(self, user_id):
+        """Remove a deleted user's rows from their shard, then the user row itself."""
+        with shards.for_user(user_id):
+            self.purge_user_data(user_id)
+        User.query.filter(User.id == user_id, User.deleted_at.isnot(None)).delete()
+        db.session.commit()
+
+    def purge_user_data(self, user_id):
+        """Remove a user's rows from the current shard in chunks; also used by shard moves."""
+        task_ids = db.session.query(Task.id).filter(Task.user_id == user_id).scalar_subquery()
+        self._delete_in_chunks(Comment, Comment.task_id.in_(task_ids))
+        self._delete_in_chunks(Task, Task.user_id == user_id)
+        archived_ids = db.session.query(ArchivedTask.id).filter(ArchivedTask.user_id == user_id).scalar_subquery()
+        self._delete_in_chunks(ArchivedComment, ArchivedComment.task_id.in_(archived_ids))
+        self._delete_in_chunks(ArchivedTask, ArchivedTask.user_id == user_id)
+        self._delete_in_chunks(Tombstone, Tombstone.user_id == user_id)
+        user_stats.delete_stats(user_id)
+        UserRevision.query.filter_by(user_id=user_id).delete()
+        db.session.commit()
+
+    def _delete_in_chunks(self, model, condition):
+        chunk_size = self.app.config['ACCOUNT_PURGE_CHUNK_SIZE']
+        pause = self.app.config['ACCOUNT_PURGE_PAUSE_MS'] / 1000
+        while True:
+            ids = [row_id for row_id, in db.session.query(model.id).filter(condition).limit(chunk_size)]
+            if not ids:
+                db.session.rollback()
+                return
+            model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+            # Let writers waiting on the lock go first
+            time.sleep(pause)
+
+
+purger = AccountPurger()
@@ -0,0 +1,128 @@
+"""Read/write splitting between the primary database and read replicas.
+
+Replicas are listed in ``DATABASE_REPLICA_URLS`` and become the SQLAlchemy
+binds ``replica0``, ``replica1``, ... with the primary's engine options.
+GET requests to views decorated with ``read_only`` read from one replica,
+picked at random per request; everything else uses the primary. A session
+moves to the primary for the rest of the request as soon as it writes or
+reads with FOR UPDATE, so a read-only view that does write (the dashboard's
+statistics rebuild) still sees its own rows.
+
+Replicas lag behind the primary. So users see their own writes, a request
+that wrote pins its user to the primary for ``REPLICA_PIN_SECONDS``. The pin
+is kept in the session cookie, so it holds whichever worker process serves
+the next request. Writes made by background jobs show up once the replicas
+have caught up.
+
+On Postgres the replicas are streaming replicas (hot standbys). SQLite
+replicas are plain copies of the primary file, refreshed by
+``flask replicas sync``, which stands in for replication when running
+locally. Without replicas every request uses the primary.
+"""
+import random
+import time
+from functools import wraps
+
+import click
+from flask import current_app, request, session
+from flask.cli import with_appcontext
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Select
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.dml import UpdateBase
+
+
+def init_app(app):
+    """Turn DATABASE_REPLICA_URLS into binds; call after database.init_app and before db.init_app."""
+    config = app.config
+    config.setdefault('DATABASE_REPLICA_URLS', [])
+    config.setdefault('REPLICA_PIN_SECONDS', 5)
+    binds = config.setdefault('SQLALCHEMY_BINDS', {})
+    for index, url in enumerate(config['DATABASE_REPLICA_URLS']):
+        # The primary's engine profile applies to the replicas too
+        binds[f"replica{index}"] = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS', {}), url=url)
+    app.after_request(_pin_writers)
+    app.cli.add_command(replicas_command)
+
+
+def replica_keys():
+    return [key for key in current_app.config.get('SQLALCHEMY_BINDS', {}) if key.startswith('replica')]
+
+
+def pinned():
+    """Return whether the current user wrote recently enough to read from the primary."""
+    return session.get('primary_until', 0) > time.time()
+
+
+class RoutingSession(Session):
+    """
+        Session that sends the reads of read-only requests to a replica.
+        - info['replica'] holds the bind key of the replica to use
+        - info['wrote'] is set by the first write, which also drops the replica
+        """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and (self._flushing or _is_write(clause)):
+            self.info['wrote'] = True
+            self.info.pop('replica', None)
+        replica = self.info.get('replica')
+        if bind is None and replica is not None:
+            return self._db.engines[replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _is_write(clause):
+    return isinstance(clause, UpdateBase) or (isinstance(clause, Select) and clause._for_update_arg is not None)
+
+
+def read_only(view):
+    """Decorate a view whose GET requests only read, so they can be served by a replica."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        keys = replica_keys()
+        if keys and request.method in ('GET', 'HEAD') and not pinned():
+            from models import db  # models imports this module for RoutingSession
+            db.session.info['replica'] = random.choice(keys)
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _pin_writers(response):
+    from models import db  # models imports this module for RoutingSession
+    if replica_keys() and db.session.info.get('wrote'):
+        session['primary_until'] = time.time() + current_app.config['REPLICA_PIN_SECONDS']
+    return response
+
+
+@click.group('replicas')
+def replicas_command():
+    """Manage the read replicas."""
+
+
+@replicas_command.command('sync')
+@click.option('--interval', type=float, default=0, help='Sync again every this many seconds; 0 syncs once.')
+@with_appcontext
+def sync_command(interval):
+    """Copy the primary SQLite database to the SQLite replicas."""
+    from models import db  # models imports this module for RoutingSession
+    keys = [key for key in replica_keys() if make_url(db.engines[key].url).get_backend_name() == 'sqlite']
+    if not keys or db.engine.dialect.name != 'sqlite':
+        raise click.ClickException("Only SQLite replicas of an SQLite primary are synced by this command.")
+    while True:
+        started = time.perf_counter()
+        for key in keys:
+            copy_sqlite(db.engine, db.engines[key])
+        click.echo(f"Synced {len(keys)} replica(s) in {time.perf_counter() - started:.2f}s.")
+        if not interval:
+            return
+        time.sleep(interval)
+
+
+def copy_sqlite(source_engine, target_engine):
+    """Copy an SQLite database over another with the online backup API; readers of either are not blocked."""
+    source, target = source_engine.raw_connection(), target_engine.raw_connection()
+    try:
+        source.driver_connection.backup(target.driver_connection)
+    finally:
+        target.close()
+        source.close()
@@ -0,0 +1,255 @@
+"""Full-text search over task names and comments.
+
+SQLite keeps an FTS5 table, ``task_search``, with one row per task. Its rowid
+is the task id. Each row holds an owner token plus the task name and the
+text of its comments. Triggers on ``task`` and ``comment`` keep it in sync.
+The owner token lets the FTS index itself restrict matches to one user.
+
+Postgres keeps a weighted ``tsvector`` column on ``task`` with a GIN index.
+Triggers maintain it the same way.
+
+Other databases, or SQLite builds without FTS5, fall back to a substring
+match on the task name.
+"""
+import re
+from contextlib import contextmanager
+
+import sqlalchemy as sa
+from sqlalchemy import event, text
+
+from models import db, Task
+
+# Handles on the FTS5 table and the Postgres search column, which are not
+# part of the model metadata
+task_search = sa.table('task_search', sa.column('rowid', sa.Integer))
+_search_vector = sa.literal_column('task.search_vector')
+
+# Insert triggers, which bulk_insert replaces with one statement per block
+TASK_SEARCH_AI = """
+    CREATE TRIGGER task_search_ai AFTER INSERT ON task BEGIN
+        INSERT INTO task_search(rowid, owner, name, comments)
+        VALUES (new.id, 'u' || new.user_id, new.name, '');
+    END
+    """
+COMMENT_SEARCH_AI = """
+    CREATE TRIGGER comment_search_ai AFTER INSERT ON comment BEGIN
+        UPDATE task_search SET comments = comments || ' ' || new.content WHERE rowid = new.task_id;
+    END
+    """
+
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE task_search USING fts5(
+        owner, name, comments, prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    TASK_SEARCH_AI,
+    """
+    CREATE TRIGGER task_search_au AFTER UPDATE OF name, user_id ON task BEGIN
+        UPDATE task_search SET owner = 'u' || new.user_id, name = new.name WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER task_search_ad AFTER DELETE ON task BEGIN
+        DELETE FROM task_search WHERE rowid = old.id;
+    END
+    """,
+    COMMENT_SEARCH_AI,
+    """
+    CREATE TRIGGER comment_search_au AFTER UPDATE OF content, task_id ON comment BEGIN
+        UPDATE task_search
+        SET comments = coalesce((
+            SELECT group_concat(content, ' ') FROM comment WHERE comment.task_id = task_search.rowid
+        ), '')
+        WHERE rowid IN (old.task_id, new.task_id);
+    END
+    """,
+    """
+    CREATE TRIGGER comment_search_ad AFTER DELETE ON comment BEGIN
+        UPDATE task_search
+        SET comments = coalesce((SELECT group_concat(content, ' ') FROM comment WHERE task_id = old.task_id), '')
+        WHERE rowid = old.task_id;
+    END
+    """,
+    """
+    INSERT INTO task_search(rowid, owner, name, comments)
+    SELECT task.id, 'u' || task.user_id, task.name,
+           coalesce((SELECT group_concat(content, ' ') FROM comment WHERE comment.task_id = task.id), '')
+    FROM task
+    """,
+]
+
+POSTGRES_DDL = [
+    "ALTER TABLE task ADD COLUMN search_vector tsvector",
+    """
+    CREATE FUNCTION task_search_vector(task_name text, task_id integer) RETURNS tsvector AS $$
+        SELECT setweight(to_tsvector('simple', coalesce(task_name, '')), 'A') ||
+               setweight(to_tsvector('simple', coalesce(
+                   (SELECT string_agg(content, ' ') FROM comment WHERE comment.task_id = $2), ''
+               )), 'B')
+    $$ LANGUAGE sql STABLE
+    """,
+    """
+    CREATE FUNCTION task_search_task_trigger() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := task_search_vector(NEW.name, NEW.id);
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER task_search_biu BEFORE INSERT OR UPDATE OF name ON task
+    FOR EACH ROW EXECUTE FUNCTION task_search_task_trigger()
+    """,
+    """
+    CREATE FUNCTION task_search_comment_trigger() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE task SET search_vector = task_search_vector(name, id) WHERE id = OLD.task_id;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            UPDATE task SET search_vector = task_search_vector(name, id) WHERE id = NEW.task_id;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER comment_search_aiud AFTER INSERT OR UPDATE OF content, task_id OR DELETE ON comment
+    FOR EACH ROW EXECUTE FUNCTION task_search_comment_trigger()
+    """,
+    "UPDATE task SET search_vector = task_search_vector(name, id)",
+    "CREATE INDEX ix_task_search_vector ON task USING gin (search_vector)",
+]
+
+# Search backend per engine, detected once
+_backends = {}
+
+
+def install(connection):
+    """Create the search index and its triggers if they do not exist yet."""
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'task_search'")
+        ).first()
+        statements = SQLITE_DDL
+        compile_options = {row[0] for row in connection.exec_driver_sql('PRAGMA compile_options')}
+        if 'ENABLE_FTS5' not in compile_options:
+            # Searches fall back to substring matching
+            return
+    elif dialect == 'postgresql':
+        exists = connection.execute(
+            text("SELECT 1 FROM information_schema.columns "
+                 "WHERE table_name = 'task' AND column_name = 'search_vector'")
+        ).first()
+        statements = POSTGRES_DDL
+    else:
+        return
+    if exists:
+        return
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _install_after_create(target, connection, **kw):
+    install(connection)
+
+
+def _backend():
+    engine = db.session.get_bind()
+    backend = _backends.get(engine.url)
+    if backend is None:
+        backend = 'like'
+        with engine.connect() as connection:
+            if engine.dialect.name == 'sqlite':
+                if connection.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'task_search'")
+                ).first():
+                    backend = 'fts5'
+            elif engine.dialect.name == 'postgresql':
+                backend = 'tsvector'
+        _backends[engine.url] = backend
+    return backend
+
+
+# Table -> its insert trigger, the trigger's DDL, and the statement that
+# indexes the rows inserted after :last_id at once
+_BULK_INDEX = {
+    'task': ('task_search_ai', TASK_SEARCH_AI, """
+        INSERT INTO task_search(rowid, owner, name, comments)
+        SELECT id, 'u' || user_id, name, '' FROM task WHERE id > :last_id
+    """),
+    'comment': ('comment_search_ai', COMMENT_SEARCH_AI, """
+        UPDATE task_search
+        SET comments = coalesce((
+            SELECT group_concat(content, ' ') FROM comment WHERE comment.task_id = task_search.rowid
+        ), '')
+        WHERE rowid IN (SELECT task_id FROM comment WHERE id > :last_id)
+    """),
+}
+
+
+@contextmanager
+def bulk_insert(table):
+    """
+        Index the rows inserted into table ('task' or 'comment') in the block
+        with one statement at its end, instead of a trigger per row.
+        - Only on SQLite with FTS5, inside the session's open write transaction:
+          the trigger is dropped and recreated within it, so other connections
+          never see it missing, and a rollback restores it
+        - Otherwise the triggers index the rows as usual
+        """
+    connection = db.session.connection()
+    if _backend() != 'fts5' or not connection.connection.dbapi_connection.in_transaction:
+        yield
+        return
+    trigger, create, index = _BULK_INDEX[table]
+    connection.exec_driver_sql(f"DROP TRIGGER {trigger}")
+    try:
+        last_id = connection.execute(text(f"SELECT coalesce(max(id), 0) FROM {table}")).scalar()
+        yield
+        connection.execute(text(index), {"last_id": last_id})
+    finally:
+        connection.exec_driver_sql(create)
+
+
+def matching(query, search_text, user_id, ranked=False):
+    """
+        Restrict a task query to tasks of user_id matching every word of search_text.
+        With ranked, also order it with the best matches first; on SQLite
+        the ranked matches are joined, so the FTS index is searched once.
+        """
+    terms = _terms(search_text)
+    backend = _backend()
+    if not terms or backend == 'like':
+        query = query.filter(Task.name.ilike(f"%{search_text}%"))
+        return query.order_by(Task.id) if ranked else query
+    if backend == 'fts5':
+        matches = _fts_matches(terms, user_id)
+        if ranked:
+            return query.join(matches, matches.c.rowid == Task.id).order_by(matches.c.rank, Task.id)
+        return query.filter(Task.id.in_(sa.select(matches.c.rowid)))
+    tsquery = _tsquery(terms)
+    query = query.filter(_search_vector.op('@@')(tsquery))
+    return query.order_by(sa.func.ts_rank(_search_vector, tsquery).desc(), Task.id) if ranked else query
+
+
+def _terms(search_text):
+    return re.findall(r'\w+', search_text.lower())
+
+
+def _fts_matches(terms, user_id):
+    # The owner token restricts matches to one user inside the FTS index
+    words = ' AND '.join(f'"{term}"*' for term in terms)
+    expression = f'owner : "u{user_id}" AND {{name comments}} : ({words})'
+    # bm25 scores are negative, best first; weights are (owner, name, comments)
+    return sa.select(
+        task_search.c.rowid,
+        sa.literal_column('bm25(task_search, 0.0, 10.0, 1.0)').label('rank'),
+    ).where(text("task_search MATCH :search_match").bindparams(search_match=expression)).subquery()
+
+
+def _tsquery(terms):
+    return sa.func.to_tsquery('simple', ' & '.join(f'{term}:*' for term in terms))
@@ -0,0 +1,133 @@
+"""Synthetic data for benchmarks and local testing.
+
+``flask seed`` bulk-inserts users with tasks and comments. Due dates are
+spread the way a real task list looks: some overdue, some due today or
+tomorrow, most over the coming weeks, and a share without a due date. Older
+tasks are more likely to be completed. The same ``--seed`` always produces
+the same data. Users are spread over the shards as registration would.
+"""
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import insert
+
+from models import db, User, UserRevision, Task, Comment, categories, priorities
+import shards
+
+CATEGORIES = ["Work", "Personal", "Urgent"]
+PRIORITIES = ["Low", "Medium", "High"]
+WORDS = [
+    "report", "invoice", "groceries", "meeting", "review", "draft", "call", "email", "plan", "budget",
+    "dentist", "deploy", "backup", "slides", "contract", "garden", "laundry", "tickets", "refactor", "notes",
+]
+
+# Seeded users all share this password
+PASSWORD = "password1"
+
+
+def random_due_date(rng, today):
+    """Return a due date drawn from a realistic spread around today, or None."""
+    roll = rng.random()
+    if roll < 0.25:
+        return None
+    if roll < 0.40:
+        return today - timedelta(days=rng.randint(1, 60))  # Overdue
+    if roll < 0.50:
+        return today + timedelta(days=rng.randint(0, 1))  # Upcoming
+    return today + timedelta(days=rng.randint(2, 90))
+
+
+def seed(users, tasks_per_user, comments_per_task, seed_value=0, batch_size=5000):
+    """Insert the synthetic dataset and return the ids of the new users."""
+    rng = random.Random(seed_value)
+    today = datetime.now().date()
+    now = datetime.utcnow()
+
+    # Hashing is deliberately slow, so every user gets the same hash
+    password_user = User()
+    password_user.set_password(PASSWORD)
+    first_id = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+    user_rows = [
+        dict(id=first_id + index, username=f"seed{seed_value}-user{first_id + index}",
+             email=f"seed{seed_value}-user{first_id + index}@example.com",
+             password_hash=password_user.password_hash, shard=shard)
+        for index, shard in enumerate(shards.assign(users))
+    ]
+    db.session.execute(insert(User), user_rows)
+
+    category_ids = {name: categories.code(name) for name in CATEGORIES}
+    priority_ranks = {name: priorities.code(name) for name in PRIORITIES}
+    # Task ids are assigned here, so comments can refer to them; each shard has its own
+    next_task_ids = {}
+    batches = defaultdict(lambda: ([], []))
+    for user in user_rows:
+        shard = shards.key(user["shard"])
+        if shard not in next_task_ids:
+            with shards.use(shard):
+                next_task_ids[shard] = (db.session.query(db.func.max(Task.id)).scalar() or 0) + 1
+        task_rows, comment_rows = batches[shard]
+        for _ in range(tasks_per_user):
+            task_id = next_task_ids[shard]
+            next_task_ids[shard] += 1
+            due_date = random_due_date(rng, today)
+            age = (today - due_date).days if due_date else rng.randint(-30, 30)
+            task = dict(
+                id=task_id,
+                user_id=user["id"],
+                name=" ".join(rng.sample(WORDS, rng.randint(1, 3))).capitalize(),
+                category_id=category_ids[rng.choice(CATEGORIES)],
+                priority_rank=priority_ranks[rng.choice(PRIORITIES)],
+                due_date=due_date,
+                completed=rng.random() < min(0.9, max(0.1, 0.4 + age / 100)),
+                revision=1,
+            )
+            # Completed around the due date, and never in the future
+            task["completed_at"] = now - timedelta(days=max(age, 0)) if task["completed"] else None
+            task_rows.append(task)
+            for index in range(comments_per_task):
+                comment_rows.append(dict(
+                    task_id=task_id,
+                    content=" ".join(rng.choices(WORDS, k=rng.randint(3, 12))),
+                    created_at=now - timedelta(minutes=rng.randint(0, 60 * 24 * 30)),
+                    revision=1,
+                ))
+        if len(task_rows) >= batch_size:
+            _flush(shard, task_rows, comment_rows)
+
+    for shard, (task_rows, comment_rows) in batches.items():
+        _flush(shard, task_rows, comment_rows)
+        with shards.use(shard):
+            db.session.execute(insert(UserRevision), [
+                dict(user_id=user["id"], revision=1) for user in user_rows if shards.key(user["shard"]) == shard
+            ])
+    db.session.commit()
+    return [user["id"] for user in user_rows]
+
+
+def _flush(shard, task_rows, comment_rows):
+    # Executemany inserts in batches keep memory bounded for large datasets
+    with shards.use(shard):
+        if task_rows:
+            db.session.execute(insert(Task), task_rows)
+        if comment_rows:
+            db.session.execute(insert(Comment), comment_rows)
+    task_rows.clear()
+    comment_rows.clear()
+
+
+@click.command('seed')
+@click.option('--users', default=10, show_default=True, help='Number of users to create.')
+@click.option('--tasks', 'tasks_per_user', default=200, show_default=True, help='Tasks per user.')
+@click.option('--comments', 'comments_per_task', default=2, show_default=True, help='Comments per task.')
+@click.option('--seed', 'seed_value', default=0, show_default=True, help='Random seed.')
+@with_appcontext
+def seed_command(users, tasks_per_user, comments_per_task, seed_value):
+    """Bulk-generate users, tasks and comments for benchmarking."""
+    user_ids = seed(users, tasks_per_user, comments_per_task, seed_value)
+    click.echo(
+        f"Created {len(user_ids)} users with {tasks_per_user} tasks and {comments_per_task} "
+        f"comments per task. Log in as seed{seed_value}-user{user_ids[0]}@example.com / {PASSWORD}."
+    )
@@ -0,0 +1,437 @@
+"""Horizontal sharding of users' data across databases.
+
+Accounts stay in the global database, the default bind, along with the job
+queue. Everything else a user owns lives on the user's shard:
+- tasks and comments, and their archive
+- tombstones
+- statistics
+- the revision counter
+
+Shards are the databases listed in ``DATABASE_SHARD_URLS``. They become the
+binds ``shard0``, ``shard1``, ... with the global database's engine options.
+Each shard has its own write lock (SQLite) or server, so users on different
+shards do not wait for each other's writes.
+
+- ``User.shard`` is the index of the user's shard. NULL keeps the user's
+  data in the global database, as for accounts created before sharding or
+  when no shards are configured.
+- New accounts go to the shard with the fewest users.
+- A request routes the per-user tables to current_user's shard (see
+  ``ShardedSession``). Background work switches with ``use`` or
+  ``for_user``.
+- ``flask shards init-db`` creates the per-user tables on new shards at the
+  current schema. Migrations only run on the global database; the command
+  also copies category and priority rows added since to existing shards.
+- ``flask shards move USER_ID SHARD`` rebalances by moving one user's data
+  (see ``move_user``).
+
+Row ids are only unique within one database, so a move gives the user's
+rows new ids. Delta sync clients see the old ids deleted and the rows
+created again. Read replicas (replicas.py) serve the global database;
+per-user tables of a sharded user are always read from the shard.
+"""
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from flask_login import current_user
+from sqlalchemy import MetaData, delete, func, inspect, insert, select, update
+
+import replicas
+
+# Models are imported where they are used, since models imports this module
+# for ShardedSession
+
+# Tables kept in the global database; every other table holds users' data
+# and is created on each shard
+GLOBAL_TABLES = {'user', 'job'}
+
+# Times a move is retried when the user writes while it copies their data
+MOVE_ATTEMPTS = 3
+
+
+class UserMoved(Exception):
+    """Raised on a write to a shard that no longer holds the user's data."""
+
+    def __init__(self, user_id):
+        super().__init__(f"The data of user {user_id} has moved to another shard")
+        self.user_id = user_id
+
+
+def init_app(app):
+    """Turn DATABASE_SHARD_URLS into binds; call after database.init_app and before db.init_app."""
+    config = app.config
+    config.setdefault('DATABASE_SHARD_URLS', [])
+    binds = config.setdefault('SQLALCHEMY_BINDS', {})
+    for index, url in enumerate(config['DATABASE_SHARD_URLS']):
+        # The global database's engine profile applies to the shards too
+        binds[key(index)] = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS', {}), url=url)
+    app.before_request(_route_to_user_shard)
+    app.register_error_handler(UserMoved, _retry_after_move)
+    app.cli.add_command(shards_command)
+
+
+def key(index):
+    """Return the bind key of shard index; None is the global database."""
+    return None if index is None else f"shard{index}"
+
+
+def shard_keys():
+    return [key(index) for index in range(len(current_app.config.get('DATABASE_SHARD_URLS', [])))]
+
+
+def all_keys():
+    """Return the keys of every database holding users' data, the global one first."""
+    return [None] + shard_keys()
+
+
+class ShardedSession(replicas.RoutingSession):
+    """
+        Session that sends the per-user tables to the shard in info['shard'].
+        - Global tables, and everything while info['shard'] is None, are
+          routed as by RoutingSession
+        - Statements without a mapper, such as the search index's, go to
+          the shard too
+        """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        shard = self.info.get('shard')
+        if bind is None and shard is not None and not _is_global(mapper):
+            bind = self._db.engines[shard]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _is_global(mapper):
+    return mapper is not None and inspect(mapper).local_table.name in GLOBAL_TABLES
+
+
+def _route_to_user_shard():
+    from models import db
+    if current_user.is_authenticated:
+        db.session.info['shard'] = key(current_user.shard)
+
+
+def _retry_after_move(error):
+    # Set by a worker whose cached identity still names the old shard
+    from cache import identity_cache
+    identity_cache.invalidate(error.user_id)
+    return "Your data is being moved; please try again.", 503, {"Retry-After": "1"}
+
+
+@contextmanager
+def use(shard):
+    """
+        Route the session's per-user tables to the shard with key ``shard``
+        (None: the global database) inside the block.
+        Pending changes are flushed and loaded objects expunged on each
+        switch, since row ids repeat across shards.
+        """
+    from models import db
+    session = db.session
+    previous = session.info.get('shard')
+    _switch(session, shard)
+    try:
+        yield
+    finally:
+        _switch(session, previous)
+
+
+def _switch(session, shard):
+    if session.info.get('shard') != shard:
+        session.flush()
+        session.expunge_all()
+        session.info['shard'] = shard
+
+
+def for_user(user_id):
+    """Route the per-user tables to the shard of user_id inside the block."""
+    from models import db, User
+    return use(key(db.session.query(User.shard).filter(User.id == user_id).scalar()))
+
+
+def group_by_shard(user_ids):
+    """Return {shard key: [user ids]} for the given users, in the order of all_keys."""
+    from models import db, User
+    groups = defaultdict(list)
+    for user_id, shard in db.session.query(User.id, User.shard).filter(User.id.in_(list(user_ids))):
+        groups[key(shard)].append(user_id)
+    return {shard: groups[shard] for shard in all_keys() if groups[shard]}
+
+
+def check_home(user_id):
+    """Raise UserMoved unless the session is routed to the shard that holds user_id's data."""
+    from models import db, User
+    shard = db.session.query(User.shard).filter(User.id == user_id).scalar()
+    if key(shard) != db.session.info.get('shard'):
+        raise UserMoved(user_id)
+
+
+def assign(count=1):
+    """Return the shard indexes for count new users, each on the shard with the fewest users at that point."""
+    from models import db, User
+    shard_count = len(shard_keys())
+    if not shard_count:
+        return [None] * count
+    users = dict(
+        db.session.query(User.shard, func.count(User.id)).filter(User.shard.isnot(None)).group_by(User.shard)
+    )
+    load = {index: users.get(index, 0) for index in range(shard_count)}
+    chosen = []
+    for _ in range(count):
+        index = min(load, key=lambda shard: (load[shard], shard))
+        load[index] += 1
+        chosen.append(index)
+    return chosen
+
+
+def create_schema(engine):
+    """Create the per-user tables, the lookup tables' rows and the search index on a shard."""
+    from models import db
+    import search
+    metadata = MetaData()
+    for table in db.metadata.sorted_tables:
+        if table.name not in GLOBAL_TABLES:
+            _drop_global_foreign_keys(table.to_metadata(metadata))
+    with engine.begin() as connection:
+        metadata.create_all(connection)
+        search.install(connection)
+    copy_lookups(engine)
+
+
+def copy_lookups(engine):
+    """Copy the category and priority rows the shard lacks from the global database; returns the number copied."""
+    from models import db, Category, Priority
+    copied = 0
+    with db.engine.connect() as source, engine.begin() as connection:
+        for table in (Category.__table__, Priority.__table__):
+            # Task rows reference the codes, so the shard needs every row the global database has
+            code = table.primary_key.columns[0]
+            present = set(connection.scalars(select(code)))
+            rows = [row for row in source.execute(select(table)).mappings() if row[code.name] not in present]
+            if rows:
+                connection.execute(insert(table), [dict(row) for row in rows])
+                copied += len(rows)
+    return copied
+
+
+def _drop_global_foreign_keys(table):
+    # Rows of global tables are in another database, where no constraint can reach
+    for constraint in list(table.foreign_key_constraints):
+        if constraint.elements[0].target_fullname.split('.')[0] in GLOBAL_TABLES:
+            table.constraints.discard(constraint)
+            for element in constraint.elements:
+                element.parent.foreign_keys.discard(element)
+                table.foreign_keys.discard(element)
+
+
+def move_user(user_id, target, grace=None):
+    """
+        Move a user's data to shard index target (None: the global database).
+        1. The data is copied to the target with new row ids and committed
+           there, while the user keeps using the source
+        2. The user's revision row on the source is locked and compared
+           with the copy; after a write in between, the copy is dropped and
+           the move starts over
+        3. Holding the lock, the revision row is deleted from the source and
+           User.shard switched; writes still sent to the source then fail
+           with UserMoved
+        4. After ``grace`` seconds (IDENTITY_CACHE_TTL_SECONDS by default),
+           once no worker's cached identity names the source any more, the
+           rest of the source's rows are purged
+        Returns the number of tasks moved, archived ones included.
+        """
+    from models import db, User, UserRevision
+    from cache import identity_cache, read_cache
+    from purge import purger
+
+    user = db.session.get(User, user_id)
+    if user is None or user.deleted_at is not None:
+        raise click.ClickException(f"No active user {user_id}.")
+    source_key, target_key = key(user.shard), key(target)
+    db.session.rollback()
+    if source_key == target_key:
+        return 0
+    source, destination = db.engines[source_key], db.engines[target_key]
+    revisions = UserRevision.__table__
+    _ensure_revision_row(source, user_id)
+
+    for attempt in range(MOVE_ATTEMPTS):
+        with source.connect() as connection, connection.begin():
+            data = _read_user_data(connection, user_id)
+        # Leftovers of an earlier attempt, or of a move that failed
+        with use(target_key):
+            purger.purge_user_data(user_id)
+        with destination.begin() as connection:
+            _write_user_data(connection, user_id, data)
+
+        with source.connect() as connection:
+            with connection.begin() as transaction:
+                # Waits for the user's writes in progress, and holds off new ones
+                revision = connection.execute(
+                    update(revisions).where(revisions.c.user_id == user_id)
+                    .values(revision=revisions.c.revision + 1).returning(revisions.c.revision)
+                ).scalar()
+                if revision != data['revision'] + 1:
+                    transaction.rollback()
+                    continue
+                connection.execute(delete(revisions).where(revisions.c.user_id == user_id))
+                switch = update(User.__table__).where(User.__table__.c.id == user_id).values(shard=target)
+                if source_key is None:
+                    # Another connection would wait for this one's lock
+                    connection.execute(switch)
+                else:
+                    with db.engine.begin() as global_connection:
+                        global_connection.execute(switch)
+        break
+    else:
+        with use(target_key):
+            purger.purge_user_data(user_id)
+        raise click.ClickException(f"User {user_id} kept writing; the move was given up after {MOVE_ATTEMPTS} tries.")
+
+    identity_cache.invalidate(user_id)
+    read_cache.invalidate_user(user_id)
+    time.sleep(current_app.config['IDENTITY_CACHE_TTL_SECONDS'] if grace is None else grace)
+    with use(source_key):
+        purger.purge_user_data(user_id)
+    return len(data['task']) + len(data['archived_task'])
+
+
+def _ensure_revision_row(engine, user_id):
+    # Moves lock this row; a user who never wrote has none yet
+    from models import UserRevision
+    revisions = UserRevision.__table__
+    with engine.begin() as connection:
+        if connection.execute(select(revisions.c.user_id).where(revisions.c.user_id == user_id)).first() is None:
+            connection.execute(insert(revisions).values(user_id=user_id, revision=0))
+
+
+def _read_user_data(connection, user_id):
+    from models import Task, Comment, ArchivedTask, ArchivedComment, Tombstone, UserRevision
+    tasks, archived_tasks = Task.__table__, ArchivedTask.__table__
+    revisions = UserRevision.__table__
+
+    def rows(table, condition):
+        return connection.execute(select(table).where(condition).order_by(table.c.id)).mappings().all()
+
+    return {
+        "revision": connection.execute(
+            select(revisions.c.revision).where(revisions.c.user_id == user_id)
+        ).scalar_one(),
+        "task": rows(tasks, tasks.c.user_id == user_id),
+        "comment": rows(Comment.__table__, Comment.__table__.c.task_id.in_(
+            select(tasks.c.id).where(tasks.c.user_id == user_id)
+        )),
+        "archived_task": rows(archived_tasks, archived_tasks.c.user_id == user_id),
+        "archived_comment": rows(ArchivedComment.__table__, ArchivedComment.__table__.c.task_id.in_(
+            select(archived_tasks.c.id).where(archived_tasks.c.user_id == user_id)
+        )),
+        "tombstone": rows(Tombstone.__table__, Tombstone.__table__.c.user_id == user_id),
+    }
+
+
+def _write_user_data(connection, user_id, data):
+    """Insert the rows read by _read_user_data with new ids, stamped with the user's next revision."""
+    from models import Task, Comment, ArchivedTask, ArchivedComment, Tombstone, UserRevision
+    tasks, comments = Task.__table__, Comment.__table__
+    revision = data['revision'] + 1
+
+    def insert_rows(table, rows, **changes):
+        # Returns the new ids in the order of rows
+        if not rows:
+            return []
+        values = [dict({k: v for k, v in row.items() if k != 'id'}, revision=revision, **{
+            column: change(row) for column, change in changes.items()
+        }) for row in rows]
+        return connection.execute(
+            insert(table).returning(table.c.id, sort_by_parameter_order=True), values
+        ).scalars().all()
+
+    # Archived rows take their new ids from the task and comment tables, as
+    # rows archived on this shard do, and then move to the archive tables
+    task_ids, comment_ids = {}, {}
+    archived = [{k: v for k, v in row.items() if k != 'archived_at'} for row in data['archived_task']]
+    for rows in (archived, data['task']):
+        task_ids.update(zip((row['id'] for row in rows), insert_rows(tasks, rows)))
+    archived_comments = [dict(row) for row in data['archived_comment']]
+    for rows in (archived_comments, data['comment']):
+        comment_ids.update(zip(
+            (row['id'] for row in rows), insert_rows(comments, rows, task_id=lambda row: task_ids[row['task_id']])
+        ))
+    if archived:
+        connection.execute(insert(ArchivedTask.__table__), [
+            dict(row, id=task_ids[row['id']], revision=revision) for row in data['archived_task']
+        ])
+        if archived_comments:
+            connection.execute(insert(ArchivedComment.__table__), [
+                dict(row, id=comment_ids[row['id']], task_id=task_ids[row['task_id']], revision=revision)
+                for row in archived_comments
+            ])
+        moved = [task_ids[row['id']] for row in archived]
+        # Tasks first, so the search triggers drop each task's index row
+        # before its comments go with it
+        connection.execute(delete(tasks).where(tasks.c.id.in_(moved)))
+        connection.execute(delete(comments).where(comments.c.task_id.in_(moved)))
+
+    # Clients forget the old ids of live rows; archived ones are not synced
+    tombstones = [{k: v for k, v in row.items() if k != 'id'} for row in data['tombstone']]
+    now = datetime.utcnow()
+    tombstones += [
+        dict(user_id=user_id, revision=revision, kind='task', ref_id=row['id'], deleted_at=now) for row in data['task']
+    ] + [
+        dict(user_id=user_id, revision=revision, kind='comment', ref_id=row['id'], deleted_at=now)
+        for row in data['comment']
+    ]
+    if tombstones:
+        connection.execute(insert(Tombstone.__table__), tombstones)
+    connection.execute(insert(UserRevision.__table__).values(user_id=user_id, revision=revision))
+
+
+@click.group('shards')
+def shards_command():
+    """Manage the shards of users' data."""
+
+
+@shards_command.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create the per-user tables on every shard that has no tables yet, and copy new lookup rows to the others."""
+    from models import db
+    for shard in shard_keys():
+        engine = db.engines[shard]
+        if inspect(engine).get_table_names():
+            copied = copy_lookups(engine)
+            click.echo(f"{shard}: already has tables, {copied} lookup rows copied.")
+            continue
+        create_schema(engine)
+        click.echo(f"{shard}: created.")
+
+
+@shards_command.command('status')
+@with_appcontext
+def status_command():
+    """Show the number of users on each shard."""
+    from models import db, User
+    users = dict(db.session.query(User.shard, func.count(User.id)).group_by(User.shard))
+    for index in [None] + list(range(len(shard_keys()))):
+        click.echo(f"{key(index) or 'global':<10} {users.get(index, 0)} users")
+
+
+@shards_command.command('move')
+@click.argument('user_id', type=int)
+@click.argument('target')
+@click.option('--grace', type=float, default=None,
+              help='Seconds to keep the source rows after the switch; defaults to IDENTITY_CACHE_TTL_SECONDS.')
+@with_appcontext
+def move_command(user_id, target, grace):
+    """Move a user's data to shard TARGET (an index, or "global")."""
+    index = None if target == 'global' else int(target)
+    if index is not None and not 0 <= index < len(shard_keys()):
+        raise click.BadParameter(f"there are {len(shard_keys())} shards", param_hint='TARGET')
+    started = time.perf_counter()
+    moved = move_user(user_id, index, grace)
+    click.echo(f"Moved user {user_id} ({moved} tasks) to {key(index) or 'global'} "
+               f"in {time.perf_counter() - started:.1f}s.")
@@ -0,0 +1,131 @@
+"""Per-user dashboard statistics.
+
+The dashboard numbers are stored in one ``UserStats`` row per user. The row is
+rebuilt from GROUP BY aggregates when it is missing or when the week/month it
+was computed for has rolled over, and is otherwise adjusted in place by the
+task write routes inside their own transaction.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, case, func
+
+from models import db, Task, ArchivedTask, UserStats, categories
+
+# The parts of a task that contribute to the statistics
+TaskSnapshot = namedtuple('TaskSnapshot', ['completed', 'category', 'due_date'])
+
+
+def snapshot(task):
+    """Capture the fields of a task the statistics depend on."""
+    return TaskSnapshot(bool(task.completed), task.category, task.due_date)
+
+
+def current_periods(today=None):
+    """Return the (week_start, week_end, month_start) dates."""
+    today = today or datetime.now().date()
+    start_of_week = today - timedelta(days=today.weekday())
+    end_of_week = start_of_week + timedelta(days=6)
+    start_of_month = today.replace(day=1)
+    return start_of_week, end_of_week, start_of_month
+
+
+def get_stats(user_id, today=None):
+    """
+        Return the statistics row for a user.
+        - Served from the stored row when it covers the current week and month
+        - Rebuilt from aggregates otherwise
+        """
+    week_start, _, month_start = current_periods(today)
+    stats = db.session.get(UserStats, user_id)
+    if stats is None or stats.week_start != week_start or stats.month_start != month_start:
+        stats = recompute(user_id, today)
+        db.session.commit()
+    return stats
+
+
+def recompute(user_id, today=None):
+    """
+        Rebuild the statistics row for a user with GROUP BY aggregates.
+        Archived tasks still count, so the numbers do not change when tasks
+        are archived.
+        """
+    week_start, week_end, month_start = current_periods(today)
+    # Locked before the aggregates are read: this also moves the session of a
+    # read-only request from its replica to the primary, so a lagging
+    # replica's counts are never stored, and writes wait until the row is
+    # rebuilt. A copy already loaded from the replica is overwritten.
+    stats = db.session.get(UserStats, user_id, with_for_update=True, populate_existing=True)
+    totals = [0, 0, 0, 0]
+    category_counts = {}
+    for model in (Task, ArchivedTask):
+        completed = model.completed.is_(True)
+        row = db.session.query(
+            func.count(model.id),
+            func.coalesce(func.sum(case((completed, 1), else_=0)), 0),
+            func.coalesce(func.sum(case(
+                (and_(completed, model.due_date >= week_start, model.due_date <= week_end), 1), else_=0
+            )), 0),
+            func.coalesce(func.sum(case((and_(completed, model.due_date >= month_start), 1), else_=0)), 0),
+        ).filter(model.user_id == user_id).one()
+        totals = [total + value for total, value in zip(totals, row)]
+
+        # Grouped along ix_task_user_category; the counts are kept by category name
+        category_rows = db.session.query(model.category_id, func.count(model.id)) \
+            .filter(model.user_id == user_id, model.category_id.isnot(None)) \
+            .group_by(model.category_id).all()
+        for category_id, count in category_rows:
+            name = categories.name(category_id)
+            category_counts[name] = category_counts.get(name, 0) + count
+
+    if stats is None:
+        stats = UserStats(user_id=user_id)
+        db.session.add(stats)
+    stats.total_tasks, stats.completed_tasks, stats.completed_this_week, stats.completed_this_month = totals
+    stats.week_start = week_start
+    stats.month_start = month_start
+    stats.category_counts = category_counts
+    return stats
+
+
+def record_change(user_id, old=None, new=None):
+    """
+        Apply the effect of a task write to the stored statistics.
+        - old: snapshot of the task before the write (None for a new task)
+        - new: snapshot of the task after the write (None for a deleted task)
+        Must be called before the write is committed so both land together.
+        """
+    record_changes(user_id, [(old, new)])
+
+
+def record_changes(user_id, changes):
+    """
+        Apply several (old, new) task snapshot pairs at once.
+        Users without a stored row are skipped; their row is built on the next
+        dashboard view.
+        """
+    stats = db.session.get(UserStats, user_id, with_for_update=True)
+    if stats is None:
+        return
+
+    week_end = stats.week_start + timedelta(days=6)
+    category_counts = dict(stats.category_counts or {})
+    for old, new in changes:
+        for task, sign in ((old, -1), (new, 1)):
+            if task is None:
+                continue
+            stats.total_tasks += sign
+            if task.category is not None:
+                category_counts[task.category] = category_counts.get(task.category, 0) + sign
+            if task.completed:
+                stats.completed_tasks += sign
+                if task.due_date and stats.week_start <= task.due_date <= week_end:
+                    stats.completed_this_week += sign
+                if task.due_date and task.due_date >= stats.month_start:
+                    stats.completed_this_month += sign
+    stats.category_counts = {category: count for category, count in category_counts.items() if count}
+
+
+def delete_stats(user_id):
+    """Remove the statistics row of a user."""
+    UserStats.query.filter_by(user_id=user_id).delete()
@@ -0,0 +1,172 @@
+"""Change tracking for delta sync and conditional GETs.
+
+Every user has a monotonically increasing revision, kept in ``UserRevision``
+on the user's shard. Each write bumps it once and stamps the new value on
+the rows it touched. Writing a comment also stamps its task. Deletions leave
+a ``Tombstone`` carrying the revision. A client that remembers the last
+revision it saw can then ask for just the rows changed since, and read
+endpoints can derive their ETag from the revision without running their
+queries.
+"""
+import hashlib
+from functools import wraps
+
+from flask import make_response, request
+from flask_login import current_user
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+from models import db, Task, Comment, Tombstone, UserRevision
+import shards
+
+# Callables notified with the set of user ids whose data a commit changed
+_commit_listeners = []
+
+
+def on_commit(listener):
+    """Register a callable to run after any commit that touched users' data."""
+    _commit_listeners.append(listener)
+    return listener
+
+
+def touch(user_id):
+    """
+        Bump a user's revision and return the new value.
+        Call once per write, before committing, and stamp the returned
+        revision on every row the write changes.
+        """
+    db.session.info.setdefault('touched_users', set()).add(user_id)
+    revision = db.session.execute(
+        update(UserRevision).where(UserRevision.user_id == user_id)
+        .values(revision=UserRevision.revision + 1).returning(UserRevision.revision),
+        execution_options={"synchronize_session": False},
+    ).scalar()
+    if revision is None:
+        # The user's first write, unless their data has moved to another shard
+        shards.check_home(user_id)
+        db.session.add(UserRevision(user_id=user_id, revision=1))
+        db.session.flush()
+        revision = 1
+    return revision
+
+
+@event.listens_for(Session, 'after_commit')
+def _notify_commit_listeners(session):
+    user_ids = session.info.pop('touched_users', None)
+    if user_ids:
+        for listener in _commit_listeners:
+            listener(user_ids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_touched_users(session):
+    session.info.pop('touched_users', None)
+
+
+def current_revision(user_id):
+    """Return a user's committed revision."""
+    return db.session.query(UserRevision.revision).filter_by(user_id=user_id).scalar() or 0
+
+
+def record_deletion(user_id, revision, kind, ref_ids):
+    """Leave tombstones for deleted rows of the given kind ('task' or 'comment')."""
+    db.session.add_all(
+        Tombstone(user_id=user_id, revision=revision, kind=kind, ref_id=ref_id) for ref_id in ref_ids
+    )
+
+
+def changes_since(user_id, since, limit=500):
+    """
+        Collect the rows changed after revision ``since``.
+        Returns a dict with the changed tasks and comments, the ids of deleted
+        ones, the revision to pass as ``since`` next time, and whether more
+        changes remain. A page never splits the rows of one revision.
+        """
+    revision = current_revision(user_id)
+    until = revision
+
+    # Stop after about `limit` changed tasks or tombstones
+    for column, owner in ((Task.revision, Task.user_id), (Tombstone.revision, Tombstone.user_id)):
+        boundary = db.session.query(column) \
+            .filter(owner == user_id, column > since) \
+            .order_by(column).offset(limit - 1).limit(1).scalar()
+        if boundary is not None:
+            until = min(until, boundary)
+
+    tasks = Task.query \
+        .filter(Task.user_id == user_id, Task.revision > since, Task.revision <= until) \
+        .order_by(Task.revision, Task.id).all()
+    task_ids = [task.id for task in tasks]
+    comments = Comment.query \
+        .filter(Comment.task_id.in_(task_ids), Comment.revision > since, Comment.revision <= until) \
+        .order_by(Comment.revision, Comment.id).all() if task_ids else []
+    tombstones = Tombstone.query \
+        .filter(Tombstone.user_id == user_id, Tombstone.revision > since, Tombstone.revision <= until) \
+        .order_by(Tombstone.revision, Tombstone.id).all()
+
+    # Moving a user to another shard renumbers their rows, so an old id can
+    # come back as a live row in the same revision; the live row wins
+    live = {'task': set(task_ids), 'comment': {comment.id for comment in comments}}
+    deleted = [tombstone for tombstone in tombstones if tombstone.ref_id not in live[tombstone.kind]]
+
+    return {
+        "since": since,
+        "revision": until,
+        "has_more": until < revision,
+        "tasks": [serialize_task(task) for task in tasks],
+        "comments": [serialize_comment(comment) for comment in comments],
+        "deleted": {
+            "tasks": [tombstone.ref_id for tombstone in deleted if tombstone.kind == 'task'],
+            "comments": [tombstone.ref_id for tombstone in deleted if tombstone.kind == 'comment'],
+        },
+    }
+
+
+def serialize_task(task):
+    return {
+        "id": task.id,
+        "name": task.name,
+        "category": task.category,
+        "priority": task.priority,
+        "due_date": task.due_date.isoformat() if task.due_date else None,
+        "completed": bool(task.completed),
+        "client_key": task.client_key,
+        "revision": task.revision,
+    }
+
+
+def serialize_comment(comment):
+    return {
+        "id": comment.id,
+        "task_id": comment.task_id,
+        "content": comment.content,
+        "created_at": comment.created_at.isoformat() if comment.created_at else None,
+        "revision": comment.revision,
+    }
+
+
+def revision_etag(*parts):
+    """
+        Decorate a read-only view of current_user's data with a weak ETag.
+        The tag is derived from the user's revision, the request URL and any
+        extra parts (callables evaluated per request, e.g. today's date for
+        views that depend on it). A matching If-None-Match is answered with
+        304 before the view runs.
+        """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = [str(current_user.id), str(current_revision(current_user.id)), request.full_path]
+            key.extend(str(part()) for part in parts)
+            etag = hashlib.sha1('|'.join(key).encode()).hexdigest()
+
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+            response.set_etag(etag, weak=True)
+            # Revalidate on every use; a 304 costs one indexed lookup
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
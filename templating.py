@@ -0,0 +1,54 @@
+"""Template compilation and fragment caching.
+
+Compiled templates are kept in a bytecode cache on disk, and every template
+is loaded when the app starts, so no request pays for parsing and compiling
+a template, and neither does a restarted worker.
+
+The ``{% cache %}`` tag caches the markup it encloses in ``fragment_cache``,
+for the logged-in user, under the key given by its arguments:
+
+    {% cache 'task_row', task.id, task.revision %} ... {% endcache %}
+
+The arguments must identify everything the markup shows; a task's revision
+changes with every write to the task or its comments.
+"""
+import os
+import tempfile
+
+from flask_login import current_user
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+from cache import fragment_cache
+
+
+class FragmentCacheExtension(Extension):
+    """Adds the {% cache key, ... %} ... {% endcache %} tag."""
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', [nodes.List(parts)]), [], [], body).set_lineno(lineno)
+
+    def _render(self, parts, caller):
+        if not current_user.is_authenticated:
+            return caller()
+        return fragment_cache.get_or_render(current_user.id, parts, caller)
+
+
+def init_app(app):
+    app.config.setdefault('TEMPLATE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'tasknest-templates'))
+    fragment_cache.init_app(app)
+
+    os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR'])
+    app.jinja_env.add_extension(FragmentCacheExtension)
+
+    # Load every template now rather than on its first request
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
@@ -0,0 +1,45 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import create_app  # noqa: E402
+from config import Config  # noqa: E402
+from models import db  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    # A fresh database and shared-state files per test
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'test.db'}"
+        WTF_CSRF_ENABLED = False
+        PASSWORD_HASH_WORKERS = 0
+        RATE_LIMITS_ENABLED = False
+        MAX_CONCURRENT_REQUESTS = 0
+        ADMISSION_STATE_FILE = str(tmp_path / 'admission')
+        IDENTITY_VERSIONS_FILE = str(tmp_path / 'identity')
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def register(client, username='alice', email='alice@example.com', password='secret1', log_in=True):
+    client.post('/register', data={
+        "username": username, "email": email, "password": password, "confirm_password": password,
+    })
+    if log_in:
+        client.post('/login', data={"email": email, "password": password})
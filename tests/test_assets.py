@@ -0,0 +1,38 @@
+import os
+import shutil
+
+import assets
+
+
+def copy_static(tmp_path):
+    static = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'static')
+    for name in assets.ASSETS:
+        os.makedirs(tmp_path / os.path.dirname(name), exist_ok=True)
+        shutil.copy(os.path.join(static, name), tmp_path / name)
+    return str(tmp_path)
+
+
+def test_build_removes_files_of_earlier_builds(tmp_path):
+    static = copy_static(tmp_path)
+    old = assets.build(static)["files"]['css/styles.css']
+    with open(tmp_path / 'css/styles.css', 'a') as styles:
+        styles.write('/* changed */\n')
+
+    manifest = assets.build(static)
+    new = manifest["files"]['css/styles.css']
+    assert new != old
+    assert not any(name.startswith(os.path.basename(old)) for name in os.listdir(tmp_path / 'dist/css'))
+    assert os.path.exists(tmp_path / new)
+    assert assets.load_manifest(static) == manifest
+
+
+def test_app_serves_the_built_manifest_without_building(app, tmp_path):
+    static = copy_static(tmp_path / 'static')
+    app.static_folder = static
+    loader = assets.StaticAssets()
+    loader.init_app(app)
+    assert loader.files == {} and not os.path.exists(os.path.join(static, assets.OUTPUT_DIR))
+
+    manifest = assets.build(static)
+    loader.init_app(app)
+    assert loader.files == manifest["files"]
@@ -0,0 +1,177 @@
+import socketserver
+import threading
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import digests
+import jobs
+from models import db, Job, Task, User
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """SMTP server on localhost that records connections and recipients, and can reject messages."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPSession)
+        self.connections = 0
+        self.recipients = []
+        # Numbers of the messages, counting from 1, to answer with a temporary failure
+        self.reject = set()
+        self.received = 0
+        self.lock = threading.Lock()
+
+
+class SMTPSession(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+        self.reply('220 sink ESMTP')
+        recipients = []
+        for line in self.rfile:
+            command = line.decode('ascii', 'replace').strip()
+            verb = command.upper()
+            if verb.startswith('EHLO'):
+                self.reply('250 sink')
+            elif verb.startswith('RCPT'):
+                recipients.append(command.split(':', 1)[1].strip(' <>'))
+                self.reply('250 OK')
+            elif verb.startswith(('HELO', 'MAIL', 'RSET', 'NOOP')):
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                for data in self.rfile:
+                    if data == b'.\r\n':
+                        break
+                with self.server.lock:
+                    self.server.received += 1
+                    rejected = self.server.received in self.server.reject
+                    if not rejected:
+                        self.server.recipients.extend(recipients)
+                recipients = []
+                self.reply('451 Try again later' if rejected else '250 Queued')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Not implemented')
+
+
+@pytest.fixture
+def sink(app):
+    server = SMTPSink()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    app.config.update(
+        MAIL_SERVER='127.0.0.1', MAIL_PORT=server.server_address[1], MAIL_USE_TLS=False,
+        MAIL_USERNAME=None, MAIL_PASSWORD=None, MAIL_DEFAULT_SENDER='tasknest@example.com',
+        MAIL_SUPPRESS_SEND=False,
+    )
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def add_users(app, count):
+    """Add users whose digest is due, each with an overdue task; return their emails."""
+    with app.app_context():
+        users = [User(username=f"user{index}", email=f"user{index}@example.com", password_hash='-',
+                      next_digest_at=datetime.utcnow() - timedelta(minutes=1)) for index in range(count)]
+        db.session.add_all(users)
+        db.session.flush()
+        db.session.add_all([Task(user_id=user.id, name="overdue", category="Work", priority="High",
+                                 due_date=date.today() - timedelta(days=1)) for user in users])
+        db.session.commit()
+        return [user.email for user in users]
+
+
+def test_each_due_user_gets_one_digest(app, sink):
+    emails = add_users(app, 5)
+    # Due too, but with nothing to remind of
+    idle = User(username="idle", email="idle@example.com", password_hash='-',
+                next_digest_at=datetime.utcnow() - timedelta(minutes=1))
+    with app.app_context():
+        db.session.add(idle)
+        db.session.commit()
+
+    jobs.Worker(app).run(burst=True)
+    assert sorted(sink.recipients) == sorted(emails)
+    # Their next digest is tomorrow
+    jobs.Worker(app).run(burst=True)
+    assert sorted(sink.recipients) == sorted(emails)
+    with app.app_context():
+        assert db.session.query(Job).count() == 0
+        assert all(user.next_digest_at > datetime.utcnow() for user in User.query)
+
+
+def test_batch_reuses_one_smtp_connection(app, sink):
+    app.config['DIGEST_BATCH_SIZE'] = 10
+    add_users(app, 10)
+    jobs.Worker(app).run(burst=True)
+    assert len(sink.recipients) == 10
+    assert sink.connections == 1
+
+
+def test_failed_send_is_retried_with_backoff(app, sink):
+    app.config.update(DIGEST_BATCH_SIZE=10, JOB_RETRY_BASE_SECONDS=30)
+    emails = add_users(app, 4)
+    sink.reject = {2}
+
+    jobs.Worker(app).run(burst=True)
+    assert sink.recipients == emails[:1]
+    with app.app_context():
+        job = db.session.query(Job).one()
+        # Only the users not sent to yet, after 15 to 30 seconds
+        assert job.attempts == 1 and job.locked_by is None and job.failed_at is None
+        assert len(job.payload["user_ids"]) == 3
+        delay = (job.run_at - datetime.utcnow()).total_seconds()
+        assert 10 < delay <= 30
+        job.run_at = datetime.utcnow()
+        db.session.commit()
+
+    jobs.Worker(app).run(burst=True)
+    assert sorted(sink.recipients) == sorted(emails)
+    with app.app_context():
+        assert db.session.query(Job).count() == 0
+
+
+def test_workers_never_claim_the_same_user(app, sink):
+    app.config['DIGEST_BATCH_SIZE'] = 3
+    emails = add_users(app, 30)
+    claimed, errors = [], []
+    start = threading.Barrier(2)
+
+    def claim_batches():
+        try:
+            start.wait()
+            with app.app_context():
+                while digests.enqueue_due_digests():
+                    pass
+        except Exception as error:
+            errors.append(error)
+
+    workers = [threading.Thread(target=claim_batches) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert not errors
+    with app.app_context():
+        for job in db.session.query(Job):
+            claimed.extend(job.payload["user_ids"])
+    assert sorted(claimed) == list(range(1, 31))
+
+    runners = [threading.Thread(target=jobs.Worker(app).run_once) for _ in range(2)]
+    app.config['JOB_CLAIM_SIZE'] = 5
+    for runner in runners:
+        runner.start()
+    for runner in runners:
+        runner.join()
+    jobs.Worker(app).run(burst=True)
+    assert sorted(sink.recipients) == sorted(emails)
@@ -0,0 +1,24 @@
+from conftest import register
+
+
+def test_metrics_are_not_served_without_a_token(client):
+    assert client.get('/metrics').status_code == 404
+
+
+def test_metrics_require_the_token(app, client):
+    app.config['METRICS_TOKEN'] = 'secret'
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get('/metrics', headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert b'tasknest_requests_total' in response.data
+
+
+def test_read_cache_lookups_are_exported(app, client):
+    register(client)
+    client.get('/')
+    client.get('/')
+    app.config['METRICS_TOKEN'] = 'secret'
+    body = client.get('/metrics', headers={"Authorization": "Bearer secret"}).get_data(as_text=True)
+    assert 'tasknest_read_cache_lookups_total{namespace="dashboard",result="hit"}' in body
+    assert client.get('/api/cache/stats').status_code == 404
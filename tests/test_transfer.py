@@ -0,0 +1,55 @@
+import json
+
+from conftest import register
+from models import db, Comment, Task
+
+
+def ndjson(records):
+    return ''.join(json.dumps(record) + '\n' for record in records).encode()
+
+
+def records():
+    # Five tasks, each followed in the file by its comments
+    tasks = [{"type": "task", "key": f"k{index}", "name": f"task {index}", "category": "Work", "priority": "Low"}
+             for index in range(5)]
+    comments = [{"type": "comment", "task_key": f"k{index}", "content": f"comment {index}",
+                 "created_at": f"2024-05-0{index + 1}T12:00:00"} for index in range(5)]
+    return tasks + comments
+
+
+def test_resent_import_after_failure_adds_the_rest(app, client):
+    app.config['IMPORT_CHUNK_SIZE'] = 3
+    register(client)
+    body = records()
+    # Line 9 is bad: the first chunks are committed before it is read
+    broken = body[:8] + [{"type": "comment", "task_key": "k3"}] + body[9:]
+
+    response = client.post('/api/import', data=ndjson(broken), content_type='application/x-ndjson')
+    assert response.status_code == 400
+    assert response.get_json()["imported"]["tasks"]["created"] == 5
+    assert response.get_json()["imported"]["comments"]["created"] == 3
+
+    response = client.post('/api/import', data=ndjson(body), content_type='application/x-ndjson')
+    assert response.status_code == 200
+    assert response.get_json() == {
+        "tasks": {"created": 0, "skipped": 5},
+        "comments": {"created": 2, "skipped": 3},
+    }
+    with app.app_context():
+        assert db.session.query(Task).count() == 5
+        assert sorted(db.session.scalars(db.select(Comment.content))) == [f"comment {index}" for index in range(5)]
+
+
+def test_own_export_imports_back_without_duplicates(app, client):
+    register(client)
+    client.post('/add_task', json={"name": "mine", "category": "Work", "priority": "Low"})
+    with app.app_context():
+        task_id = db.session.scalar(db.select(Task.id))
+    client.post(f'/task/{task_id}/comment', data={"content": "note"})
+
+    export = client.get('/api/export').get_data()
+    response = client.post('/api/import', data=export, content_type='application/x-ndjson')
+    assert response.get_json() == {
+        "tasks": {"created": 0, "skipped": 1},
+        "comments": {"created": 0, "skipped": 1},
+    }
@@ -0,0 +1,360 @@
+"""Bulk export and import of a user's tasks and comments, as NDJSON or CSV.
+
+An export is one record per line (NDJSON) or row (CSV): first every task,
+then every comment::
+
+    {"type": "task", "key": "...", "name": "...", "category": "...",
+     "priority": "...", "due_date": "2024-05-01", "completed": false}
+    {"type": "comment", "task_key": "...", "content": "...", "created_at": "..."}
+
+A task's key is its client key, or one derived from its id; comments name
+their task by key. Archived tasks and their comments are exported like the
+others, after them. Exports are read from the database ``EXPORT_YIELD_PER``
+rows at a time as the response streams, so memory stays flat however large
+the account.
+
+Imports are parsed as the upload is read and inserted with one executemany
+per ``IMPORT_CHUNK_SIZE`` records, each chunk in its own transaction.
+Imported tasks keep their key as client key, and tasks whose key the user
+already has, archived or not, are skipped. Comments are added to the user's
+task with their task key, whichever import created it, unless the task
+already has a comment with the same time and content; so an import that
+failed part way can simply be sent again. A key derived from an id counts
+as the user's when they have a task with that id and no client key, so a
+user's own export can be imported back without duplicates. Archived tasks
+are read-only: comments for them are skipped.
+"""
+import csv
+import io
+import json
+import re
+from datetime import date, datetime
+
+from flask import current_app
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Task, Comment, ArchivedTask, ArchivedComment, categories, priorities
+import search
+import stats as user_stats
+import sync
+
+# Export format -> mimetype
+FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+# Columns of a CSV export; tasks and comments each fill their own
+CSV_FIELDS = ['type', 'key', 'name', 'category', 'priority', 'due_date', 'completed',
+              'task_key', 'content', 'created_at']
+
+
+def init_app(app):
+    app.config.setdefault('EXPORT_YIELD_PER', 1000)
+    app.config.setdefault('EXPORT_BUFFER_BYTES', 64 * 1024)
+    app.config.setdefault('IMPORT_CHUNK_SIZE', 5000)
+
+
+class InvalidRecord(ValueError):
+    """Raised for a record that cannot be imported, with its line number."""
+
+    def __init__(self, line, message):
+        super().__init__(f"Line {line}: {message}")
+        self.line = line
+
+
+def format_for(mimetype, filename=None):
+    """Return the import format of an upload from its mimetype or file name."""
+    if mimetype == FORMATS['csv'] or (filename or '').lower().endswith('.csv'):
+        return 'csv'
+    return 'ndjson'
+
+
+# Key exported for a task that has no client key of its own
+DERIVED_KEY = re.compile(r'tasknest-(\d+)')
+
+
+def task_key(task_id, client_key):
+    return client_key or f"tasknest-{task_id}"
+
+
+def export_records(user_id):
+    """Yield a user's tasks, then their comments, as export records; archived ones follow the others."""
+    yield_per = current_app.config['EXPORT_YIELD_PER']
+    for task_model in (Task, ArchivedTask):
+        tasks = select(
+            task_model.id, task_model.client_key, task_model.name, task_model.category_id,
+            task_model.priority_rank, task_model.due_date, task_model.completed,
+        ).where(task_model.user_id == user_id).order_by(task_model.id).execution_options(yield_per=yield_per)
+        for task_id, client_key, name, category_id, priority_rank, due_date, completed in db.session.execute(tasks):
+            yield {
+                "type": "task",
+                "key": task_key(task_id, client_key),
+                "name": name,
+                "category": categories.name(category_id),
+                "priority": priorities.name(priority_rank),
+                "due_date": due_date.isoformat() if due_date else None,
+                "completed": bool(completed),
+            }
+
+    for task_model, comment_model in ((Task, Comment), (ArchivedTask, ArchivedComment)):
+        # Ordered along the task and comment indexes, so the database does not sort
+        comments = select(comment_model.task_id, task_model.client_key, comment_model.content,
+                          comment_model.created_at) \
+            .join(task_model, task_model.id == comment_model.task_id).where(task_model.user_id == user_id) \
+            .order_by(task_model.id, comment_model.created_at, comment_model.id) \
+            .execution_options(yield_per=yield_per)
+        for task_id, client_key, content, created_at in db.session.execute(comments):
+            yield {
+                "type": "comment",
+                "task_key": task_key(task_id, client_key),
+                "content": content,
+                "created_at": created_at.isoformat() if created_at else None,
+            }
+
+
+def encode(records, export_format):
+    """Serialize records in the given format, yielding chunks of about EXPORT_BUFFER_BYTES."""
+    buffer_bytes = current_app.config['EXPORT_BUFFER_BYTES']
+    buffer = io.StringIO()
+    if export_format == 'csv':
+        writer = csv.DictWriter(buffer, CSV_FIELDS)
+        writer.writeheader()
+        write = writer.writerow
+    else:
+        def write(record):
+            buffer.write(json.dumps(record, ensure_ascii=False))
+            buffer.write('\n')
+
+    for record in records:
+        write(record)
+        if buffer.tell() >= buffer_bytes:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def read_records(stream, import_format):
+    """Yield (line number, record) from a binary upload stream, reading it incrementally."""
+    if isinstance(stream, io.RawIOBase):
+        # Such as the request body, which would otherwise be read in small pieces per line
+        stream = io.BufferedReader(stream, 64 * 1024)
+    # Decoded in blocks rather than line by line
+    lines = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if import_format == 'csv' else None)
+    line_number = 0
+    try:
+        if import_format == 'csv':
+            reader = csv.DictReader(lines)
+            for record in reader:
+                line_number = reader.line_num
+                # Empty cells are missing values
+                yield line_number, {field: value for field, value in record.items() if value}
+            return
+
+        for line_number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as error:
+                raise InvalidRecord(line_number, f"invalid JSON ({error})") from error
+            yield line_number, record
+    except (csv.Error, UnicodeDecodeError) as error:
+        raise InvalidRecord(line_number + 1, str(error)) from error
+    finally:
+        # Leave the upload stream open for its owner
+        lines.detach()
+
+
+def parse_record(record):
+    """Validate an import record and return its kind and row values."""
+    if not isinstance(record, dict):
+        raise ValueError("expected an object.")
+    kind = record.get('type')
+    if kind == 'task':
+        key = record.get('key')
+        if not key or not isinstance(key, str) or len(key) > 64:
+            raise ValueError("a key of at most 64 characters is required.")
+        name, category, priority = record.get('name'), record.get('category'), record.get('priority')
+        if not name or not category or not priority:
+            raise ValueError("All fields are required except due date.")
+        category_id, priority_rank = categories.code(category), priorities.code(priority)
+        if category_id is None or priority_rank is None:
+            raise ValueError(f"unknown category {category!r} or priority {priority!r}.")
+        completed = record.get('completed') or False
+        if isinstance(completed, str):
+            completed = completed.lower() in ('1', 'true', 'yes')
+        return kind, dict(
+            client_key=key,
+            name=str(name),
+            category_id=category_id,
+            priority_rank=priority_rank,
+            due_date=_parse(date, record.get('due_date'), "Due date must be in YYYY-MM-DD format."),
+            completed=bool(completed),
+        )
+    if kind == 'comment':
+        parent_key, content = record.get('task_key'), record.get('content')
+        if not parent_key or not isinstance(parent_key, str) or not content:
+            raise ValueError("task_key and content are required.")
+        return kind, dict(
+            task_key=parent_key,
+            content=str(content),
+            created_at=_parse(datetime, record.get('created_at'), "created_at must be an ISO 8601 time.")
+            or datetime.utcnow(),
+        )
+    raise ValueError("type must be 'task' or 'comment'.")
+
+
+def _parse(cls, value, message):
+    # An empty value means none, as for due dates in add_task
+    if not value:
+        return None
+    try:
+        return cls.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(message) from None
+
+
+class Importer:
+    """
+        Inserts a user's imported tasks and comments in chunks.
+        - add buffers one parsed record and writes a full chunk
+        - finish writes what is left
+        Each chunk is one bulk insert in its own transaction, under a new
+        user revision. Comments already on their task are skipped.
+        """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.chunk_size = current_app.config['IMPORT_CHUNK_SIZE']
+        self.counts = {
+            "tasks": {"created": 0, "skipped": 0},
+            "comments": {"created": 0, "skipped": 0},
+        }
+        self._tasks = {}
+        self._comments = []
+
+    def add(self, kind, row):
+        if kind == 'task':
+            if row['client_key'] in self._tasks:
+                self.counts["tasks"]["skipped"] += 1
+            else:
+                self._tasks[row['client_key']] = row
+            if len(self._tasks) >= self.chunk_size:
+                self._write_tasks()
+        else:
+            self._comments.append(row)
+            if len(self._comments) >= self.chunk_size:
+                # Their tasks may still be buffered
+                self._write_tasks()
+                self._write_comments()
+
+    def finish(self):
+        self._write_tasks()
+        self._write_comments()
+        return self.counts
+
+    def _write_tasks(self):
+        if not self._tasks:
+            return
+        try:
+            created = self._insert_tasks()
+        except IntegrityError:
+            # A concurrent import committed some of the keys first
+            db.session.rollback()
+            created = self._insert_tasks()
+        self.counts["tasks"]["created"] += created
+        self.counts["tasks"]["skipped"] += len(self._tasks) - created
+        self._tasks = {}
+
+    def _insert_tasks(self):
+        existing = set()
+        for task_model in (Task, ArchivedTask):
+            existing.update(self._task_ids(task_model, self._tasks))
+        rows = [row for key, row in self._tasks.items() if key not in existing]
+        if rows:
+            revision = sync.touch(self.user_id)
+            now = datetime.utcnow()
+            for row in rows:
+                row['user_id'] = self.user_id
+                row['revision'] = revision
+                # Imported completed tasks are archived ARCHIVE_AFTER_DAYS from now
+                row['completed_at'] = now if row['completed'] else None
+            # A Core insert is a single executemany, where the ORM would split
+            # the rows into runs with the same NULL columns
+            with search.bulk_insert('task'):
+                db.session.execute(insert(Task.__table__), rows)
+            user_stats.record_changes(self.user_id, [
+                (None, user_stats.TaskSnapshot(row['completed'], categories.name(row['category_id']), row['due_date']))
+                for row in rows
+            ])
+        db.session.commit()
+        return len(rows)
+
+    def _task_ids(self, task_model, keys):
+        """Return {key: task id} for the user's tasks in task_model with one of keys."""
+        task_ids = dict(db.session.execute(select(task_model.client_key, task_model.id).where(
+            task_model.user_id == self.user_id, task_model.client_key.in_(list(keys))
+        )).all())
+        # Tasks exported without a client key come back under their derived key
+        derived = {int(match.group(1)): key for key in keys if (match := DERIVED_KEY.fullmatch(key))}
+        if derived:
+            task_ids.update((derived[task_id], task_id) for task_id in db.session.scalars(select(task_model.id).where(
+                task_model.user_id == self.user_id, task_model.id.in_(list(derived)),
+                task_model.client_key.is_(None),
+            )))
+        return task_ids
+
+    def _write_comments(self):
+        if not self._comments:
+            return
+        task_ids = self._task_ids(Task, {comment['task_key'] for comment in self._comments})
+        # Comments already on their task, such as those written by an earlier
+        # attempt at the same import
+        existing = set(db.session.execute(select(Comment.task_id, Comment.created_at, Comment.content).where(
+            Comment.task_id.in_(list(set(task_ids.values()))),
+            Comment.created_at.in_(list({comment['created_at'] for comment in self._comments})),
+        )).all()) if task_ids else set()
+        rows = []
+        for comment in self._comments:
+            task_id = task_ids.get(comment['task_key'])
+            if task_id is None or (task_id, comment['created_at'], comment['content']) in existing:
+                continue
+            existing.add((task_id, comment['created_at'], comment['content']))
+            rows.append(dict(task_id=task_id, content=comment['content'], created_at=comment['created_at']))
+        if rows:
+            # Writing a comment also stamps its task, as in add_comment
+            revision = sync.touch(self.user_id)
+            for row in rows:
+                row['revision'] = revision
+            with search.bulk_insert('comment'):
+                db.session.execute(insert(Comment.__table__), rows)
+            db.session.execute(
+                update(Task).where(Task.id.in_(list({row['task_id'] for row in rows}))).values(revision=revision),
+                execution_options={"synchronize_session": False},
+            )
+        db.session.commit()
+        self.counts["comments"]["created"] += len(rows)
+        self.counts["comments"]["skipped"] += len(self._comments) - len(rows)
+        self._comments = []
+
+
+def import_records(user_id, stream, import_format):
+    """
+        Import the records of an upload for a user.
+        Returns the counts of created and skipped tasks and comments.
+        Raises InvalidRecord at the first bad record, carrying the counts of
+        the chunks written before it, which stay imported.
+        """
+    importer = Importer(user_id)
+    try:
+        for line_number, record in read_records(stream, import_format):
+            try:
+                kind, row = parse_record(record)
+            except ValueError as error:
+                raise InvalidRecord(line_number, str(error)) from None
+            importer.add(kind, row)
+    except InvalidRecord as error:
+        db.session.rollback()
+        error.counts = importer.counts
+        raise
+    return importer.finish()